@@ -1,5 +1,86 @@
+import os
 from django.contrib import admin
-from .models import Course, Lesson, Test, Question, Choice, TestSubmission, Answer
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from courses_platform import profiling
+from .models import Course, Lesson, Test, Question, Choice, TestSubmission, Answer, RequestProfile
+
+def estimated_row_count(model, using):
+    """The planner's estimate of a table's rows, or None where the database keeps none"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [model._meta.db_table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts unfiltered changelists of large tables from the planner's estimate
+    instead of a COUNT(*) over every row. Filtered lists and tables below
+    ``exact_below`` rows are counted exactly.
+    """
+    exact_below = 100000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Shows ``per_page`` related objects at a time, selected by the ``<prefix>-page`` query parameter"""
+    per_page = 50
+    request = None
+
+    @cached_property
+    def page(self):
+        paginator = Paginator(super().get_queryset(), self.per_page)
+        return paginator.get_page(self.request.GET.get(self.page_param) if self.request else None)
+
+    @property
+    def page_param(self):
+        return f"{self.prefix}-page"
+
+    def get_queryset(self):
+        return self.page.object_list
+
+    def page_query(self, number):
+        query = self.request.GET.copy()
+        query[self.page_param] = number
+        return query.urlencode()
+
+    def previous_page_query(self):
+        return self.page_query(self.page.previous_page_number()) if self.page.has_previous() else None
+
+    def next_page_query(self):
+        return self.page_query(self.page.next_page_number()) if self.page.has_next() else None
+
+class PaginatedTabularInline(admin.TabularInline):
+    formset = PaginatedInlineFormSet
+    template = 'admin/edit_inline/paginated_tabular.html'
+    per_page = 50
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.request = request
+        formset.per_page = self.per_page
+        return formset
 
 class LessonInline(admin.TabularInline):
     model = Lesson
@@ -24,32 +105,51 @@ class QuestionInline(admin.TabularInline):
 class LessonAdmin(admin.ModelAdmin):
     list_display = ('title', 'course', 'created_at')
     list_filter = ('course',)
+    list_select_related = ('course',)
     search_fields = ('title',)
+    autocomplete_fields = ('course',)
 
 @admin.register(Test)
 class TestAdmin(admin.ModelAdmin):
     list_display = ('title', 'lesson', 'passing_score', 'time_limit', 'created_at')
     list_filter = ('lesson__course',)
     search_fields = ('title', 'description')
+    autocomplete_fields = ('lesson',)
     inlines = [QuestionInline]
 
+    def get_queryset(self, request):
+        # Test.__str__ shows the lesson title, also in autocomplete results
+        return super().get_queryset(request).select_related('lesson')
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('text', 'test', 'question_type', 'points', 'order')
-    list_filter = ('test', 'question_type')
+    # Filtering by test lists every test; use ?test__id__exact= for one test
+    list_filter = ('test__lesson__course', 'question_type')
+    list_select_related = ('test__lesson',)
     search_fields = ('text',)
+    autocomplete_fields = ('test',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [ChoiceInline]
 
-class AnswerInline(admin.TabularInline):
+class AnswerInline(PaginatedTabularInline):
     model = Answer
     readonly_fields = ('question', 'selected_choices', 'text_answer')
     extra = 0
     can_delete = False
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('question').prefetch_related('selected_choices')
+
 @admin.register(TestSubmission)
 class TestSubmissionAdmin(admin.ModelAdmin):
     list_display = ('user', 'test', 'score', 'start_time', 'end_time', 'is_completed')
-    list_filter = ('test', 'is_completed')
+    list_filter = ('is_completed', 'test__lesson__course')
+    list_select_related = ('user', 'test__lesson')
+    search_fields = ('user__username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ('user', 'test', 'score', 'start_time', 'end_time', 'is_completed')
     inlines = [AnswerInline]
 
@@ -57,5 +157,55 @@ class TestSubmissionAdmin(admin.ModelAdmin):
 class AnswerAdmin(admin.ModelAdmin):
     list_display = ('submission', 'question', 'is_correct')
     list_filter = ('is_correct', 'question__question_type')
+    list_select_related = ('submission__user', 'submission__test', 'question')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ('submission', 'question', 'selected_choices', 'text_answer')
     fields = ('submission', 'question', 'selected_choices', 'text_answer', 'is_correct', 'feedback')
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'user', 'downloads')
+    list_filter = ('view_name', 'method')
+    search_fields = ('path', 'view_name')
+    list_select_related = ('user',)
+    readonly_fields = [field.name for field in RequestProfile._meta.fields] + ['downloads']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Duration (ms)', ordering='duration')
+    def duration_ms(self, obj):
+        return f"{obj.duration * 1000:.0f}"
+
+    @admin.display(description='Download')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">flamegraph</a>',
+            reverse('admin:courses_requestprofile_download', args=[obj.pk, 'pstats']),
+            reverse('admin:courses_requestprofile_download', args=[obj.pk, 'collapsed']),
+        )
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/<str:kind>/', self.admin_site.admin_view(self.download),
+                 name='courses_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        if not self.has_view_permission(request):
+            raise Http404
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        name = {'pstats': profile.stats_file, 'collapsed': profile.collapsed_file}.get(kind)
+        filename = os.path.join(profiling.profiles_root(), name or '')
+        if not name or not os.path.exists(filename):
+            raise Http404
+        return FileResponse(open(filename, 'rb'), as_attachment=True, filename=f"profile-{pk}.{kind}")
+
+    def delete_model(self, request, obj):
+        profiling.delete_files([obj])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        profiling.delete_files(queryset)
+        super().delete_queryset(request, queryset)
@@ -0,0 +1,103 @@
+# async_views.py
+"""
+Async versions of the read-heavy course endpoints, used under ASGI (see
+ASYNC_READ_VIEWS). Handlers await the async ORM, so a request waiting on the
+database or on a slow client does not hold a worker. Responses are the same
+as those of the sync views in views.py, and share their cache entries.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.shortcuts import aget_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from courses_platform.caching import catalog_cache, test_cache
+from . import fast_serializers
+from .models import Lesson, Test, TestSubmission
+from .serializers import TestSubmissionSerializer
+from .views import courses_with_lessons, read_cache_key
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with coroutine GET handlers. Authentication, permissions and
+    throttles run unchanged in a single sync hop. Other methods of the same
+    URL are passed to ``fallback_view``, a sync view such as a viewset's writes.
+    """
+    fallback_view = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.fallback_view is not None and request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(self.fallback_view)(request, *args, **kwargs)
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class CourseListView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+
+    async def get(self, request):
+        # Cache misses are built on the sync side; see CachedReadMixin in views.py
+        data = await catalog_cache.aget_or_build(
+            read_cache_key('list', {}),
+            lambda: fast_serializers.courses(courses_with_lessons()),
+        )
+        return Response(data)
+
+
+class CourseDetailView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+
+    async def get(self, request, pk):
+        data = await catalog_cache.aget_or_build(
+            read_cache_key('detail', {'pk': pk}),
+            lambda: fast_serializers.first_or_404(
+                fast_serializers.courses(courses_with_lessons().filter(pk=pk)), courses_with_lessons(),
+            ),
+        )
+        return Response(data)
+
+
+class LessonsByCourseView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, course_id):
+        return Response(await fast_serializers.alessons(Lesson.objects.filter(course_id=course_id)))
+
+
+class TestByLessonView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, lesson_id):
+        queryset = Test.objects.filter(lesson_id=lesson_id)
+        data = await test_cache.aget_or_build(
+            read_cache_key('detail', {'lesson_id': lesson_id}),
+            lambda: fast_serializers.first_or_404(fast_serializers.tests(queryset), queryset),
+        )
+        return Response(data)
+
+
+class TestSubmissionResultView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        queryset = TestSubmission.objects.filter(user=request.user).prefetch_related('answers__selected_choices')
+        submission = await aget_object_or_404(queryset, pk=pk)
+        return Response(TestSubmissionSerializer(submission, context={'request': request}).data)
@@ -0,0 +1,205 @@
+# bundles.py
+"""
+Versioned course bundles: a whole course with its lessons, tests, questions
+and choices as one JSON document (optionally inside a zip archive).
+
+Imports upsert every level by natural key with bulk queries in a single
+transaction, so the number of queries does not depend on the size of the course.
+"""
+import io
+import json
+import zipfile
+from collections import defaultdict
+from django.db import transaction
+from .models import Course, Lesson, Test, Question, Choice
+from .serializers import sync_rows, QUESTION_FIELDS, CHOICE_FIELDS
+from .signals import invalidate_course_content
+
+BUNDLE_FORMAT = 'courses-platform/course-bundle'
+BUNDLE_VERSION = 1
+BUNDLE_MEMBER = 'course.json'
+
+COURSE_FIELDS = ['name', 'description']
+LESSON_FIELDS = ['title', 'description', 'video_url']
+TEST_FIELDS = ['title', 'description', 'passing_score', 'time_limit']
+
+
+class BundleError(ValueError):
+    pass
+
+
+def export_course(course):
+    """Build the bundle dict of a course"""
+    lessons = list(Lesson.objects.filter(course=course).order_by('id').values('id', *LESSON_FIELDS))
+    tests = {
+        test['lesson_id']: test
+        for test in Test.objects.filter(lesson__course=course).values('id', 'lesson_id', *TEST_FIELDS)
+    }
+    questions = defaultdict(list)
+    for question in Question.objects.filter(test__lesson__course=course).order_by('order', 'id').values(
+            'id', 'test_id', *QUESTION_FIELDS):
+        questions[question.pop('test_id')].append(question)
+    choices = defaultdict(list)
+    for choice in Choice.objects.filter(question__test__lesson__course=course).order_by('id').values(
+            'question_id', *CHOICE_FIELDS):
+        choices[choice.pop('question_id')].append(choice)
+
+    for lesson in lessons:
+        test = tests.get(lesson.pop('id'))
+        if test:
+            test.pop('lesson_id')
+            test['questions'] = questions.get(test.pop('id'), [])
+            for question in test['questions']:
+                question['choices'] = choices.get(question.pop('id'), [])
+        lesson['test'] = test
+
+    return {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'course': {field: getattr(course, field) for field in COURSE_FIELDS},
+        'lessons': lessons,
+    }
+
+
+def dump_bundle(bundle, fp, archive=False):
+    """Write a bundle as JSON, or as a zip archive holding the JSON"""
+    data = json.dumps(bundle, ensure_ascii=False, indent=2).encode('utf-8')
+    if archive:
+        with zipfile.ZipFile(fp, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(BUNDLE_MEMBER, data)
+    else:
+        fp.write(data)
+
+
+def load_bundle(fp):
+    """Read a bundle from a JSON or zip file object"""
+    data = fp.read()
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            data = zf.read(BUNDLE_MEMBER)
+    bundle = json.loads(data)
+
+    if not isinstance(bundle, dict) or bundle.get('format') != BUNDLE_FORMAT:
+        raise BundleError("Not a course bundle")
+    if bundle.get('version') != BUNDLE_VERSION:
+        raise BundleError(f"Unsupported bundle version {bundle.get('version')}")
+    validate_bundle(bundle)
+    return bundle
+
+
+def _check_item(item, path, required):
+    if not isinstance(item, dict):
+        raise BundleError(f"{path}: expected an object")
+    for field in required:
+        if item.get(field) is None:
+            raise BundleError(f"{path}: missing '{field}'")
+
+
+def _check_list(item, field, path):
+    items = item.get(field, [])
+    if not isinstance(items, list):
+        raise BundleError(f"{path}.{field}: expected a list")
+    return items
+
+
+def validate_bundle(bundle):
+    """Check the fields import_course relies on, raising BundleError with the path of the first problem"""
+    _check_item(bundle.get('course'), 'course', ['name'])
+    for i, lesson in enumerate(_check_list(bundle, 'lessons', 'bundle')):
+        path = f"lessons[{i}]"
+        _check_item(lesson, path, ['title', 'video_url'])
+        if not lesson.get('test'):
+            continue
+        path += ".test"
+        _check_item(lesson['test'], path, ['title'])
+        for j, question in enumerate(_check_list(lesson['test'], 'questions', path)):
+            question_path = f"{path}.questions[{j}]"
+            _check_item(question, question_path, ['text'])
+            for k, choice in enumerate(_check_list(question, 'choices', question_path)):
+                _check_item(choice, f"{question_path}.choices[{k}]", ['text'])
+
+
+def _match_ids(existing, items, key):
+    """
+    Give each item the id of an existing row with the same natural key.
+    Rows sharing a key are matched in order. Returns the matched rows.
+    """
+    candidates = defaultdict(list)
+    for obj in existing:
+        candidates[key(obj)].append(obj)
+    matched = []
+    for parent_id, data in items:
+        rows = candidates.get((parent_id, data.get(key.field) if key.field else None))
+        if rows:
+            obj = rows.pop(0)
+            data['id'] = obj.id
+            matched.append(obj)
+        else:
+            data.pop('id', None)
+    return matched
+
+
+def _natural_key(parent_attname, field):
+    def key(obj):
+        return getattr(obj, parent_attname), getattr(obj, field) if field else None
+    key.field = field
+    return key
+
+
+def _upsert(model, parent_field, existing, items, fields, key_field, prune):
+    existing = list(existing)
+    parent_attname = model._meta.get_field(parent_field).attname
+    matched = _match_ids(existing, items, _natural_key(parent_attname, key_field))
+    return sync_rows(model, parent_field, existing if prune else matched, items, fields)
+
+
+@transaction.atomic
+def import_course(bundle, prune=False):
+    """
+    Upsert a bundle. Courses are matched by name, lessons by title, tests by
+    lesson, questions and choices by text. With ``prune`` lessons, questions
+    and choices missing from the bundle are deleted.
+    Returns the course and the number of rows written per model.
+    """
+    validate_bundle(bundle)
+    course_data = bundle['course']
+    course = Course.objects.filter(name=course_data['name']).first()
+    if course is None:
+        course = Course.objects.create(name=course_data['name'], description=course_data.get('description', ''))
+    else:
+        course.description = course_data.get('description', course.description)
+        course.save(update_fields=['description'])
+
+    lessons_data = [(course.id, dict(lesson)) for lesson in bundle.get('lessons', [])]
+    lessons = _upsert(Lesson, 'course', Lesson.objects.filter(course=course),
+                      lessons_data, LESSON_FIELDS, 'title', prune)
+
+    tests_data = [
+        (lesson.id, dict(data['test']))
+        for lesson, (_, data) in zip(lessons, lessons_data) if data.get('test')
+    ]
+    tests = _upsert(Test, 'lesson', Test.objects.filter(lesson__in=lessons),
+                    tests_data, TEST_FIELDS, None, prune=False)
+
+    questions_data = [
+        (test.id, dict(question))
+        for test, (_, data) in zip(tests, tests_data) for question in data.get('questions', [])
+    ]
+    questions = _upsert(Question, 'test', Question.objects.filter(test__in=tests),
+                        questions_data, QUESTION_FIELDS, 'text', prune)
+
+    choices_data = [
+        (question.id, dict(choice))
+        for question, (_, data) in zip(questions, questions_data) for choice in data.get('choices', [])
+    ]
+    choices = _upsert(Choice, 'question', Choice.objects.filter(question__in=questions),
+                      choices_data, CHOICE_FIELDS, 'text', prune)
+
+    # Rows were written in bulk, without signals
+    invalidate_course_content()
+    return course, {
+        'lessons': len(lessons),
+        'tests': len(tests),
+        'questions': len(questions),
+        'choices': len(choices),
+    }
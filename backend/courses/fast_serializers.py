@@ -0,0 +1,161 @@
+# fast_serializers.py
+"""
+Read-only payloads of LessonSerializer, CourseSerializer, TestSerializer and
+QuestionSerializer built straight from values_list() rows, for the hot read endpoints.
+
+DRF serializers build a field list per serializer instance and make several
+calls per field and object. RowSerializer inspects the DRF serializer once
+and keeps, per field, only the column to read and the conversion (if any)
+its to_representation applies, so the output, key order included, stays the
+same. Writes and the API schema keep using the DRF serializers; tests check
+both paths give the same output.
+"""
+from collections import defaultdict
+from operator import itemgetter
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from .models import Lesson, Question, Choice
+from .serializers import (
+    ChoiceSerializer, CourseSerializer, LessonSerializer, QuestionSerializer, TestSerializer,
+    with_lesson_navigation,
+)
+
+# Fields whose to_representation returns database values unchanged
+PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                serializers.ChoiceField, PrimaryKeyRelatedField)
+
+
+class RowSerializer:
+    """
+    Output of ``serializer_class`` for values_list() rows. ``computed`` maps
+    method fields to a (column, function) pair, the function being None to
+    pass the column through. ``nested`` fields are left None for the caller
+    to fill in.
+    """
+
+    def __init__(self, serializer_class, computed=None, nested=()):
+        computed = computed or {}
+        self.names, columns, self.conversions = [], [], []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            self.names.append(name)
+            if name in nested:
+                # Placeholder that keeps the key in its place
+                columns.append('pk')
+                continue
+            if name in computed:
+                column, function = computed[name]
+                if function is not None:
+                    self.conversions.append((name, function, True))
+            elif isinstance(field, PLAIN_FIELDS):
+                column = field.source
+            elif isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer,
+                                    serializers.ManyRelatedField)):
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} needs to be computed or nested")
+            else:
+                column = field.source
+                self.conversions.append((name, field.to_representation, False))
+            columns.append(column)
+
+        self.columns = list(dict.fromkeys(columns))
+        self.getter = itemgetter(*(self.columns.index(column) for column in columns))
+
+    def build(self, row):
+        item = dict(zip(self.names, self.getter(row)))
+        for name, function, always in self.conversions:
+            value = item[name]
+            # Like Serializer.to_representation, None is not converted
+            if always or value is not None:
+                item[name] = function(value)
+        return item
+
+    def rows(self, queryset, parent=None):
+        """Payloads of ``queryset``; as (parent, payload) pairs when a ``parent`` column is given"""
+        # Prefetches do not apply to values() rows
+        queryset = queryset.prefetch_related(None)
+        if parent is None:
+            return [self.build(row) for row in queryset.values_list(*self.columns)]
+        # The getter ignores the extra last column
+        return [(row[-1], self.build(row)) for row in queryset.values_list(*self.columns, parent)]
+
+    async def arows(self, queryset):
+        return [self.build(row) async for row in queryset.prefetch_related(None).values_list(*self.columns)]
+
+
+LESSON = RowSerializer(LessonSerializer, computed={
+    'has_test': ('test__id', lambda test_id: test_id is not None),
+    'test_id': ('test__id', None),
+    'next_lesson_id': ('next_id', None),
+    'prev_lesson_id': ('prev_id', None),
+})
+COURSE = RowSerializer(CourseSerializer, nested=('lessons',))
+CHOICE = RowSerializer(ChoiceSerializer)
+QUESTION = RowSerializer(QuestionSerializer, nested=('choices',))
+TEST = RowSerializer(TestSerializer, nested=('questions',))
+
+
+def _navigable(queryset):
+    if 'next_id' in queryset.query.annotations:
+        return queryset
+    return with_lesson_navigation(queryset)
+
+
+def lessons(queryset):
+    """LessonSerializer(queryset, many=True).data"""
+    return LESSON.rows(_navigable(queryset))
+
+
+async def alessons(queryset):
+    return await LESSON.arows(_navigable(queryset))
+
+
+def courses(queryset):
+    """CourseSerializer(queryset, many=True).data, with lessons in id order"""
+    items = COURSE.rows(queryset)
+    course_lessons = _navigable(Lesson.objects.filter(course_id__in=[item['id'] for item in items]).order_by('id'))
+    by_course = defaultdict(list)
+    for course_id, lesson in LESSON.rows(course_lessons, parent='course_id'):
+        by_course[course_id].append(lesson)
+    for item in items:
+        item['lessons'] = by_course[item['id']]
+    return items
+
+
+def _add_choices(questions):
+    choices = defaultdict(list)
+    if questions:
+        question_choices = Choice.objects.filter(question_id__in=[question['id'] for question in questions])
+        for question_id, choice in CHOICE.rows(question_choices, parent='question_id'):
+            choices[question_id].append(choice)
+    for question in questions:
+        question['choices'] = choices[question['id']]
+
+
+def questions(queryset):
+    """QuestionSerializer(queryset, many=True).data"""
+    items = QUESTION.rows(queryset)
+    _add_choices(items)
+    return items
+
+
+def tests(queryset):
+    """TestSerializer(queryset, many=True).data"""
+    items = TEST.rows(queryset)
+    test_questions = QUESTION.rows(Question.objects.filter(test_id__in=[item['id'] for item in items]), parent='test_id')
+    _add_choices([question for _, question in test_questions])
+    by_test = defaultdict(list)
+    for test_id, question in test_questions:
+        by_test[test_id].append(question)
+    for item in items:
+        item['questions'] = by_test[item['id']]
+    return items
+
+
+def first_or_404(items, queryset):
+    """The single payload of a detail lookup, or the 404 get_object_or_404() would raise"""
+    if not items:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+    return items[0]
@@ -0,0 +1,152 @@
+# funnel.py
+"""
+Incrementally maintained course funnel.
+
+Submission events update per-user LessonProgress rows and bump the
+CourseFunnel / LessonFunnel counters, so reading a funnel never has to
+join Lesson, Test and TestSubmission.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import CourseFunnel, CourseStart, LessonFunnel, LessonProgress, Lesson, TestSubmission
+
+
+def _passed(submission, test):
+    return bool(submission.is_completed and submission.score is not None
+                and submission.score >= test.passing_score)
+
+
+def _bump_course(course_id, **deltas):
+    CourseFunnel.objects.get_or_create(course_id=course_id)
+    CourseFunnel.objects.filter(course_id=course_id).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def _bump_lesson(course_id, lesson_id, **deltas):
+    LessonFunnel.objects.get_or_create(lesson_id=lesson_id, defaults={'course_id': course_id})
+    LessonFunnel.objects.filter(lesson_id=lesson_id).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def _progress_for(user_id, lesson):
+    """Get (and lock) the user's progress row for a lesson, counting a new reach"""
+    progress, created = LessonProgress.objects.get_or_create(
+        user_id=user_id, lesson_id=lesson.id, defaults={'course_id': lesson.course_id}
+    )
+    if created:
+        # The unique CourseStart row decides which of concurrent first reaches counts
+        _, first_in_course = CourseStart.objects.get_or_create(user_id=user_id, course_id=lesson.course_id)
+        if first_in_course:
+            _bump_course(lesson.course_id, started_count=1)
+        _bump_lesson(lesson.course_id, lesson.id, reached_count=1)
+    return LessonProgress.objects.select_for_update().get(pk=progress.pk)
+
+
+@transaction.atomic
+def record_start(submission):
+    """Record that the submission's user reached the submission's lesson"""
+    _progress_for(submission.user_id, submission.test.lesson)
+
+
+@transaction.atomic
+def record_result(submission):
+    """Record a graded (or re-graded) submission"""
+    test = submission.test
+    lesson = test.lesson
+    progress = _progress_for(submission.user_id, lesson)
+
+    if _passed(submission, test):
+        if not progress.passed:
+            progress.passed = True
+            progress.save(update_fields=['passed', 'updated_at'])
+            _bump_lesson(lesson.course_id, lesson.id, passed_count=1)
+    elif progress.passed:
+        # A re-grade may have taken away the only passing submission
+        still_passed = TestSubmission.objects.filter(
+            test=test, user_id=submission.user_id, is_completed=True,
+            score__gte=test.passing_score
+        ).exclude(pk=submission.pk).exists()
+        if not still_passed:
+            progress.passed = False
+            progress.save(update_fields=['passed', 'updated_at'])
+            _bump_lesson(lesson.course_id, lesson.id, passed_count=-1)
+
+
+def get_course_funnel(course_id):
+    """Return the funnel of a course with drop-off per lesson"""
+    funnel = CourseFunnel.objects.filter(course_id=course_id).values('started_count', 'updated_at').first()
+    started = funnel['started_count'] if funnel else 0
+
+    lessons = Lesson.objects.filter(course_id=course_id).order_by('id').values_list(
+        'id', 'title', 'funnel__reached_count', 'funnel__passed_count'
+    )
+
+    steps = []
+    previous = started
+    for lesson_id, title, reached, passed in lessons:
+        reached = reached or 0
+        passed = passed or 0
+        steps.append({
+            "lesson_id": lesson_id,
+            "title": title,
+            "reached": reached,
+            "passed": passed,
+            "drop_off": max(previous - reached, 0),
+        })
+        previous = reached
+
+    return {
+        "course_id": course_id,
+        "started": started,
+        "updated_at": funnel['updated_at'] if funnel else None,
+        "lessons": steps,
+    }
+
+
+@transaction.atomic
+def rebuild_course_funnel(course_id):
+    """Recompute a course funnel from scratch out of its submissions"""
+    LessonProgress.objects.filter(course_id=course_id).delete()
+    CourseStart.objects.filter(course_id=course_id).delete()
+    LessonFunnel.objects.filter(course_id=course_id).delete()
+    CourseFunnel.objects.filter(course_id=course_id).delete()
+
+    progress = {}
+    submissions = TestSubmission.objects.filter(test__lesson__course_id=course_id).values_list(
+        'user_id', 'test__lesson_id', 'is_completed', 'score', 'test__passing_score'
+    )
+    for user_id, lesson_id, is_completed, score, passing_score in submissions.iterator():
+        passed = bool(is_completed and score is not None and score >= passing_score)
+        key = (user_id, lesson_id)
+        progress[key] = progress.get(key, False) or passed
+
+    LessonProgress.objects.bulk_create(
+        LessonProgress(user_id=user_id, lesson_id=lesson_id, course_id=course_id, passed=passed)
+        for (user_id, lesson_id), passed in progress.items()
+    )
+
+    CourseStart.objects.bulk_create(
+        CourseStart(user_id=user_id, course_id=course_id)
+        for user_id in {user_id for user_id, _ in progress}
+    )
+
+    reached = {}
+    passed_counts = {}
+    for (user_id, lesson_id), passed in progress.items():
+        reached[lesson_id] = reached.get(lesson_id, 0) + 1
+        passed_counts[lesson_id] = passed_counts.get(lesson_id, 0) + int(passed)
+
+    LessonFunnel.objects.bulk_create(
+        LessonFunnel(course_id=course_id, lesson_id=lesson_id,
+                     reached_count=count, passed_count=passed_counts[lesson_id])
+        for lesson_id, count in reached.items()
+    )
+    CourseFunnel.objects.create(
+        course_id=course_id,
+        started_count=len({user_id for user_id, _ in progress})
+    )
@@ -0,0 +1,295 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+from courses.models import Lesson, Test, Question, Answer, QuestionType
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+import http.client
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+import uuid
+
+User = get_user_model()
+
+PREFIX = 'bench'
+PASSWORD = f"{PREFIX}-password"
+SCENARIOS = ['catalog', 'lesson', 'test', 'start_submit', 'review', 'register', 'login']
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values))) - 1))
+    return values[index]
+
+
+class Client:
+    """A keep-alive HTTP connection owned by one load generator thread"""
+
+    def __init__(self, url, recorder):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+        self.recorder = recorder
+
+    def request(self, name, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        payload = json.dumps(body) if body is not None else None
+
+        started = time.perf_counter()
+        for attempt in (1, 2):
+            try:
+                self.connection.request(method, self.prefix + path, payload, headers)
+                response = self.connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server closed the keep-alive connection; reconnect once
+                self.connection.close()
+                if attempt == 2:
+                    self.recorder.record(name, time.perf_counter() - started, 0, None)
+                    return 0, None
+        elapsed = time.perf_counter() - started
+
+        queries = QUERIES.search(response.getheader('Server-Timing') or '')
+        self.recorder.record(name, elapsed, response.status, int(queries.group(1)) if queries else None)
+        try:
+            return response.status, json.loads(content) if content else None
+        except ValueError:
+            return response.status, None
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.enabled = False
+
+    def record(self, name, elapsed, status, queries):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.samples.setdefault(name, []).append((elapsed, status, queries))
+
+
+class Command(BaseCommand):
+    help = 'Seeds benchmark data and drives the main API flows with a concurrent load generator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test')
+        parser.add_argument('--seed', action='store_true', help='Generate benchmark data before running')
+        parser.add_argument('--seed-only', action='store_true', help='Generate benchmark data and exit')
+        parser.add_argument('--courses', type=int, default=5)
+        parser.add_argument('--lessons', type=int, default=20, help='Average number of lessons per course')
+        parser.add_argument('--questions', type=int, default=15, help='Average number of questions per test')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma separated scenarios to run')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to run each scenario')
+        parser.add_argument('--warmup', type=float, default=2, help='Unrecorded seconds before each scenario')
+        parser.add_argument('--random-seed', type=int, default=42)
+        parser.add_argument('-o', '--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Compare against the JSON results of an earlier run')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        if options['seed'] or options['seed_only']:
+            self.seed(options)
+            if options['seed_only']:
+                return
+
+        self.rng = random.Random(options['random_seed'])
+        self.load_fixtures(options)
+
+        results = {}
+        for name in scenarios:
+            self.stdout.write(f"Running {name} ({options['concurrency']} clients, {options['duration']}s)")
+            for request_name, result in self.run_scenario(name, options).items():
+                results[request_name] = result
+                self.stdout.write(self.format_result(request_name, result))
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'commit': self.git_commit(),
+                'url': options['url'],
+                'database': connection.vendor,
+                'concurrency': options['concurrency'],
+                'duration': options['duration'],
+                'data': {
+                    'lessons': Lesson.objects.count(),
+                    'questions': Question.objects.count(),
+                    'answers': Answer.objects.count(),
+                    'users': User.objects.count(),
+                },
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def seed(self, options):
+        call_command(
+            'generate_load_data', prefix=PREFIX, courses=options['courses'], lessons=options['lessons'],
+            questions=options['questions'], users=options['users'], stdout=self.stdout,
+        )
+        reviewer, _ = User.objects.get_or_create(
+            username=f"{PREFIX}_reviewer", defaults={'email': f"{PREFIX}_reviewer@example.com", 'is_staff': True},
+        )
+        reviewer.set_password(PASSWORD)
+        reviewer.save()
+
+    def load_fixtures(self, options):
+        """Tokens and ids the scenarios pick from, read directly from the database"""
+        users = list(User.objects.filter(username__startswith=f"{PREFIX}_user_").order_by('id')[:200])
+        reviewer = User.objects.filter(username=f"{PREFIX}_reviewer").first()
+        if not users or reviewer is None:
+            raise CommandError("No benchmark data, run with --seed first")
+        self.users = [(user.username, str(RefreshToken.for_user(user).access_token)) for user in users]
+        self.reviewer_token = str(RefreshToken.for_user(reviewer).access_token)
+
+        self.lesson_ids = list(Lesson.objects.values_list('id', flat=True))
+        self.tests = {}
+        questions = Question.objects.filter(test__isnull=False).prefetch_related('choices')
+        for question in questions:
+            if question.question_type == QuestionType.MULTIPLE_CHOICE:
+                answer = {'question_id': question.id, 'selected_choice_ids': [
+                    choice.id for choice in question.choices.all() if choice.is_correct
+                ]}
+            else:
+                answer = {'question_id': question.id, 'text_answer': "An answer written for the benchmark"}
+            self.tests.setdefault(question.test_id, []).append(answer)
+        self.test_ids = list(self.tests)
+        self.test_lesson_ids = list(Test.objects.filter(id__in=self.tests).values_list('lesson_id', flat=True))
+        self.open_answer_ids = list(
+            Answer.objects.filter(question__question_type=QuestionType.OPEN_ENDED).values_list('id', flat=True)[:5000]
+        )
+        if not self.lesson_ids or not self.tests:
+            raise CommandError("No lessons with tests, run with --seed first")
+
+    def step(self, name, client):
+        """One iteration of a scenario; may issue several requests"""
+        rng = self.rng
+        username, token = rng.choice(self.users)
+        if name == 'catalog':
+            client.request('catalog', 'GET', '/api/courses/courses/', token=token)
+        elif name == 'lesson':
+            client.request('lesson', 'GET', f"/api/courses/lessons/{rng.choice(self.lesson_ids)}/", token=token)
+        elif name == 'test':
+            lesson_id = rng.choice(self.test_lesson_ids)
+            client.request('test', 'GET', f"/api/courses/lessons/{lesson_id}/test/", token=token)
+        elif name == 'start_submit':
+            test_id = rng.choice(self.test_ids)
+            status, body = client.request(
+                'start_test', 'POST', f"/api/courses/tests/{test_id}/start/", {'test': test_id}, token,
+            )
+            if status == 201:
+                client.request(
+                    'submit_test', 'POST', f"/api/courses/test-submissions/{body['id']}/submit/",
+                    {'answers': self.tests[test_id]}, token,
+                )
+        elif name == 'review':
+            if self.open_answer_ids:
+                client.request(
+                    'review', 'PATCH', f"/api/courses/answers/{rng.choice(self.open_answer_ids)}/review/",
+                    {'is_correct': rng.random() < 0.5, 'feedback': "Reviewed during benchmark"}, self.reviewer_token,
+                )
+        elif name == 'register':
+            username = f"{PREFIX}_reg_{uuid.uuid4().hex[:12]}"
+            client.request('register', 'POST', '/api/users/register/', {
+                'username': username, 'email': f"{username}@example.com",
+                'password': PASSWORD, 'full_name': "Benchmark User",
+            })
+        elif name == 'login':
+            client.request('login', 'POST', '/api/users/login/', {'username': username, 'password': PASSWORD})
+
+    def run_scenario(self, name, options):
+        recorder = Recorder()
+        stop_at = time.monotonic() + options['warmup'] + options['duration']
+        record_at = time.monotonic() + options['warmup']
+
+        def worker():
+            client = Client(options['url'], recorder)
+            while time.monotonic() < stop_at:
+                self.step(name, client)
+            client.connection.close()
+
+        def start_recording():
+            time.sleep(max(0, record_at - time.monotonic()))
+            recorder.enabled = True
+
+        with ThreadPoolExecutor(max_workers=options['concurrency'] + 1) as executor:
+            executor.submit(start_recording)
+            futures = [executor.submit(worker) for _ in range(options['concurrency'])]
+            for future in futures:
+                future.result()
+
+        return {
+            request_name: self.summarize(samples, options['duration'])
+            for request_name, samples in recorder.samples.items()
+        }
+
+    def summarize(self, samples, duration):
+        latencies = sorted(elapsed for elapsed, _, _ in samples)
+        queries = [count for _, _, count in samples if count is not None]
+        errors = sum(1 for _, status, _ in samples if not 200 <= status < 400)
+        return {
+            'requests': len(samples),
+            'errors': errors,
+            'throughput': round(len(samples) / duration, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+
+    def format_result(self, name, result):
+        queries = result['queries_per_request']
+        return (
+            f"  {name:<12} {result['requests']:>7} req  {result['throughput']:>8.1f} req/s  "
+            f"p50 {result['p50_ms']:>7.1f}ms  p95 {result['p95_ms']:>7.1f}ms  p99 {result['p99_ms']:>7.1f}ms  "
+            f"{'-' if queries is None else queries} queries/req  {result['errors']} errors"
+        )
+
+    def compare(self, path, results):
+        with open(path) as f:
+            previous = json.load(f)
+        self.stdout.write(f"Compared with {previous['meta'].get('commit') or path}:")
+        for name, result in results.items():
+            before = previous['results'].get(name)
+            if not before:
+                continue
+            self.stdout.write(
+                f"  {name:<12} p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f}ms  "
+                f"throughput {before['throughput']:.1f} -> {result['throughput']:.1f} req/s  "
+                f"queries {before['queries_per_request']} -> {result['queries_per_request']}"
+            )
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from courses.models import Lesson, Test, TestSubmission, QuestionType
+from courses.serializers import CourseSerializer, LessonSerializer, TestSerializer, TestSubmissionSerializer, with_lesson_navigation
+from courses.views import courses_with_lessons
+from courses_platform.parsers import ORJSONParser
+from courses_platform.renderers import ORJSONRenderer, orjson
+import io
+import json
+import timeit
+
+
+class Command(BaseCommand):
+    help = 'Compares the orjson renderer and parser with DRF\'s JSON renderer and parser on course payloads from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=50, help='Renders per timing run')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs; the fastest one is reported')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed; ORJSONRenderer falls back to DRF's renderer")
+
+        payloads = self.payloads()
+        self.stdout.write(f"{'payload':<18} {'size':>9}  {'json':>10}  {'orjson':>10}  speedup  output")
+        for name, data in payloads.items():
+            expected = JSONRenderer().render(data)
+            rendered = ORJSONRenderer().render(data)
+            if rendered == expected:
+                output = 'identical'
+            elif json.loads(rendered) == json.loads(expected):
+                output = 'equal values'
+            else:
+                output = 'DIFFERENT'
+            self.report(
+                f"render {name}", len(expected), output,
+                lambda: JSONRenderer().render(data), lambda: ORJSONRenderer().render(data), options,
+            )
+
+        for name, data in payloads.items():
+            body = JSONRenderer().render(data)
+            self.report(
+                f"parse {name}", len(body), 'identical' if ORJSONParser().parse(io.BytesIO(body)) == data else 'DIFFERENT',
+                lambda: JSONParser().parse(io.BytesIO(body)), lambda: ORJSONParser().parse(io.BytesIO(body)), options,
+            )
+
+    def payloads(self):
+        """Real API payloads: the catalog, all lessons, the largest test, a submission and its answers"""
+        test = Test.objects.annotate(size=Count('questions')).order_by('-size').first()
+        submission = TestSubmission.objects.annotate(size=Count('answers')).order_by('-size').first()
+        if test is None or submission is None:
+            raise CommandError("No tests or submissions, run `manage.py benchmark --seed-only` first")
+        test = Test.objects.prefetch_related('questions__choices').get(pk=test.pk)
+        submission = TestSubmission.objects.prefetch_related('answers__selected_choices').get(pk=submission.pk)
+
+        answers = []
+        for question in test.questions.all():
+            if question.question_type == QuestionType.MULTIPLE_CHOICE:
+                answers.append({'question_id': question.id, 'selected_choice_ids': [c.id for c in question.choices.all()][:1]})
+            else:
+                answers.append({'question_id': question.id, 'text_answer': "An answer written for the JSON benchmark"})
+
+        # Round trip through DRF so payloads hold what views render (ReturnDict, ReturnList)
+        return {
+            'catalog': CourseSerializer(courses_with_lessons(), many=True).data,
+            'lessons': LessonSerializer(with_lesson_navigation(Lesson.objects.all()), many=True).data,
+            'test': TestSerializer(test).data,
+            'result': TestSubmissionSerializer(submission).data,
+            'submit': {'answers': answers},
+        }
+
+    def report(self, name, size, output, baseline, candidate, options):
+        before = min(timeit.repeat(baseline, number=options['number'], repeat=options['repeat'])) / options['number']
+        after = min(timeit.repeat(candidate, number=options['number'], repeat=options['repeat'])) / options['number']
+        self.stdout.write(
+            f"{name:<18} {size / 1024:>7.1f}KB  {before * 1e6:>8.0f}us  {after * 1e6:>8.0f}us  "
+            f"{before / after:>6.1f}x  {output}"
+        )
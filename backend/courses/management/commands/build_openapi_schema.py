@@ -0,0 +1,17 @@
+import os
+from django.core.management.base import BaseCommand
+from courses_platform.openapi import build_schema, schema_path
+
+class Command(BaseCommand):
+    help = 'Generates the OpenAPI schema into STATIC_ROOT, to be served as a static file; run after collectstatic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', help='Write the schema to this file instead')
+
+    def handle(self, *args, **options):
+        path = options['output'] or schema_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        schema = build_schema()
+        with open(path, 'wb') as f:
+            f.write(schema)
+        self.stdout.write(f"Wrote {len(schema) / 1024:.1f}KB schema to {path}")
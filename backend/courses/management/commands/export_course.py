@@ -0,0 +1,26 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from courses.models import Course
+from courses.bundles import export_course, dump_bundle
+
+class Command(BaseCommand):
+    help = 'Exports a course with its lessons, tests, questions and choices as a course bundle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('-o', '--output', help='Output file; a .zip name writes a zip archive (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(id=options['course_id'])
+        except Course.DoesNotExist:
+            raise CommandError(f"Course {options['course_id']} does not exist")
+        
+        bundle = export_course(course)
+        output = options['output']
+        if output:
+            with open(output, 'wb') as fp:
+                dump_bundle(bundle, fp, archive=output.endswith('.zip'))
+            self.stderr.write(f"Exported course '{course.name}' with {len(bundle['lessons'])} lessons to {output}")
+        else:
+            dump_bundle(bundle, sys.stdout.buffer)
@@ -0,0 +1,234 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from courses.models import Course, Lesson, Test, Question, Choice, QuestionType, TestSubmission, Answer
+from courses.funnel import rebuild_course_funnel
+from courses.signals import invalidate_course_content
+from datetime import timedelta
+import random
+import time
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Generates synthetic courses, users, submissions and answers for load and scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=5)
+        parser.add_argument('--lessons', type=int, default=20, help='Average number of lessons per course')
+        parser.add_argument('--questions', type=int, default=15, help='Average number of questions per test')
+        parser.add_argument('--choices', type=int, default=4, help='Choices per multiple choice question')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--open-ratio', type=float, default=0.3, help='Share of open ended questions')
+        parser.add_argument('--retake-rate', type=float, default=0.15, help='Chance of retaking a failed test')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default='load', help='Prefix of generated course names and usernames')
+        parser.add_argument('--days', type=int, default=90, help='Submissions start within this many past days')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+        self.row_count = 0
+
+        with transaction.atomic():
+            tests = self.create_content(options)
+        with transaction.atomic():
+            users = self.create_users(options)
+        self.create_submissions(options, tests, users)
+
+        for course_id in {course_id for course_id, _ in tests}:
+            rebuild_course_funnel(course_id)
+        # Rows were written in bulk, without signals
+        invalidate_course_content()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"Generated {self.row_count} rows in {elapsed:.1f}s ({self.row_count / elapsed:.0f} rows/s)")
+
+    def report(self, label, count):
+        self.row_count += count
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"  {label}: {count} ({elapsed:.1f}s)")
+
+    def around(self, mean):
+        """A count spread around a mean, never below 1"""
+        return max(1, int(self.rng.gauss(mean, mean / 3)))
+
+    def create_content(self, options):
+        prefix = options['prefix']
+        # Reruns add new courses instead of repeating the names of earlier ones
+        offset = Course.objects.filter(name__startswith=f"{prefix} course ").count()
+        courses = Course.objects.bulk_create(
+            Course(name=f"{prefix} course {i}", description=f"Synthetic course {i} for load testing")
+            for i in range(offset, offset + options['courses'])
+        )
+        self.report('courses', len(courses))
+
+        lessons = Lesson.objects.bulk_create((
+            Lesson(course=course, title=f"{course.name} lesson {i}",
+                   description="<p>" + "Synthetic lesson content. " * self.rng.randint(20, 200) + "</p>",
+                   video_url=f"https://www.youtube.com/watch?v=load{course.id}x{i}")
+            for course in courses for i in range(self.around(options['lessons']))
+        ), batch_size=self.batch_size)
+        self.report('lessons', len(lessons))
+
+        tests = Test.objects.bulk_create((
+            Test(lesson=lesson, title=f"Test for {lesson.title}",
+                 passing_score=self.rng.choice([50, 60, 70, 70, 80]))
+            for lesson in lessons
+        ), batch_size=self.batch_size)
+        self.report('tests', len(tests))
+
+        questions = []
+        for test in tests:
+            for i in range(self.around(options['questions'])):
+                is_open = self.rng.random() < options['open_ratio']
+                questions.append(Question(
+                    test=test,
+                    text=f"Synthetic question {i} of {test.title}?",
+                    question_type=QuestionType.OPEN_ENDED if is_open else QuestionType.MULTIPLE_CHOICE,
+                    points=self.rng.choice([1, 1, 1, 2, 3]),
+                    order=i,
+                    correct_answer="synthetic model answer, several meaningful concepts" if is_open else None,
+                ))
+        Question.objects.bulk_create(questions, batch_size=self.batch_size)
+        self.report('questions', len(questions))
+
+        choices = Choice.objects.bulk_create((
+            Choice(question=question, text=f"Choice {j}", is_correct=j == 0)
+            for question in questions if question.question_type == QuestionType.MULTIPLE_CHOICE
+            for j in range(options['choices'])
+        ), batch_size=self.batch_size)
+        self.report('choices', len(choices))
+
+        # Keep only what grading needs: (question id, type, points, correct choice, wrong choices)
+        choices_by_question = {}
+        for choice in choices:
+            choices_by_question.setdefault(choice.question_id, []).append(choice)
+        questions_by_test = {}
+        for question in questions:
+            question_choices = choices_by_question.get(question.id, [])
+            questions_by_test.setdefault(question.test_id, []).append((
+                question.id, question.question_type, question.points,
+                [c.id for c in question_choices if c.is_correct],
+                [c.id for c in question_choices if not c.is_correct],
+            ))
+
+        tests_by_course = {}
+        lesson_course = {lesson.id: lesson.course_id for lesson in lessons}
+        for test in tests:
+            tests_by_course.setdefault(lesson_course[test.lesson_id], []).append(
+                (test.id, test.passing_score, questions_by_test.get(test.id, []))
+            )
+        return [(course.id, tests_by_course.get(course.id, [])) for course in courses]
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        offset = User.objects.filter(username__startswith=f"{prefix}_user_").count()
+        # Hashing once keeps generation fast; every synthetic user shares the password
+        password = make_password(f"{prefix}-password")
+        users = User.objects.bulk_create((
+            User(username=f"{prefix}_user_{i}", email=f"{prefix}_user_{i}@example.com",
+                 full_name=f"Load User {i}", password=password)
+            for i in range(offset, offset + options['users'])
+        ), batch_size=self.batch_size)
+        self.report('users', len(users))
+        return [user.id for user in users]
+
+    def create_submissions(self, options, tests, users):
+        # Course popularity follows a long tail
+        weights = [1 / (rank + 1) for rank in range(len(tests))]
+        pending = []
+        totals = {'submissions': 0, 'answers': 0, 'selected choices': 0}
+        # Submissions end at the latest now
+        latest = timezone.now() - timedelta(minutes=30)
+
+        for user_id in users:
+            ability = self.rng.betavariate(5, 2)
+            _, course_tests = self.rng.choices(tests, weights)[0]
+            # Each student works through the course from some day in the past until now
+            start_time = latest - timedelta(days=self.rng.uniform(0, options['days']))
+            step = (latest - start_time) / (3 * len(course_tests) + 1)
+            for test in course_tests:
+                passed = False
+                for attempt in range(3):
+                    if attempt and (passed or self.rng.random() >= options['retake_rate']):
+                        break
+                    start_time += step * self.rng.random()
+                    passed = self.build_submission(pending, user_id, test, ability, start_time)
+                # Students drop off as the course goes on
+                if self.rng.random() > 0.85:
+                    break
+            if len(pending) >= self.batch_size:
+                self.flush(pending, totals)
+        self.flush(pending, totals)
+
+        for label, count in totals.items():
+            self.report(label, count)
+
+    def build_submission(self, pending, user_id, test, ability, start_time):
+        test_id, passing_score, questions = test
+        submission = TestSubmission(test_id=test_id, user_id=user_id, start_time=start_time)
+        answers = []
+
+        # A few attempts are abandoned before submitting
+        if self.rng.random() < 0.05:
+            pending.append((submission, answers))
+            return False
+
+        total_points = earned_points = 0
+        for question_id, question_type, points, correct_ids, wrong_ids in questions:
+            total_points += points
+            answer = Answer(question_id=question_id)
+            if question_type == QuestionType.MULTIPLE_CHOICE:
+                answer.is_correct = self.rng.random() < ability
+                picked = correct_ids if answer.is_correct or not wrong_ids else [self.rng.choice(wrong_ids)]
+                answers.append((answer, picked))
+            else:
+                answer.text_answer = "synthetic student answer"
+                # Part of the open answers still waits for manual review
+                answer.is_correct = None if self.rng.random() < 0.3 else self.rng.random() < ability
+                answers.append((answer, []))
+            if answer.is_correct:
+                earned_points += points
+
+        submission.score = (earned_points / total_points) * 100 if total_points else 0
+        submission.end_time = start_time + timedelta(minutes=self.rng.randint(2, 30))
+        submission.is_completed = True
+        pending.append((submission, answers))
+        return submission.score >= passing_score
+
+    def flush(self, pending, totals):
+        if not pending:
+            return
+        with transaction.atomic():
+            submissions = [submission for submission, _ in pending]
+            start_times = [submission.start_time for submission in submissions]
+            TestSubmission.objects.bulk_create(submissions, batch_size=self.batch_size)
+            # bulk_create() stamps the auto_now_add start_time with the current time
+            for submission, start_time in zip(submissions, start_times):
+                submission.start_time = start_time
+            TestSubmission.objects.bulk_update(submissions, ['start_time'], batch_size=self.batch_size)
+            answers = []
+            for submission, submission_answers in pending:
+                for answer, _ in submission_answers:
+                    answer.submission_id = submission.id
+                    answers.append(answer)
+            Answer.objects.bulk_create(answers, batch_size=self.batch_size)
+
+            Through = Answer.selected_choices.through
+            selected = [
+                Through(answer_id=answer.id, choice_id=choice_id)
+                for _, submission_answers in pending
+                for answer, choice_ids in submission_answers
+                for choice_id in choice_ids
+            ]
+            Through.objects.bulk_create(selected, batch_size=self.batch_size)
+
+        totals['submissions'] += len(pending)
+        totals['answers'] += len(answers)
+        totals['selected choices'] += len(selected)
+        pending.clear()
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from courses.bundles import load_bundle, import_course
+
+class Command(BaseCommand):
+    help = 'Imports a course bundle (JSON or zip), upserting course content by natural key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundle', help='Path to a .json or .zip course bundle')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete lessons, questions and choices that are missing from the bundle')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['bundle'], 'rb') as fp:
+                bundle = load_bundle(fp)
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not read bundle: {e}")
+        
+        course, counts = import_course(bundle, prune=options['prune'])
+        
+        elapsed = time.monotonic() - started
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(f"Imported course '{course.name}' ({summary}) in {elapsed:.2f}s")
@@ -1,64 +1,184 @@
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
 from courses.models import Lesson, Test, Question, Choice, QuestionType
+from courses.signals import invalidate_course_content
+from concurrent.futures import ProcessPoolExecutor
+import bisect
+import multiprocessing
 import json
+import os
+import time
 
-class Command(BaseCommand):
-    help = 'Migrates data from Lesson.quiz JSONField to Test model structure'
+def pending_lessons():
+    """Lessons with quiz data that have not been migrated yet"""
+    return Lesson.objects.exclude(quiz={}).exclude(quiz=None).filter(test__isnull=True)
 
-    def handle(self, *args, **options):
-        lessons_with_quiz = Lesson.objects.exclude(quiz={}).exclude(quiz=None)
-        self.stdout.write(f"Found {lessons_with_quiz.count()} lessons with quiz data to migrate")
-        
-        migrated_count = 0
-        skipped_count = 0
-        
-        for lesson in lessons_with_quiz:
-            # Skip if this lesson already has a test
-            if hasattr(lesson, 'test'):
-                self.stdout.write(f"Skipping lesson '{lesson.title}' - already has a test")
-                skipped_count += 1
-                continue
-            
-            quiz_data = lesson.quiz
-            
-            # Validate the quiz data has the expected structure
-            if not isinstance(quiz_data, dict) or 'questions' not in quiz_data:
-                self.stdout.write(f"Skipping lesson '{lesson.title}' - quiz data does not have expected structure")
-                skipped_count += 1
-                continue
-            
-            # Create a new test for this lesson
-            test = Test.objects.create(
-                lesson=lesson,
-                title=f"Quiz for {lesson.title}",
-                description="Migrated from lesson quiz data",
-                passing_score=70,  # Default
-                time_limit=30      # Default
-            )
-            
-            # Create questions for the test
-            for i, q_data in enumerate(quiz_data.get('questions', [])):
-                question_type = QuestionType.MULTIPLE_CHOICE
-                
-                # Create the question
-                question = Question.objects.create(
+def split_ranges(lesson_ids, workers):
+    """Split sorted lesson ids into at most `workers` disjoint (first, last) ranges"""
+    size = -(-len(lesson_ids) // workers)
+    return [(lesson_ids[i], lesson_ids[min(i + size, len(lesson_ids)) - 1])
+            for i in range(0, len(lesson_ids), size)]
+
+def uncovered_ranges(lesson_ids, ranges):
+    """
+    Ranges of the sorted lesson ids outside all of ``ranges``, one per gap
+    between them, so the new ranges stay disjoint from the given ones
+    """
+    bounds = sorted(ranges)
+    gaps = {}
+    for lesson_id in lesson_ids:
+        gap = bisect.bisect(bounds, (lesson_id,))
+        if gap and bounds[gap - 1][0] <= lesson_id <= bounds[gap - 1][1]:
+            continue
+        if gap < len(bounds) and bounds[gap][0] == lesson_id:
+            continue
+        gaps.setdefault(gap, []).append(lesson_id)
+    return [(ids[0], ids[-1]) for ids in gaps.values()]
+
+def migrate_chunk(lessons):
+    """Create tests, questions and choices for a chunk of lessons in one transaction"""
+    tests, quizzes, skipped = [], [], []
+    for lesson in lessons:
+        quiz_data = lesson.quiz
+
+        # Validate the quiz data has the expected structure
+        if not isinstance(quiz_data, dict) or 'questions' not in quiz_data:
+            skipped.append(lesson)
+            continue
+
+        tests.append(Test(
+            lesson=lesson,
+            title=f"Quiz for {lesson.title}",
+            description="Migrated from lesson quiz data",
+            passing_score=70,  # Default
+            time_limit=30      # Default
+        ))
+        quizzes.append(quiz_data.get('questions', []))
+
+    with transaction.atomic():
+        Test.objects.bulk_create(tests)
+
+        questions, choices_data = [], []
+        for test, quiz_questions in zip(tests, quizzes):
+            for i, q_data in enumerate(quiz_questions):
+                questions.append(Question(
                     test=test,
                     text=q_data.get('question', ''),
-                    question_type=question_type,
+                    question_type=QuestionType.MULTIPLE_CHOICE,
                     points=1,
                     order=i
-                )
-                
-                # Create choices for the question
-                for j, choice_text in enumerate(q_data.get('choices', [])):
-                    is_correct = j == q_data.get('correctIndex', 0)
-                    Choice.objects.create(
-                        question=question,
-                        text=choice_text,
-                        is_correct=is_correct
-                    )
-            
-            migrated_count += 1
-            self.stdout.write(f"Migrated quiz for lesson '{lesson.title}'")
-        
-        self.stdout.write(f"Migration complete: {migrated_count} migrated, {skipped_count} skipped") 
\ No newline at end of file
+                ))
+                choices_data.append(q_data)
+        Question.objects.bulk_create(questions)
+
+        Choice.objects.bulk_create(
+            Choice(question=question, text=choice_text, is_correct=j == q_data.get('correctIndex', 0))
+            for question, q_data in zip(questions, choices_data)
+            for j, choice_text in enumerate(q_data.get('choices', []))
+        )
+        invalidate_course_content()
+
+    return len(tests), len(questions), skipped
+
+def read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as fp:
+            return json.load(fp)
+    return {}
+
+def write_checkpoint(path, key, last_id):
+    # Workers may race on this file; a lost update only makes a resume rescan
+    # lessons that pending_lessons() already excludes, so nothing is duplicated
+    checkpoint = read_checkpoint(path)
+    checkpoint[key] = last_id
+    tmp_path = f"{path}.{os.getpid()}"
+    with open(tmp_path, 'w') as fp:
+        json.dump(checkpoint, fp)
+    os.replace(tmp_path, path)
+
+def migrate_range(first_id, last_id, chunk_size, checkpoint_path=None):
+    """Migrate all pending lessons with ids in [first_id, last_id], committing per chunk"""
+    key = f"{first_id}-{last_id}"
+    after_id = read_checkpoint(checkpoint_path).get(key, first_id - 1)
+    migrated_count = question_count = 0
+    skipped = []
+
+    while True:
+        lessons = list(pending_lessons().filter(id__gt=after_id, id__lte=last_id).order_by('id')[:chunk_size])
+        if not lessons:
+            break
+
+        migrated, questions, chunk_skipped = migrate_chunk(lessons)
+        migrated_count += migrated
+        question_count += questions
+        skipped += [(lesson.id, lesson.title) for lesson in chunk_skipped]
+
+        after_id = lessons[-1].id
+        if checkpoint_path:
+            write_checkpoint(checkpoint_path, key, after_id)
+
+    connections.close_all()
+    return migrated_count, question_count, skipped
+
+class Command(BaseCommand):
+    help = 'Migrates data from Lesson.quiz JSONField to Test model structure'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of lessons migrated and committed per chunk')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes migrating disjoint lesson id ranges in parallel')
+        parser.add_argument('--checkpoint', help='File recording the last committed lesson id of each range')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        lesson_ids = list(pending_lessons().order_by('id').values_list('id', flat=True))
+        self.stdout.write(f"Found {len(lesson_ids)} lessons with quiz data to migrate")
+        if not lesson_ids:
+            return
+
+        chunk_size = max(options['chunk_size'], 1)
+        workers = max(options['workers'], 1)
+        checkpoint_path = options['checkpoint']
+        ranges = split_ranges(lesson_ids, workers)
+        new_ranges = ranges
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            # Resume with the ranges of the interrupted run, plus ranges for pending
+            # lessons outside them, e.g. lessons created since
+            resumed = [tuple(map(int, key.split('-'))) for key in read_checkpoint(checkpoint_path)]
+            if resumed:
+                new_ranges = uncovered_ranges(lesson_ids, resumed)
+                ranges = resumed + new_ranges
+        if checkpoint_path:
+            for first_id, last_id in new_ranges:
+                write_checkpoint(checkpoint_path, f"{first_id}-{last_id}", first_id - 1)
+
+        if workers == 1:
+            results = [migrate_range(first_id, last_id, chunk_size, checkpoint_path)
+                       for first_id, last_id in ranges]
+        else:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = [executor.submit(migrate_range, first_id, last_id, chunk_size, checkpoint_path)
+                           for first_id, last_id in ranges]
+                results = [future.result() for future in futures]
+
+        migrated_count = sum(result[0] for result in results)
+        question_count = sum(result[1] for result in results)
+        for _, _, skipped in results:
+            for lesson_id, title in skipped:
+                self.stdout.write(f"Skipping lesson '{title}' - quiz data does not have expected structure")
+        skipped_count = sum(len(result[2]) for result in results)
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Migration complete: {migrated_count} migrated, {skipped_count} skipped")
+        self.stdout.write(
+            f"Throughput: {migrated_count / elapsed:.1f} lessons/s, "
+            f"{question_count / elapsed:.1f} questions/s over {elapsed:.2f}s with {len(ranges)} range(s)"
+        )
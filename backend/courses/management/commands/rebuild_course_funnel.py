@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from courses.models import Course
+from courses.funnel import rebuild_course_funnel
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized course funnels from existing test submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='Only rebuild the funnel of this course id')
+
+    def handle(self, *args, **options):
+        course_ids = Course.objects.values_list('id', flat=True)
+        if options['course']:
+            course_ids = course_ids.filter(id=options['course'])
+        
+        rebuilt_count = 0
+        for course_id in course_ids:
+            rebuild_course_funnel(course_id)
+            rebuilt_count += 1
+            self.stdout.write(f"Rebuilt funnel for course {course_id}")
+        
+        self.stdout.write(f"Rebuild complete: {rebuilt_count} courses")
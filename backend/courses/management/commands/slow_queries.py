@@ -0,0 +1,63 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = 'Summarizes the slow-query log: the top query fingerprints by total time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Slow-query log file (default: SLOW_QUERY_LOG)')
+        parser.add_argument('--top', type=int, default=20, help='Number of fingerprints to show')
+        parser.add_argument('--view', help='Only count queries from this view name')
+        parser.add_argument('--since', help='Only count queries logged at or after this ISO timestamp')
+        parser.add_argument('--plans', action='store_true', help='Print the captured query plan of each fingerprint')
+
+    def handle(self, *args, **options):
+        log_file = options['log'] or settings.SLOW_QUERY_LOG
+        try:
+            with open(log_file) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            raise CommandError(f"No slow-query log at {log_file}")
+
+        summary = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if options['view'] and entry.get('view') != options['view']:
+                continue
+            if options['since'] and entry['time'] < options['since']:
+                continue
+            item = summary.setdefault(entry['fingerprint_id'], {
+                'fingerprint': entry['fingerprint'],
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': set(),
+                'plan': None,
+            })
+            item['count'] += 1
+            item['total_ms'] += entry['duration_ms']
+            item['max_ms'] = max(item['max_ms'], entry['duration_ms'])
+            item['views'].add(entry.get('view') or '-')
+            item['plan'] = entry.get('plan') or item['plan']
+
+        if not summary:
+            self.stdout.write("No slow queries logged")
+            return
+
+        top = sorted(summary.items(), key=lambda kv: kv[1]['total_ms'], reverse=True)[:options['top']]
+        for fingerprint_id, item in top:
+            self.stdout.write(
+                f"{fingerprint_id}  total {item['total_ms']:.0f}ms  count {item['count']}  "
+                f"mean {item['total_ms'] / item['count']:.1f}ms  max {item['max_ms']:.1f}ms  "
+                f"views {', '.join(sorted(item['views']))}"
+            )
+            self.stdout.write(f"    {item['fingerprint'][:500]}")
+            if options['plans'] and item['plan']:
+                for row in item['plan']:
+                    self.stdout.write(f"      {row}")
+
+        self.stdout.write(f"{len(summary)} fingerprints, {sum(item['count'] for item in summary.values())} slow queries")
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """CREATE INDEX CONCURRENTLY on PostgreSQL so tables stay writable, a plain CREATE INDEX elsewhere"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if schema_editor.connection.vendor == 'postgresql':
+                schema_editor.add_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if schema_editor.connection.vendor == 'postgresql':
+                schema_editor.remove_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, self.index)
+
+
+class Migration(migrations.Migration):
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('courses', '0011_request_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='answer',
+            index=models.Index(fields=['submission', 'question'], name='answer_submission_question_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('is_correct__isnull', True)), fields=['question'], name='answer_unreviewed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'id'], name='lesson_course_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='question',
+            index=models.Index(fields=['test', 'order'], name='question_test_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='testsubmission',
+            index=models.Index(fields=['user', 'test', 'is_completed'], name='submission_user_test_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_course_starts(apps, schema_editor):
+    """Users with progress in a course have already been counted as starting it"""
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    CourseStart = apps.get_model('courses', 'CourseStart')
+    starts = LessonProgress.objects.values_list('user_id', 'course_id').distinct()
+    CourseStart.objects.bulk_create(
+        (CourseStart(user_id=user_id, course_id=course_id) for user_id, course_id in starts.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_access_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='starts', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_starts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'course')},
+            },
+        ),
+        migrations.RunPython(backfill_course_starts, migrations.RunPython.noop),
+    ]
@@ -18,6 +18,12 @@ class Lesson(models.Model):
     quiz = models.JSONField(default=dict, help_text="Deprecated: Use Test model instead")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Lessons of a course in id order, and next/prev lesson lookups
+            models.Index(fields=['course', 'id'], name='lesson_course_id_idx'),
+        ]
+    
     def __str__(self):
         return self.title
     
@@ -56,6 +62,9 @@ class Question(models.Model):
     
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['test', 'order'], name='question_test_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_question_type_display()}: {self.text[:50]}"
@@ -76,6 +85,12 @@ class TestSubmission(models.Model):
     end_time = models.DateTimeField(null=True, blank=True)
     is_completed = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # A user's (completed) submissions of a test
+            models.Index(fields=['user', 'test', 'is_completed'], name='submission_user_test_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username}'s submission for {self.test.title}"
 
@@ -87,5 +102,82 @@ class Answer(models.Model):
     is_correct = models.BooleanField(null=True, blank=True)
     feedback = models.TextField(blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            # A submission's answers with their questions, e.g. for re-scoring
+            models.Index(fields=['submission', 'question'], name='answer_submission_question_idx'),
+            # Answers still waiting for a manual review
+            models.Index(fields=['question'], condition=models.Q(is_correct__isnull=True),
+                         name='answer_unreviewed_idx'),
+        ]
+    
     def __str__(self):
         return f"Answer to {self.question.text[:30]}"
+
+class LessonProgress(models.Model):
+    """Per-user progress through a lesson, maintained from test submission events"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="lesson_progress")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="progress")
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="progress")
+    passed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('user', 'lesson')
+        indexes = [
+            models.Index(fields=['user', 'course']),
+        ]
+    
+    def __str__(self):
+        return f"Progress of user {self.user_id} on lesson {self.lesson_id}"
+
+class CourseStart(models.Model):
+    """A user's first reach of any lesson in a course; unique so concurrent reaches count once"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="course_starts")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="starts")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('user', 'course')
+    
+    def __str__(self):
+        return f"Start of user {self.user_id} on course {self.course_id}"
+
+class CourseFunnel(models.Model):
+    """Materialized number of users who started a course"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name="funnel")
+    started_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Funnel for course {self.course_id}"
+
+class LessonFunnel(models.Model):
+    """Materialized number of users who reached and passed a lesson"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="lesson_funnels")
+    lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, related_name="funnel")
+    reached_count = models.PositiveIntegerField(default=0)
+    passed_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Funnel for lesson {self.lesson_id}"
+
+class RequestProfile(models.Model):
+    """A profiled request; see courses_platform/profiling.py"""
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    view_name = models.CharField(max_length=255, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration = models.FloatField(help_text="Wall time in seconds")
+    samples = models.PositiveIntegerField(default=0)
+    stats_file = models.CharField(max_length=255)
+    collapsed_file = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration * 1000:.0f}ms)"
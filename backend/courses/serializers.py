@@ -1,7 +1,17 @@
 # serializers.py
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from .models import Course, Lesson, Test, Question, Choice, TestSubmission, Answer
 
+def with_lesson_navigation(queryset):
+    """Join each lesson's test and annotate its neighbours, so LessonSerializer needs no extra queries"""
+    siblings = Lesson.objects.filter(course=OuterRef('course'))
+    return queryset.select_related('test').annotate(
+        next_id=Subquery(siblings.filter(id__gt=OuterRef('id')).order_by('id').values('id')[:1]),
+        prev_id=Subquery(siblings.filter(id__lt=OuterRef('id')).order_by('-id').values('id')[:1]),
+    )
+
 class LessonSerializer(serializers.ModelSerializer):
     has_test = serializers.SerializerMethodField()
     test_id = serializers.SerializerMethodField()
@@ -25,6 +35,8 @@ class LessonSerializer(serializers.ModelSerializer):
         return None
 
     def get_next_lesson_id(self, obj):
+        if hasattr(obj, 'next_id'):
+            return obj.next_id
         # Find the next lesson in the same course with a higher ID
         next_lesson = Lesson.objects.filter(course=obj.course, id__gt=obj.id).order_by('id').first()
         if next_lesson:
@@ -32,6 +44,8 @@ class LessonSerializer(serializers.ModelSerializer):
         return None
 
     def get_prev_lesson_id(self, obj):
+        if hasattr(obj, 'prev_id'):
+            return obj.prev_id
         # Find the previous lesson in the same course with a lower ID
         prev_lesson = Lesson.objects.filter(course=obj.course, id__lt=obj.id).order_by('-id').first()
         if prev_lesson:
@@ -45,36 +59,97 @@ class CourseSerializer(serializers.ModelSerializer):
         model = Course
         fields = '__all__'
 
+QUESTION_FIELDS = ['text', 'question_type', 'points', 'order', 'correct_answer', 'explanation']
+CHOICE_FIELDS = ['text', 'is_correct']
+
+def sync_rows(model, parent_field, existing, items, fields):
+    """
+    Diff validated ``items`` (pairs of parent id and data) against ``existing``
+    rows by id: changed rows are bulk-updated, new rows bulk-created and rows
+    that are no longer listed deleted. Returns the saved rows in item order.
+    """
+    parent_attname = model._meta.get_field(parent_field).attname
+    existing = {obj.id: obj for obj in existing}
+    rows, to_create, to_update = [], [], []
+    
+    for parent_id, data in items:
+        obj = existing.pop(data.get('id'), None)
+        if obj is None:
+            obj = model(**{parent_attname: parent_id}, **{f: data[f] for f in fields if f in data})
+            to_create.append(obj)
+        else:
+            changed = getattr(obj, parent_attname) != parent_id
+            setattr(obj, parent_attname, parent_id)
+            for field in fields:
+                if field in data and getattr(obj, field) != data[field]:
+                    setattr(obj, field, data[field])
+                    changed = True
+            if changed:
+                to_update.append(obj)
+        rows.append(obj)
+    
+    # Only rows that were removed lose their history (e.g. answers)
+    if existing:
+        model.objects.filter(id__in=list(existing)).delete()
+    if to_create:
+        model.objects.bulk_create(to_create)
+    if to_update:
+        model.objects.bulk_update(to_update, [parent_field] + fields)
+    return rows
+
+def sync_questions(test, questions_data, existing):
+    """
+    Sync the questions of a test and their choices in a bounded number of
+    queries. A question without ``choices`` keeps its choices, while
+    ``choices: []`` deletes all of them.
+    """
+    choices_data = [question_data.pop('choices', None) for question_data in questions_data]
+    questions = sync_rows(Question, 'test', existing, [(test.id, q) for q in questions_data], QUESTION_FIELDS)
+    
+    synced = [(question, choices) for question, choices in zip(questions, choices_data) if choices is not None]
+    if synced:
+        existing_choices = Choice.objects.filter(question__in=[question for question, _ in synced])
+        sync_rows(Choice, 'question', existing_choices,
+                  [(question.id, choice) for question, choices in synced for choice in choices],
+                  CHOICE_FIELDS)
+    return questions
+
 class ChoiceSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = Choice
         fields = ['id', 'text', 'is_correct']
 
 class QuestionSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
     choices = ChoiceSerializer(many=True, read_only=False, required=False)
 
     class Meta:
         model = Question
         fields = ['id', 'text', 'question_type', 'points', 'order', 'choices', 'correct_answer', 'explanation']
 
+    @transaction.atomic
     def create(self, validated_data):
+        validated_data.pop('id', None)
         choices_data = validated_data.pop('choices', [])
         question = Question.objects.create(**validated_data)
         
-        for choice_data in choices_data:
-            Choice.objects.create(question=question, **choice_data)
+        Choice.objects.bulk_create(Choice(question=question, **{f: c[f] for f in CHOICE_FIELDS if f in c})
+                                   for c in choices_data)
         
         return question
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        choices_data = validated_data.pop('choices', [])
+        validated_data.pop('id', None)
+        choices_data = validated_data.pop('choices', None)
         instance = super().update(instance, validated_data)
         
-        # Handle existing choices - delete, update or create
-        if choices_data:
-            instance.choices.all().delete()  # Remove existing choices
-            for choice_data in choices_data:
-                Choice.objects.create(question=instance, **choice_data)
+        # Update, create and delete only the choices that changed
+        if choices_data is not None:
+            sync_rows(Choice, 'question', instance.choices.all(),
+                      [(instance.id, choice) for choice in choices_data], CHOICE_FIELDS)
         
         return instance
 
@@ -105,33 +180,21 @@ class TestSubmissionSerializer(serializers.ModelSerializer):
 class TestWithQuestionsSerializer(TestSerializer):
     questions = QuestionSerializer(many=True, read_only=False)
     
+    @transaction.atomic
     def create(self, validated_data):
         questions_data = validated_data.pop('questions', [])
         test = Test.objects.create(**validated_data)
-        
-        for question_data in questions_data:
-            choices_data = question_data.pop('choices', [])
-            question = Question.objects.create(test=test, **question_data)
-            
-            for choice_data in choices_data:
-                Choice.objects.create(question=question, **choice_data)
-        
+        sync_questions(test, questions_data, [])
         return test
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        questions_data = validated_data.pop('questions', [])
+        questions_data = validated_data.pop('questions', None)
         instance = super().update(instance, validated_data)
         
-        # Handle existing questions
+        # Diff questions by id so unchanged questions keep their answers
         if questions_data is not None:
-            instance.questions.all().delete()  # Remove existing questions
-            
-            for question_data in questions_data:
-                choices_data = question_data.pop('choices', [])
-                question = Question.objects.create(test=instance, **question_data)
-                
-                for choice_data in choices_data:
-                    Choice.objects.create(question=question, **choice_data)
+            sync_questions(instance, questions_data, instance.questions.all())
         
         return instance
 
@@ -145,7 +208,8 @@ class SubmitAnswerSerializer(serializers.Serializer):
     
     def validate(self, data):
         question_id = data.get('question_id')
-        question = Question.objects.get(id=question_id)
+        # Views grading a whole test pass its questions in the context
+        question = self.context.get('questions', {}).get(question_id) or Question.objects.get(id=question_id)
         
         if question.question_type == 'MCQ' and not data.get('selected_choice_ids'):
             raise serializers.ValidationError("Multiple choice questions require selected choices")
@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from courses_platform.caching import catalog_cache, test_cache
+from .models import Course, Lesson, Test, Question, Choice
+
+# Invalidated after commit, so a concurrent rebuild cannot cache the old rows
+# under the new version. Bulk writes send no signals; code writing these
+# models with bulk_create() or update() calls invalidate_course_content().
+
+
+def invalidate_course_content():
+    """Drop the cached catalog and tests once the current transaction commits"""
+    transaction.on_commit(catalog_cache.invalidate)
+    transaction.on_commit(test_cache.invalidate)
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(catalog_cache.invalidate)
+
+@receiver(post_save, sender=Test)
+@receiver(post_delete, sender=Test)
+def invalidate_test_and_catalog(sender, **kwargs):
+    # Lessons in the catalog show whether they have a test
+    transaction.on_commit(catalog_cache.invalidate)
+    transaction.on_commit(test_cache.invalidate)
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_tests(sender, **kwargs):
+    transaction.on_commit(test_cache.invalidate)
@@ -1,3 +1,1403 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, modify_settings, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import BasePermission, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import Serializer
+from rest_framework.test import APIClient, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+from courses_platform import (
+    caching, db_router, openapi, parsers, profiling, renderers, slowlog, test_runner, throttling,
+)
+from courses_platform.middleware import AdmissionControlMiddleware, QueryBudgetExceeded
+from users.models import User
+from . import async_views, bundles, fast_serializers, funnel
+from .admin import EstimatedCountPaginator
+from .management.commands import migrate_quiz_to_test
+from .management.commands.migrate_quiz_to_test import migrate_chunk
+from .views import CourseViewSet, courses_with_lessons
+from .models import (
+    Course, CourseStart, Lesson, Test, Question, Choice, TestSubmission, Answer, QuestionType, RequestProfile,
+)
+from .serializers import (
+    CourseSerializer, LessonSerializer, QuestionSerializer, TestSerializer, TestWithQuestionsSerializer,
+    with_lesson_navigation,
+)
 
-# Create your tests here.
+SIZES = (1, 10, 100)
+# Cascading deletes collect and delete related rows in chunks, so they may add a few queries
+DELETE_SLACK = 5
+
+
+class QueryCountTests(TestCase):
+    """Every courses endpoint runs the same number of queries for 1, 10 and 100 lessons, questions and answers"""
+
+    def setUp(self):
+        # Throttle counters live in the cache
+        cache.clear()
+        caching.clear_local()
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.counts = {}
+
+    def seed(self, size):
+        """A course with ``size`` lessons; the first lesson's test has ``size`` questions, all answered"""
+        course = Course.objects.create(name=f"Course {size}", description="Query count course")
+        lessons = Lesson.objects.bulk_create(
+            Lesson(course=course, title=f"Lesson {i}", video_url="https://example.com/video")
+            for i in range(size)
+        )
+        # The last lesson stays without a test for create-test-for-lesson
+        untested = Lesson.objects.create(course=course, title="Untested", video_url="https://example.com/video")
+        tests = Test.objects.bulk_create(Test(lesson=lesson, title=f"Test {lesson.title}") for lesson in lessons)
+        test = tests[0]
+
+        questions = Question.objects.bulk_create(
+            Question(
+                test=test, text=f"Question {i}", order=i,
+                question_type=QuestionType.OPEN_ENDED if i % 2 else QuestionType.MULTIPLE_CHOICE,
+            )
+            for i in range(size)
+        )
+        Question.objects.bulk_create(Question(test=other, text="Only question") for other in tests[1:])
+        Choice.objects.bulk_create(
+            Choice(question=question, text=f"Choice {i}", is_correct=i == 0)
+            for question in questions if question.question_type == QuestionType.MULTIPLE_CHOICE
+            for i in range(3)
+        )
+
+        submission = TestSubmission.objects.create(test=test, user=self.user, score=50, is_completed=True)
+        answers = Answer.objects.bulk_create(
+            Answer(submission=submission, question=question, text_answer="An answer")
+            for question in questions
+        )
+        correct = {choice.question_id: choice for choice in Choice.objects.filter(question__test=test, is_correct=True)}
+        Answer.selected_choices.through.objects.bulk_create(
+            Answer.selected_choices.through(answer_id=answer.id, choice_id=correct[answer.question_id].id)
+            for answer in answers if answer.question_id in correct
+        )
+        return {
+            'course': course,
+            'lesson': lessons[0],
+            'untested': untested,
+            'test': test,
+            'questions': questions,
+            'submission': submission,
+            'open_answer': next((a for a in answers if a.question.question_type == QuestionType.OPEN_ENDED), None),
+        }
+
+    def measure(self, name, method, url, data=None):
+        # Measure the uncached path
+        cache.clear()
+        caching.clear_local()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, f"{name}: {response.content[:500]}")
+        self.counts.setdefault(name, []).append(len(queries))
+        return response
+
+    def exercise(self, data):
+        course, lesson, test = data['course'], data['lesson'], data['test']
+        question = data['questions'][0]
+        lesson_payload = {'title': "New lesson", 'video_url': "https://example.com/new", 'course': course.id}
+        test_payload = {'title': "New test", 'questions': [
+            {'text': "Q1", 'question_type': 'MCQ', 'choices': [{'text': "A", 'is_correct': True}, {'text': "B"}]},
+            {'text': "Q2", 'question_type': 'OPEN', 'correct_answer': "An answer"},
+        ]}
+
+        # Reads
+        self.measure('api-root', 'get', reverse('api-root'))
+        self.measure('course-list', 'get', reverse('course-list'))
+        # Shadowed by the router's course routes, which serve the same paths
+        self.measure('course-list-create', 'get', reverse('course-list-create'))
+        self.measure('course-detail', 'get', reverse('course-detail', args=[course.id]))
+        self.measure('lesson-list', 'get', reverse('lesson-list'))
+        self.measure('lesson-detail', 'get', reverse('lesson-detail', args=[lesson.id]))
+        self.measure('lessons-by-course', 'get', reverse('lessons-by-course', args=[course.id]))
+        self.measure('course-funnel', 'get', reverse('course-funnel', args=[course.id]))
+        self.measure('test-list', 'get', reverse('test-list'))
+        self.measure('test-detail', 'get', reverse('test-detail', args=[test.id]))
+        self.measure('test-by-lesson', 'get', reverse('test-by-lesson', args=[lesson.id]))
+        # Questions are only created through their test; QuestionSerializer has no test field
+        self.measure('question-list', 'get', reverse('question-list'))
+        self.measure('question-detail', 'get', reverse('question-detail', args=[question.id]))
+        self.measure('test-submission-result', 'get', reverse('test-submission-result', args=[data['submission'].id]))
+
+        # Writes
+        self.measure('course-create', 'post', reverse('course-list'), {'name': "New", 'description': "New course"})
+        self.measure('course-update', 'patch', reverse('course-detail', args=[course.id]), {'description': "Updated"})
+        self.measure('lesson-create', 'post', reverse('lesson-create', args=[course.id]), lesson_payload)
+        self.measure('lesson-list-create', 'post', reverse('lesson-list'), lesson_payload)
+        self.measure('lesson-update', 'patch', reverse('lesson-detail', args=[lesson.id]), {'title': "Updated"})
+        created_test = self.measure('create-test-for-lesson', 'post', reverse('create-test-for-lesson', args=[data['untested'].id]),
+                     dict(test_payload, lesson=data['untested'].id))
+        self.measure('test-update', 'patch', reverse('test-detail', args=[test.id]), {'title': "Updated"})
+        self.measure('question-update', 'patch', reverse('question-detail', args=[question.id]), {
+            'choices': [{'id': choice.id, 'text': choice.text} for choice in question.choices.all()],
+        })
+
+        start = self.measure('start-test', 'post', reverse('start-test', args=[test.id]), {'test': test.id})
+        answers = []
+        for q in data['questions']:
+            if q.question_type == QuestionType.MULTIPLE_CHOICE:
+                # A wrong choice, so no dataset passes the test and grading takes the same path for all sizes
+                answers.append({'question_id': q.id, 'selected_choice_ids': [c.id for c in q.choices.all()][1:2]})
+            else:
+                answers.append({'question_id': q.id, 'text_answer': "An answer"})
+        self.measure('submit-test', 'post', reverse('submit-test', args=[start.data['id']]), {'answers': answers})
+        if data['open_answer']:
+            self.measure('review-open-answer', 'patch', reverse('review-open-answer', args=[data['open_answer'].id]),
+                         {'is_correct': True, 'feedback': "Good"})
+
+        # Deletes
+        new_question = created_test.data['questions'][0]['id']
+        self.measure('question-delete', 'delete', reverse('question-detail', args=[new_question]))
+        self.measure('test-delete', 'delete', reverse('test-detail', args=[test.id]))
+        self.measure('lesson-delete', 'delete', reverse('lesson-detail', args=[lesson.id]))
+        self.measure('course-delete', 'delete', reverse('course-detail', args=[course.id]))
+
+    def test_query_counts_do_not_grow_with_data(self):
+        for size in SIZES:
+            self.exercise(self.seed(size))
+
+        for name, counts in self.counts.items():
+            with self.subTest(endpoint=name):
+                if name.endswith('-delete'):
+                    self.assertLessEqual(max(counts) - min(counts), DELETE_SLACK, f"{name} queries by size: {counts}")
+                else:
+                    self.assertEqual(len(set(counts)), 1, f"{name} queries by size: {counts}")
+
+        # The size-1 dataset has no open question, so review is only measured for 10 and 100
+        self.assertEqual(len(self.counts['review-open-answer']), len(SIZES) - 1)
+
+
+class IndexPlanTests(TestCase):
+    """The hot queries are planned with the access path indexes"""
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be scanned
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_lesson_navigation_uses_course_id_index(self):
+        self.assertUsesIndex(with_lesson_navigation(Lesson.objects.filter(course_id=1)), 'lesson_course_id_idx')
+
+    def test_questions_of_test_use_test_order_index(self):
+        self.assertUsesIndex(Question.objects.filter(test_id=1), 'question_test_order_idx')
+
+    def test_submissions_of_user_use_user_test_index(self):
+        self.assertUsesIndex(
+            TestSubmission.objects.filter(user_id=1, test_id=1, is_completed=True), 'submission_user_test_idx'
+        )
+
+    def test_answers_of_submission_use_submission_index(self):
+        self.assertUsesIndex(
+            Answer.objects.filter(submission_id=1).values('question__points'), 'answer_submission_question_idx'
+        )
+
+    def test_unreviewed_answers_use_partial_index(self):
+        self.assertUsesIndex(
+            Answer.objects.filter(is_correct__isnull=True, question__question_type=QuestionType.OPEN_ENDED),
+            'answer_unreviewed_idx',
+        )
+
+
+class AsyncReadViewTests(TestCase):
+    """The async read views return the same responses as the sync views they replace under ASGI"""
+
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.factory = AsyncRequestFactory()
+
+        self.course = Course.objects.create(name="Course", description="Async course")
+        self.lesson, other = Lesson.objects.bulk_create(
+            Lesson(course=self.course, title=f"Lesson {i}", video_url="https://example.com/video") for i in range(2)
+        )
+        self.test = Test.objects.create(lesson=self.lesson, title="Test")
+        question = Question.objects.create(test=self.test, text="Question")
+        choice = Choice.objects.create(question=question, text="Choice", is_correct=True)
+        self.submission = TestSubmission.objects.create(test=self.test, user=self.user, score=100, is_completed=True)
+        answer = Answer.objects.create(submission=self.submission, question=question, is_correct=True)
+        answer.selected_choices.add(choice)
+
+    def call(self, view, method='get', data=None, token=None, **kwargs):
+        headers = {'Authorization': f"Bearer {token or self.token}"} if token is not False else {}
+        request = getattr(self.factory, method)(
+            '/', json.dumps(data) if data is not None else None, content_type='application/json', headers=headers,
+        )
+        response = async_to_sync(view)(request, **kwargs)
+        response.render()
+        return response
+
+    def assertSameResponse(self, view, url, **kwargs):
+        expected = self.client.get(url)
+        # Build the async response rather than reading the sync view's cache entry
+        cache.clear()
+        caching.clear_local()
+        response = self.call(view, **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), expected.json())
+
+    def test_responses_match_sync_views(self):
+        self.assertSameResponse(async_views.CourseListView.as_view(), reverse('course-list'))
+        self.assertSameResponse(
+            async_views.CourseDetailView.as_view(), reverse('course-detail', args=[self.course.id]), pk=self.course.id,
+        )
+        self.assertSameResponse(
+            async_views.LessonsByCourseView.as_view(), reverse('lessons-by-course', args=[self.course.id]),
+            course_id=self.course.id,
+        )
+        self.assertSameResponse(
+            async_views.TestByLessonView.as_view(), reverse('test-by-lesson', args=[self.lesson.id]),
+            lesson_id=self.lesson.id,
+        )
+        self.assertSameResponse(
+            async_views.TestSubmissionResultView.as_view(),
+            reverse('test-submission-result', args=[self.submission.id]), pk=self.submission.id,
+        )
+
+    def test_errors_match_sync_views(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.client.force_authenticate(other)
+        self.assertSameResponse(
+            async_views.TestSubmissionResultView.as_view(),
+            reverse('test-submission-result', args=[self.submission.id]),
+            token=str(RefreshToken.for_user(other).access_token), pk=self.submission.id,
+        )
+
+        self.client.force_authenticate(None)
+        response = self.call(async_views.CourseListView.as_view(), token=False)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.content), self.client.get(reverse('course-list')).json())
+
+    def test_writes_go_to_fallback_view(self):
+        view = async_views.CourseListView.as_view(fallback_view=CourseViewSet.as_view({'get': 'list', 'post': 'create'}))
+        response = self.call(view, 'post', {'name': "New", 'description': "Created through the fallback"})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Course.objects.filter(name="New").exists())
+
+
+@override_settings(REPLICA_DATABASES=['replica_0'], REPLICA_READ_MODELS=['courses.Course', 'courses.TestSubmission'])
+class ReplicaRouterTests(SimpleTestCase):
+    """Replica reads are pinned to the primary after writes"""
+
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        self.router = db_router.ReplicaRouter()
+        self.request = RequestFactory().get('/')
+        self.request.user = User(pk=1, username='student')
+
+    def route(self, model):
+        token = db_router.current.set(db_router.RoutingState(self.request))
+        try:
+            return self.router.db_for_read(model)
+        finally:
+            db_router.current.reset(token)
+
+    def test_reads_go_to_replicas(self):
+        self.assertEqual(self.router.db_for_read(Course), 'replica_0')
+        self.assertEqual(self.route(TestSubmission), 'replica_0')
+        self.assertIsNone(self.route(User))
+
+    def test_request_reads_its_own_writes(self):
+        state = db_router.RoutingState(self.request)
+        token = db_router.current.set(state)
+        try:
+            self.assertEqual(self.router.db_for_read(Course), 'replica_0')
+            self.assertEqual(self.router.db_for_write(TestSubmission), 'default')
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+        finally:
+            db_router.current.reset(token)
+
+        db_router.finish(state)
+        self.assertEqual(self.route(TestSubmission), 'default')
+
+        other = RequestFactory().get('/')
+        other.user = User(pk=2, username='other')
+        self.request = other
+        self.assertEqual(self.route(TestSubmission), 'replica_0')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_0', 'courses'))
+        self.assertIsNone(self.router.allow_migrate('default', 'courses'))
+
+
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaPinMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password', is_staff=True)
+        self.course = Course.objects.create(name="Course", description="Pinned course")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_writes_pin_the_user(self):
+        self.client.get(reverse('course-detail', args=[self.course.id]))
+        self.assertIsNone(cache.get(db_router._pin_key(self.user.pk)))
+
+        self.client.patch(reverse('course-detail', args=[self.course.id]), {'description': "Updated"}, format='json')
+        self.assertIsNotNone(cache.get(db_router._pin_key(self.user.pk)))
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Versioned keys, early refresh and single-flight rebuilds of the tiered cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.cache = caching.TieredCache('test', ttl=60, lock_timeout=1)
+        self.builds = 0
+
+    def build(self, value='value'):
+        def build():
+            self.builds += 1
+            return value
+        return build
+
+    def expire(self, key, value='old', delta=0.01, expires_in=-1):
+        """Store ``value`` in the shared tier as if it expires in ``expires_in`` seconds"""
+        cache.set(self.cache.key(key), (value, delta, time.time() + expires_in), 60)
+        self.cache.local.clear()
+
+    def test_values_are_built_once(self):
+        self.assertEqual(self.cache.get_or_build('key', self.build()), 'value')
+        self.assertEqual(self.cache.get_or_build('key', self.build()), 'value')
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get_or_build('key', self.build()), 'value')
+        self.assertEqual(self.builds, 1)
+
+    def test_invalidate_drops_the_namespace(self):
+        self.cache.get_or_build('key', self.build('old'))
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get_or_build('key', self.build('new')), 'new')
+        # Other processes see the new version once their local tier expires
+        other = caching.TieredCache('test', ttl=60)
+        self.assertEqual(other.get_or_build('key', self.build('other')), 'new')
+
+    def test_expired_values_are_rebuilt(self):
+        self.expire('key')
+        self.assertEqual(self.cache.get_or_build('key', self.build('new')), 'new')
+        self.assertEqual(self.builds, 1)
+
+    def test_values_are_refreshed_early_near_expiry(self):
+        self.expire('key', delta=10, expires_in=1)
+        with mock.patch('courses_platform.caching.random.random', return_value=0.0):
+            self.assertEqual(self.cache.get_or_build('key', self.build('new')), 'old')
+        self.cache.local.clear()
+        with mock.patch('courses_platform.caching.random.random', return_value=0.999):
+            self.assertEqual(self.cache.get_or_build('key', self.build('new')), 'new')
+
+    def test_only_lock_holder_rebuilds(self):
+        self.expire('key')
+        self.assertTrue(self.cache.acquire(self.cache.key('key')))
+        # Another worker is rebuilding, so the expired value is served meanwhile
+        self.assertEqual(self.cache.get_or_build('key', self.build('new')), 'old')
+        self.assertEqual(self.builds, 0)
+
+    def test_misses_wait_for_the_lock_holder(self):
+        full_key = self.cache.key('key')
+        self.assertTrue(self.cache.acquire(full_key))
+        worker = caching.TieredCache('test', ttl=60)
+        timer = threading.Timer(0.1, worker.build, [full_key, lambda: 'built elsewhere'])
+        timer.start()
+        try:
+            self.assertEqual(self.cache.get_or_build('key', self.build('new')), 'built elsewhere')
+        finally:
+            timer.join()
+        self.assertEqual(self.builds, 0)
+
+
+class ReadCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password', is_staff=True)
+        self.course = Course.objects.create(name="Course", description="Cached course")
+        self.lesson = Lesson.objects.create(course=self.course, title="Lesson", video_url="https://example.com/video")
+        self.test = Test.objects.create(lesson=self.lesson, title="Test")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_writes_invalidate_catalog_and_tests(self):
+        course_url = reverse('course-detail', args=[self.course.id])
+        test_url = reverse('test-by-lesson', args=[self.lesson.id])
+        self.client.get(course_url)
+        self.client.get(test_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(course_url, {'description': "Updated"}, format='json')
+            Question.objects.create(test=self.test, text="New question")
+
+        self.assertEqual(self.client.get(course_url).json()['description'], "Updated")
+        self.assertEqual(len(self.client.get(test_url).json()['questions']), 1)
+
+    def test_bulk_writes_invalidate_catalog_and_tests(self):
+        lesson = Lesson.objects.create(
+            course=self.course, title="Quiz lesson", video_url="https://example.com/video",
+            quiz={'questions': [{'question': "Q", 'choices': ["A", "B"], 'correctIndex': 1}]},
+        )
+        course_url = reverse('course-detail', args=[self.course.id])
+        self.assertFalse(self.client.get(course_url).json()['lessons'][1]['has_test'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            migrate_chunk([lesson])
+        lesson_data = self.client.get(course_url).json()['lessons'][1]
+        self.assertTrue(lesson_data['has_test'])
+        test_url = reverse('test-by-lesson', args=[lesson.id])
+        self.assertEqual(len(self.client.get(test_url).json()['questions']), 1)
+
+
+class ORJSONTests(SimpleTestCase):
+    """The orjson renderer and parser behave like DRF's JSON renderer and parser"""
+
+    data = {
+        'utc': datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+        'offset': datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=5))),
+        'naive': datetime.datetime(2024, 1, 2, 3, 4, 5),
+        'date': datetime.date(2024, 1, 2),
+        'time': datetime.time(3, 4, 5, 6),
+        'decimal': decimal.Decimal('12.50'),
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'duration': datetime.timedelta(minutes=1, seconds=30),
+        'lazy': gettext_lazy("Not found."),
+        'html': "<p>Caf\u00e9 \u2014 line\u2028separator\u2029</p>",
+        'keys': {1: 'one'},
+        'values': [1, 2.5, None, True, 'text'],
+    }
+
+    def test_render_matches_drf(self):
+        self.assertEqual(renderers.ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(renderers.ORJSONRenderer().render(None), b'')
+
+    def test_floats_have_the_same_values(self):
+        data = {'floats': [1e100, 1e-7, 0.1, 123456789.125]}
+        self.assertEqual(json.loads(renderers.ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_non_finite_floats_render_as_null(self):
+        data = {'nan': float('nan'), 'inf': float('inf'), 'decimal': decimal.Decimal('-Infinity')}
+        self.assertEqual(renderers.ORJSONRenderer().render(data), b'{"nan":null,"inf":null,"decimal":null}')
+        # DRF refuses them in strict mode, and renders them as bare tokens otherwise
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(data)
+        renderer = renderers.ORJSONRenderer()
+        renderer.strict = False
+        self.assertEqual(renderer.render(data), b'{"nan":NaN,"inf":Infinity,"decimal":-Infinity}')
+
+    def test_falls_back_to_drf(self):
+        data = {'big': 10 ** 20}
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            renderers.ORJSONRenderer().render(self.data, media_type), JSONRenderer().render(self.data, media_type),
+        )
+        with mock.patch('courses_platform.renderers.orjson', None):
+            self.assertEqual(renderers.ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_parse_matches_drf(self):
+        body = JSONRenderer().render(self.data)
+        self.assertEqual(parsers.ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        latin = '{"name": "Caf\u00e9"}'.encode('latin-1')
+        self.assertEqual(parsers.ORJSONParser().parse(io.BytesIO(latin), parser_context={'encoding': 'latin-1'}),
+                         {'name': "Caf\u00e9"})
+
+    def test_invalid_json_is_a_parse_error(self):
+        for body in (b'{"a": ', b'{"a": NaN}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                parsers.ORJSONParser().parse(io.BytesIO(body))
+
+
+class FastSerializerTests(TestCase):
+    """The fast-path serializers give the same output as the DRF serializers"""
+
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        for c in range(2):
+            course = Course.objects.create(name=f"Course {c}", description="Fast course")
+            lessons = Lesson.objects.bulk_create(
+                Lesson(course=course, title=f"Lesson {i}", description="Text" if i else None,
+                       quiz={'legacy': [i, 1.5]} if i == 2 else {},
+                       video_url="https://example.com/video")
+                for i in range(3)
+            )
+            # The last lesson has no test, the second lesson's test no questions
+            tested = Test.objects.create(lesson=lessons[0], title="Test", description="With questions", time_limit=10)
+            Test.objects.create(lesson=lessons[1], title="Empty test")
+            for i, question_type in enumerate((QuestionType.MULTIPLE_CHOICE, QuestionType.OPEN_ENDED)):
+                question = Question.objects.create(test=tested, text=f"Question {i}", order=1 - i, question_type=question_type)
+                if question_type == QuestionType.MULTIPLE_CHOICE:
+                    Choice.objects.bulk_create(
+                        Choice(question=question, text=f"Choice {j}", is_correct=j == 0) for j in range(3)
+                    )
+        Course.objects.create(name="Empty course", description="No lessons")
+
+    def assertSameData(self, fast, drf):
+        self.assertEqual(json.loads(JSONRenderer().render(fast)), json.loads(JSONRenderer().render(drf)))
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(drf))
+
+    def test_matches_drf_serializers(self):
+        lessons = with_lesson_navigation(Lesson.objects.all())
+        tests = Test.objects.prefetch_related('questions__choices')
+        questions = Question.objects.prefetch_related('choices')
+        self.assertSameData(fast_serializers.lessons(lessons), LessonSerializer(lessons, many=True).data)
+        self.assertSameData(fast_serializers.courses(courses_with_lessons()),
+                            CourseSerializer(courses_with_lessons(), many=True).data)
+        self.assertSameData(fast_serializers.tests(tests), TestSerializer(tests, many=True).data)
+        self.assertSameData(fast_serializers.questions(questions), QuestionSerializer(questions, many=True).data)
+        self.assertEqual(fast_serializers.tests(Test.objects.none()), [])
+
+    def test_async_lessons(self):
+        lessons = Lesson.objects.filter(course__name="Course 1")
+        self.assertSameData(async_to_sync(fast_serializers.alessons)(lessons),
+                            LessonSerializer(with_lesson_navigation(lessons), many=True).data)
+
+    def test_endpoints(self):
+        course = Course.objects.get(name="Course 0")
+        lesson = course.lessons.order_by('id').first()
+        expected = {
+            reverse('course-list'): CourseSerializer(courses_with_lessons(), many=True).data,
+            reverse('lessons-by-course', args=[course.pk]): LessonSerializer(
+                with_lesson_navigation(course.lessons.all()), many=True).data,
+            reverse('course-detail', args=[course.pk]): CourseSerializer(course).data,
+            reverse('test-detail', args=[lesson.test.pk]): TestSerializer(lesson.test).data,
+            reverse('test-by-lesson', args=[lesson.pk]): TestSerializer(lesson.test).data,
+        }
+        for url, data in expected.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(self.client.get(reverse('test-by-lesson', args=[0])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('course-detail', args=[0])).status_code, 404)
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+    def test_build_schema(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            call_command('build_openapi_schema', stdout=io.StringIO())
+            with open(os.path.join(static_root, 'openapi.json')) as f:
+                schema = json.load(f)
+        self.assertEqual(schema['basePath'], '/api')
+        self.assertIn('/courses/courses/{id}/', schema['paths'])
+        self.assertIn('/users/register/', schema['paths'])
+
+    # The UI's assets are not collected in tests, so no manifest lookups
+    @override_settings(STORAGES={**settings.STORAGES, 'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}})
+    @modify_settings(INSTALLED_APPS={'append': 'drf_yasg'})
+    def test_docs_load_the_prebuilt_schema(self):
+        view = openapi.docs_view()
+        # No view is introspected to serve the page
+        with mock.patch('drf_yasg.inspectors.SwaggerAutoSchema.get_operation') as get_operation:
+            response = view(RequestFactory().get('/api/docs/'))
+            response.render()
+        get_operation.assert_not_called()
+        self.assertContains(response, '"url": "/static/openapi.json"')
+        self.assertEqual(view(RequestFactory().get('/api/docs/', {'format': 'openapi'})).status_code, 404)
+
+
+class MediaStorageTests(TestCase):
+    """Uploads are saved under content-hashed names and served as immutable"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_content_addressed_names(self):
+        content = b"Lesson notes\n" * 100
+        name = default_storage.save('lesson_assets/notes.txt', ContentFile(content))
+        self.assertRegex(name, r'^lesson_assets/notes\.[0-9a-f]{12}\.txt$')
+        self.assertEqual(default_storage.save('lesson_assets/notes.txt', ContentFile(content)), name)
+        self.assertNotEqual(default_storage.save('lesson_assets/notes.txt', ContentFile(b"Other notes")), name)
+        self.assertTrue(default_storage.exists(name + '.gz'))
+        # Uploaded names that look hashed are hashed all the same
+        spoofed = default_storage.save(name, ContentFile(b"Other notes"))
+        self.assertNotEqual(spoofed, name)
+        with default_storage.open(name) as f:
+            self.assertEqual(f.read(), content)
+        # save_hashed() keeps names the caller derived from the content
+        hashed = 'profile_pictures/thumbs/64.0123456789ab.jpg'
+        self.assertEqual(default_storage.save_hashed(hashed, ContentFile(b"jpeg")), hashed)
+        self.assertEqual(default_storage.save_hashed(hashed, ContentFile(b"other")), hashed)
+        self.assertFalse(default_storage.exists(hashed + '.gz'))
+
+    def test_served_as_immutable(self):
+        name = default_storage.save('lesson_assets/notes.txt', ContentFile(b"Lesson notes\n" * 100))
+        response = self.client.get(default_storage.url(name), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'max-age=31536000, public, immutable')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        with open(os.path.join(default_storage.location, 'plain.txt'), 'w') as f:
+            f.write("Not hashed")
+        self.assertEqual(self.client.get('/media/plain.txt')['Cache-Control'], 'max-age=3600, public')
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+class AdminScalingTests(TestCase):
+    """Admin changelists run a fixed number of queries, and inlines are paginated"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def seed(self, size):
+        course = Course.objects.create(name=f"Course {size}")
+        lessons = Lesson.objects.bulk_create(
+            Lesson(course=course, title=f"Lesson {i}", video_url="https://example.com/video") for i in range(size)
+        )
+        tests = Test.objects.bulk_create(Test(lesson=lesson, title=lesson.title) for lesson in lessons)
+        questions = Question.objects.bulk_create(Question(test=test, text="Question") for test in tests)
+        users = User.objects.bulk_create(
+            User(username=f"student-{size}-{i}", email=f"student-{size}-{i}@example.com") for i in range(size)
+        )
+        submissions = TestSubmission.objects.bulk_create(
+            TestSubmission(test=test, user=user) for test, user in zip(tests, users)
+        )
+        Answer.objects.bulk_create(
+            Answer(submission=submission, question=question) for submission, question in zip(submissions, questions)
+        )
+        return submissions[0]
+
+    def test_changelist_query_counts(self):
+        counts = {}
+        for size in (1, 10):
+            self.seed(size)
+            for model in ('question', 'testsubmission', 'answer', 'test', 'lesson'):
+                url = reverse(f'admin:courses_{model}_changelist')
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                counts.setdefault(model, set()).add(len(queries))
+        for model, sizes in counts.items():
+            self.assertEqual(len(sizes), 1, f"{model} changelist queries grow with rows: {sizes}")
+
+    def test_answer_inline_is_paginated(self):
+        submission = self.seed(1)
+        questions = Question.objects.bulk_create(Question(test=submission.test, text=f"Extra {i}") for i in range(60))
+        Answer.objects.bulk_create(Answer(submission=submission, question=question) for question in questions)
+        url = reverse('admin:courses_testsubmission_change', args=[submission.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 50)
+        self.assertContains(response, f"?{formset.page_param}=2")
+        response = self.client.get(url, {formset.page_param: 2})
+        self.assertEqual(len(response.context['inline_admin_formsets'][0].formset.forms), 11)
+
+    def test_estimated_count(self):
+        self.seed(3)
+        with mock.patch('courses.admin.estimated_row_count', return_value=5000000):
+            self.assertEqual(EstimatedCountPaginator(Answer.objects.order_by('pk'), 100).count, 5000000)
+            self.assertEqual(EstimatedCountPaginator(Answer.objects.filter(is_correct=None).order_by('pk'), 100).count, 3)
+        with mock.patch('courses.admin.estimated_row_count', return_value=500):
+            self.assertEqual(EstimatedCountPaginator(Answer.objects.order_by('pk'), 100).count, 3)
+        self.assertEqual(EstimatedCountPaginator(Answer.objects.order_by('pk'), 100).count, 3)
+
+
+class TestCacheTests(SimpleTestCase):
+    def test_tests_use_a_private_cache(self):
+        self.assertEqual(settings.CACHES, test_runner.TEST_CACHES)
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        course = Course.objects.create(name="Course", description="Budget course")
+        self.url = reverse('course-funnel', args=[course.id])
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(teacher)
+
+    def test_tests_fail_on_budget_overruns(self):
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+        with override_settings(QUERY_BUDGETS={'course-funnel': 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "over its budget of 0"):
+                self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGETS={'course-funnel': 0}, QUERY_BUDGET_STRICT=False)
+    def test_overruns_only_log_when_not_strict(self):
+        with self.assertLogs('courses_platform.middleware', 'WARNING') as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("over its budget of 0", logs.output[0])
+
+    @override_settings(QUERY_BUDGETS={'course-funnel': 100})
+    def test_requests_within_budget_pass(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class SerializerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        course = Course.objects.create(name="Course", description="Timing course")
+        lesson = Lesson.objects.create(course=course, title="Lesson", video_url="https://example.com/video")
+        self.test = Test.objects.create(lesson=lesson, title="Test")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('student', 'student@example.com', 'password'))
+
+    @override_settings(QUERY_INSTRUMENTATION_HEADERS=True)
+    def test_view_serializer_time_is_recorded(self):
+        response = self.client.post(reverse('start-test', args=[self.test.id]), {'test': self.test.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(response.wsgi_request.instrumentation['serializer_time'], 0)
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    def test_serializers_are_unchanged_outside_views(self):
+        serializer = TestSerializer(self.test)
+        self.assertIs(type(serializer), TestSerializer)
+        self.assertIs(type(serializer).data, Serializer.data)
+        view = CourseViewSet(request=None, format_kwarg=None)
+        self.assertIs(type(view.get_serializer()), CourseSerializer)
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1200.0
+        self.request = RequestFactory().get('/api/courses/', REMOTE_ADDR='10.0.0.1')
+        self.view = mock.Mock(throttle_scope='catalog')
+
+    def throttle(self):
+        throttle = throttling.IPSlidingWindowThrottle()
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def allowed(self, count):
+        return [self.throttle().allow_request(self.request, self.view) for _ in range(count)]
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'catalog_ip': '3/min'}})
+    def test_burst_up_to_the_rate_then_reject(self):
+        self.assertEqual(self.allowed(4), [True, True, True, False])
+        throttle = self.throttle()
+        self.assertFalse(throttle.allow_request(self.request, self.view))
+        self.assertEqual(throttle.wait(), 60)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'catalog_ip': '3/min'}})
+    def test_slots_free_up_as_the_window_slides(self):
+        self.allowed(3)
+        # A third into the next window two thirds of the previous one still count
+        self.now += 80
+        self.assertEqual(self.allowed(2), [True, False])
+        throttle = self.throttle()
+        throttle.allow_request(self.request, self.view)
+        self.assertAlmostEqual(throttle.wait(), 20)
+        self.now += 20
+        self.assertEqual(self.allowed(2), [True, False])
+        # Nothing of the first window is left
+        self.now += 20
+        self.assertEqual(self.allowed(2), [True, False])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'catalog_ip': '3/min'}})
+    def test_counter_evicted_between_add_and_incr(self):
+        def evict(key):
+            throttle.cache.delete(key)
+            raise ValueError(f"Key '{key}' not found")
+
+        throttle = self.throttle()
+        with mock.patch.object(throttle.cache, 'incr', side_effect=evict) as incr:
+            self.assertTrue(throttle.allow_request(self.request, self.view))
+        incr.assert_called_once()
+        # The request that restarted the counter is counted
+        self.assertEqual(self.allowed(3), [True, True, False])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'catalog_ip': '20/min'}})
+    def test_concurrent_requests_never_exceed_the_rate(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.extend(self.allowed(5)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 20)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'catalog': '2/min'}})
+    def test_throttled_request_gets_429_with_retry_after(self):
+        user = User.objects.create_user('student', 'student@example.com', 'password')
+        client = APIClient()
+        client.force_authenticate(user)
+        statuses = [client.get(reverse('course-list-create')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = client.get(reverse('course-list-create'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class AdmissionControlTests(SimpleTestCase):
+    @override_settings(ADMISSION_LIMITS={'read': 1}, ADMISSION_QUEUE_TIMEOUT=0.01)
+    def test_requests_beyond_the_limit_are_shed(self):
+        middleware = AdmissionControlMiddleware(lambda request: 'ok')
+        request = RequestFactory().get('/api/courses/')
+        self.assertEqual(middleware(request), 'ok')
+
+        middleware.slots['read'].acquire()
+        response = middleware(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        # Other route classes have no limit here
+        self.assertEqual(middleware(RequestFactory().post('/api/courses/')), 'ok')
+        middleware.slots['read'].release()
+        self.assertEqual(middleware(request), 'ok')
+
+
+class SyncQuestionsTests(TestCase):
+    """Editing a test diffs questions and choices by id"""
+
+    def setUp(self):
+        course = Course.objects.create(name="Course", description="Sync course")
+        lesson = Lesson.objects.create(course=course, title="Lesson", video_url="https://example.com/video")
+        self.test = Test.objects.create(lesson=lesson, title="Test")
+        self.kept = Question.objects.create(test=self.test, text="Kept", order=0)
+        self.kept_choices = Choice.objects.bulk_create([
+            Choice(question=self.kept, text="Right", is_correct=True),
+            Choice(question=self.kept, text="Wrong"),
+        ])
+        self.removed = Question.objects.create(test=self.test, text="Removed", order=1)
+        user = User.objects.create_user('student', 'student@example.com', 'password')
+        submission = TestSubmission.objects.create(test=self.test, user=user)
+        self.answer = Answer.objects.create(submission=submission, question=self.kept)
+        self.answer.selected_choices.set([self.kept_choices[0]])
+
+    def save(self, questions):
+        serializer = TestWithQuestionsSerializer(self.test, data={'questions': questions}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def choice_data(self, choice, **changes):
+        return {'id': choice.id, 'text': choice.text, 'is_correct': choice.is_correct, **changes}
+
+    def test_rows_are_matched_by_id(self):
+        self.save([
+            {'id': self.kept.id, 'text': "Kept, reworded", 'question_type': 'MCQ',
+             'choices': [self.choice_data(self.kept_choices[0]),
+                         self.choice_data(self.kept_choices[1], text="Still wrong"),
+                         {'text': "New", 'is_correct': False}]},
+            {'text': "New question", 'question_type': 'OPEN', 'order': 2},
+        ])
+        questions = list(self.test.questions.order_by('order'))
+        self.assertEqual([q.text for q in questions], ["Kept, reworded", "New question"])
+        self.assertEqual(questions[0].id, self.kept.id)
+        choices = list(self.kept.choices.order_by('id'))
+        self.assertEqual([c.id for c in choices[:2]], [c.id for c in self.kept_choices])
+        self.assertEqual([c.text for c in choices], ["Right", "Still wrong", "New"])
+
+    def test_unchanged_questions_keep_their_answers(self):
+        self.save([{'id': self.kept.id, 'text': "Kept", 'question_type': 'MCQ', 'order': 0,
+                    'choices': [self.choice_data(c) for c in self.kept_choices]}])
+        self.assertTrue(Answer.objects.filter(id=self.answer.id).exists())
+        self.assertEqual(list(self.answer.selected_choices.all()), [self.kept_choices[0]])
+
+    def test_removed_rows_are_deleted(self):
+        self.save([{'id': self.kept.id, 'text': "Kept", 'question_type': 'MCQ',
+                    'choices': [self.choice_data(self.kept_choices[0])]}])
+        self.assertFalse(Question.objects.filter(id=self.removed.id).exists())
+        self.assertEqual(list(self.kept.choices.all()), [self.kept_choices[0]])
+        # Answers to the kept question survive, their remaining choices too
+        self.assertEqual(list(self.answer.selected_choices.all()), [self.kept_choices[0]])
+
+    def test_omitted_choices_are_left_alone(self):
+        self.save([{'id': self.kept.id, 'text': "Kept", 'question_type': 'MCQ'}])
+        self.assertEqual(self.kept.choices.count(), 2)
+
+    def test_empty_choices_delete_every_choice(self):
+        self.save([{'id': self.kept.id, 'text': "Kept", 'question_type': 'MCQ', 'choices': []}])
+        self.assertFalse(self.kept.choices.exists())
+        self.assertFalse(self.answer.selected_choices.exists())
+
+
+class CourseBundleTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(name="Bundled", description="Bundle course")
+        lessons = Lesson.objects.bulk_create(
+            Lesson(course=self.course, title=f"Lesson {i}", video_url="https://example.com/video")
+            for i in range(2)
+        )
+        test = Test.objects.create(lesson=lessons[0], title="Test", passing_score=50)
+        question = Question.objects.create(test=test, text="Pick one", order=0)
+        Choice.objects.bulk_create([Choice(question=question, text="Right", is_correct=True),
+                                    Choice(question=question, text="Wrong")])
+        Question.objects.create(test=test, text="Explain", question_type='OPEN', order=1, correct_answer="Because")
+
+    def roundtrip(self, archive):
+        fp = io.BytesIO()
+        bundles.dump_bundle(bundles.export_course(self.course), fp, archive=archive)
+        fp.seek(0)
+        return bundles.load_bundle(fp)
+
+    def test_roundtrip_recreates_the_course(self):
+        for archive in (False, True):
+            with self.subTest(archive=archive):
+                bundle = self.roundtrip(archive)
+                Course.objects.filter(name="Bundled").delete()
+                course, counts = bundles.import_course(bundle)
+                self.assertEqual(counts, {'lessons': 2, 'tests': 1, 'questions': 2, 'choices': 2})
+                self.assertEqual(bundles.export_course(course), bundle)
+                self.course = course
+
+    def test_reimport_updates_in_place(self):
+        bundle = self.roundtrip(False)
+        bundle['lessons'][0]['test']['questions'][0]['choices'][1]['is_correct'] = True
+        course, _ = bundles.import_course(bundle)
+        self.assertEqual(course.id, self.course.id)
+        self.assertEqual(Choice.objects.filter(question__test__lesson__course=course).count(), 2)
+        self.assertFalse(Choice.objects.filter(is_correct=False).exists())
+
+    def test_malformed_bundle_fails_the_command(self):
+        bundle = bundles.export_course(self.course)
+        del bundle['course']['name']
+        broken_choice = bundles.export_course(self.course)
+        broken_choice['lessons'][0]['test']['questions'][0]['choices'] = "Right"
+        for bundle, error in ((bundle, "course: missing 'name'"),
+                              (broken_choice, "lessons[0].test.questions[0].choices: expected a list")):
+            with self.subTest(error=error), tempfile.NamedTemporaryFile(suffix='.json') as fp:
+                bundles.dump_bundle(bundle, fp)
+                fp.flush()
+                with self.assertRaisesMessage(CommandError, error):
+                    call_command('import_course', fp.name, stdout=io.StringIO())
+
+
+class CourseFunnelTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(name="Funnel", description="Funnel course")
+        self.tests = [
+            Test.objects.create(lesson=Lesson.objects.create(
+                course=self.course, title=f"Lesson {i}", video_url="https://example.com/video"
+            ), title=f"Test {i}", passing_score=50)
+            for i in range(2)
+        ]
+        self.users = [User.objects.create_user(f"student{i}", f"student{i}@example.com", 'password')
+                      for i in range(2)]
+
+    def submit(self, user, test, score=None):
+        submission = TestSubmission.objects.create(test=test, user=user)
+        funnel.record_start(submission)
+        if score is not None:
+            submission.score = score
+            submission.is_completed = True
+            submission.save()
+            funnel.record_result(submission)
+        return submission
+
+    def counts(self):
+        data = funnel.get_course_funnel(self.course.id)
+        return data['started'], [(step['reached'], step['passed']) for step in data['lessons']]
+
+    def test_counters(self):
+        self.submit(self.users[0], self.tests[0], score=80)
+        self.submit(self.users[0], self.tests[1], score=20)
+        self.submit(self.users[0], self.tests[1], score=60)
+        self.submit(self.users[1], self.tests[0])
+        self.assertEqual(self.counts(), (2, [(2, 1), (1, 1)]))
+
+    def test_regrade_takes_back_a_pass(self):
+        submission = self.submit(self.users[0], self.tests[0], score=80)
+        submission.score = 10
+        submission.save()
+        funnel.record_result(submission)
+        self.assertEqual(self.counts(), (1, [(1, 0), (0, 0)]))
+
+    def test_start_is_counted_once_per_user(self):
+        # A concurrent first reach of another lesson already claimed the start
+        CourseStart.objects.create(user=self.users[0], course=self.course)
+        self.submit(self.users[0], self.tests[1])
+        self.assertEqual(self.counts(), (0, [(0, 0), (1, 0)]))
+
+    def test_rebuild_matches_incremental_counters(self):
+        self.submit(self.users[0], self.tests[0], score=80)
+        self.submit(self.users[0], self.tests[1])
+        self.submit(self.users[1], self.tests[1], score=90)
+        counts = self.counts()
+        funnel.rebuild_course_funnel(self.course.id)
+        self.assertEqual(self.counts(), counts)
+        self.assertEqual(CourseStart.objects.filter(course=self.course).count(), 2)
+        # Later reaches after a rebuild don't count the users again
+        self.submit(self.users[1], self.tests[0])
+        self.assertEqual(self.counts(), (2, [(2, 1), (2, 1)]))
+
+
+class MetricsViewTests(SimpleTestCase):
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), headers=headers)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=False)
+    def test_denied_without_a_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=True)
+    def test_open_in_debug_without_a_token(self):
+        self.assertEqual(self.scrape().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=True)
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(authorization='Bearer wrong').status_code, 403)
+        response = self.scrape(authorization='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'http_request_duration_seconds')
+
+
+class FastReadPermissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        self.course = Course.objects.create(name="Course", description="Permission course")
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+
+    def retrieve(self, permission_classes):
+        view = CourseViewSet.as_view({'get': 'retrieve'}, permission_classes=permission_classes)
+        request = RequestFactory().get(f'/api/courses/courses/{self.course.id}/')
+        force_authenticate(request, self.user)
+        return view(request, pk=self.course.id)
+
+    def test_retrieve_without_object_permissions(self):
+        response = self.retrieve([IsAuthenticated])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.course.id)
+
+    def test_object_permissions_are_refused(self):
+        class IsOwner(BasePermission):
+            def has_object_permission(self, request, view, obj):
+                return False
+
+        with self.assertRaisesMessage(ImproperlyConfigured, "object-level permissions (IsOwner)"):
+            self.retrieve([IsAuthenticated, IsOwner])
+        with self.assertRaisesMessage(ImproperlyConfigured, "object-level permissions (IsOwner)"):
+            self.retrieve([IsAuthenticated & IsOwner])
+        with self.assertRaisesMessage(ImproperlyConfigured, "OwnedCourseViewSet has object-level permissions"):
+            class OwnedCourseViewSet(CourseViewSet):
+                permission_classes = [IsOwner]
+
+    def test_composed_permissions_without_object_checks(self):
+        response = self.retrieve([IsAuthenticated | IsAdminUser])
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        settings_override = override_settings(PROFILING_ROOT=self.root, PROFILING_SAMPLE_RATE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        Course.objects.create(name="Course", description="Profiled course")
+        self.staff = User.objects.create_user('teacher', 'teacher@example.com', 'password', is_staff=True)
+        self.student = User.objects.create_user('student', 'student@example.com', 'password')
+
+    def get(self, user, **headers):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        return client.get(reverse('course-list-create'), headers=headers)
+
+    def test_staff_requests_with_the_header_are_profiled(self):
+        response = self.get(self.staff, **{'X-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.method, profile.view_name, profile.user), ('GET', 'course-list', self.staff))
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(sorted(os.listdir(self.root)), sorted([profile.stats_file, profile.collapsed_file]))
+        stats = pstats.Stats(os.path.join(self.root, profile.stats_file))
+        self.assertTrue(any(name == 'list' for _, _, name in stats.stats))
+        with open(os.path.join(self.root, profile.collapsed_file)) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in lines), profile.samples)
+
+    def test_other_requests_are_not_profiled(self):
+        for response in (self.get(self.student, **{'X-Profile': '1'}), self.get(self.staff)):
+            self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+        self.assertEqual(os.listdir(self.root), [])
+
+    @override_settings(PROFILING_KEEP=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        ids = [int(self.get(self.staff, **{'X-Profile': '1'})['X-Profile-Id']) for _ in range(3)]
+        kept = list(RequestProfile.objects.order_by('id'))
+        self.assertEqual([profile.id for profile in kept], ids[1:])
+        self.assertEqual(len(os.listdir(self.root)), 4)
+        profiling.prune(0)
+        self.assertFalse(RequestProfile.objects.exists())
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_admin_downloads(self):
+        profile_id = self.get(self.staff, **{'X-Profile': '1'})['X-Profile-Id']
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        for kind in ('pstats', 'collapsed'):
+            with self.subTest(kind=kind):
+                response = self.client.get(reverse('admin:courses_requestprofile_download', args=[profile_id, kind]))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Disposition'],
+                                 f'attachment; filename="profile-{profile_id}.{kind}"')
+                response.close()
+        response = self.client.get(reverse('admin:courses_requestprofile_download', args=[profile_id, 'html']))
+        self.assertEqual(response.status_code, 404)
+
+
+class SlowQueryLogTests(TestCase):
+    def test_fingerprint_normalizes_literals(self):
+        self.assertEqual(
+            slowlog.fingerprint("SELECT  \"id\" FROM t1 WHERE name = 'O''Brien' AND n >= -2.5 AND id IN (1, 2, 3)"),
+            'SELECT "id" FROM t1 WHERE name = ? AND n >= ? AND id IN (...)',
+        )
+        self.assertEqual(slowlog.fingerprint("SELECT * FROM t WHERE a = %s AND b IN (%s, %s)"),
+                         slowlog.fingerprint("SELECT * FROM t WHERE a = 7 AND b IN (8)"))
+
+    def test_slow_queries_are_logged_with_their_plan(self):
+        request = RequestFactory().get('/api/courses/')
+        request.resolver_match = None
+        token = slowlog.current_request.set(request)
+        self.addCleanup(slowlog.current_request.reset, token)
+        with mock.patch.object(slowlog, '_explained', set()), \
+                self.assertLogs('courses_platform.slow_queries', 'WARNING') as logs:
+            with connection.execute_wrapper(slowlog.slow_query_wrapper(0)):
+                list(Course.objects.filter(name="Slow"))
+            with connection.execute_wrapper(slowlog.slow_query_wrapper(60)):
+                list(Lesson.objects.all())
+            # Entries are written by the plan thread
+            slowlog._explainer.submit(lambda: None).result()
+
+        entry, = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        self.assertEqual((entry['method'], entry['path']), ('GET', '/api/courses/'))
+        self.assertIn('FROM "courses_course" WHERE "courses_course"."name" = ?', entry['fingerprint'])
+        self.assertTrue(entry['plan'])
+        self.assertTrue(any('courses_course' in row for row in entry['plan']))
+
+    def test_command_orders_fingerprints_by_total_time(self):
+        entries = [
+            ('a', 'SELECT a', 'courses', 30), ('b', 'SELECT b', 'lessons', 50),
+            ('a', 'SELECT a', 'courses', 40), ('c', 'SELECT c', 'courses', 5),
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.log') as log:
+            for fingerprint_id, fingerprint, view, duration in entries:
+                log.write(json.dumps({
+                    'time': '2026-01-01T00:00:00', 'view': view, 'duration_ms': duration,
+                    'fingerprint_id': fingerprint_id, 'fingerprint': fingerprint,
+                }) + "\n")
+            log.write("not json\n")
+            log.flush()
+            out = io.StringIO()
+            call_command('slow_queries', log=log.name, stdout=out)
+            lines = out.getvalue().splitlines()
+            self.assertEqual([line.split()[0] for line in lines if not line.startswith(' ')][:3], ['a', 'b', 'c'])
+            self.assertIn("total 70ms  count 2  mean 35.0ms  max 40.0ms  views courses", lines[0])
+            self.assertEqual(lines[-1], "3 fingerprints, 4 slow queries")
+
+            out = io.StringIO()
+            call_command('slow_queries', log=log.name, view='courses', top=1, stdout=out)
+            self.assertEqual(out.getvalue().splitlines()[0].split()[0], 'a')
+            self.assertIn("2 fingerprints, 3 slow queries", out.getvalue())
+
+
+class GenerateLoadDataTests(TestCase):
+    options = {'courses': 2, 'lessons': 3, 'questions': 3, 'users': 10, 'seed': 7, 'stdout': io.StringIO()}
+
+    def generate(self, **options):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            call_command('generate_load_data', **{**self.options, **options})
+
+    def snapshot(self):
+        submissions = TestSubmission.objects.order_by('id').values_list(
+            'test__title', 'user__username', 'score', 'is_completed', 'start_time', 'end_time',
+        )
+        return {
+            'courses': list(Course.objects.order_by('id').values_list('name', flat=True)),
+            'lessons': Lesson.objects.count(),
+            'questions': list(Question.objects.order_by('id').values_list('question_type', 'points')),
+            'choices': Choice.objects.count(),
+            'answers': list(Answer.objects.order_by('id').values_list('is_correct', flat=True)),
+            'submissions': [
+                (title, username, score, completed, end_time - start_time if end_time else None)
+                for title, username, score, completed, start_time, end_time in submissions
+            ],
+            'started': sorted(start_time for *_, start_time, _ in submissions),
+        }
+
+    def test_row_counts(self):
+        self.generate()
+        self.assertEqual(Course.objects.count(), 2)
+        self.assertEqual(Test.objects.count(), Lesson.objects.count())
+        self.assertEqual(User.objects.filter(username__startswith='load_user_').count(), 10)
+        self.assertEqual(
+            Choice.objects.count(), 4 * Question.objects.filter(question_type=QuestionType.MULTIPLE_CHOICE).count(),
+        )
+        self.assertTrue(TestSubmission.objects.exists())
+        self.assertEqual(Answer.objects.count(), sum(
+            submission.test.questions.count()
+            for submission in TestSubmission.objects.filter(is_completed=True).select_related('test')
+        ))
+
+    def test_submissions_are_spread_over_past_days(self):
+        self.generate(days=30)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        start_times = set()
+        for submission in TestSubmission.objects.all():
+            start_times.add(submission.start_time)
+            self.assertGreater(submission.start_time, now - datetime.timedelta(days=31))
+            if submission.end_time:
+                self.assertGreater(submission.end_time, submission.start_time)
+                self.assertLess(submission.end_time, now)
+                self.assertLessEqual(submission.end_time - submission.start_time, datetime.timedelta(minutes=30))
+        self.assertGreater(len(start_times), 1)
+
+    def test_fixed_seed_gives_identical_data(self):
+        self.generate()
+        first = self.snapshot()
+        for model in (Course, User):
+            model.objects.all().delete()
+        self.generate()
+        second = self.snapshot()
+        # Start times are relative to the time of the run
+        started, rerun_started = first.pop('started'), second.pop('started')
+        self.assertEqual(first, second)
+        self.assertEqual(
+            [b - a for a, b in zip(started, started[1:])], [b - a for a, b in zip(rerun_started, rerun_started[1:])],
+        )
+
+    def test_reruns_add_new_courses(self):
+        cache.clear()
+        caching.clear_local()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('student', 'student@example.com', 'password'))
+        self.assertEqual(client.get(reverse('course-list-create')).json(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generate()
+            self.generate(seed=8)
+        names = list(Course.objects.order_by('id').values_list('name', flat=True))
+        self.assertEqual(names, [f"load course {i}" for i in range(4)])
+        self.assertEqual(User.objects.filter(username__startswith='load_user_').count(), 20)
+        # The cached catalog is invalidated
+        self.assertEqual([course['name'] for course in client.get(reverse('course-list-create')).json()], names)
+
+
+class InlineExecutor:
+    """Stands in for the process pool: runs each submitted range right away"""
+    submitted = []
+
+    def __init__(self, max_workers, mp_context=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def submit(self, fn, *args):
+        self.submitted.append(args[:2])
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class MigrateQuizTests(TestCase):
+    quiz = {'questions': [{'question': "Pick one", 'choices': ["A", "B"], 'correctIndex': 1}]}
+
+    def setUp(self):
+        self.course = Course.objects.create(name="Quiz course", description="Quiz migration course")
+        self.lessons = [self.lesson(i) for i in range(7)]
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        self.checkpoint = os.path.join(checkpoint_dir.name, 'checkpoint.json')
+
+    def lesson(self, i, quiz=None):
+        return Lesson.objects.create(course=self.course, title=f"Lesson {i}", video_url="https://example.com/video",
+                                     quiz=quiz or self.quiz)
+
+    def migrate(self, **options):
+        out = io.StringIO()
+        call_command('migrate_quiz_to_test', stdout=out, **options)
+        return out.getvalue()
+
+    def test_split_ranges_are_disjoint(self):
+        ids = [1, 2, 3, 7, 8, 20, 21, 22, 40, 41]
+        for workers in (1, 3, 4, 20):
+            with self.subTest(workers=workers):
+                ranges = migrate_quiz_to_test.split_ranges(ids, workers)
+                self.assertLessEqual(len(ranges), workers)
+                self.assertEqual([i for first, last in ranges for i in ids if first <= i <= last], ids)
+                self.assertTrue(all(last < first for (_, last), (first, _) in zip(ranges, ranges[1:])))
+
+    def test_reruns_are_idempotent(self):
+        self.lesson('broken', quiz={'title': "No questions"})
+        output = self.migrate(chunk_size=2)
+        self.assertIn("Migration complete: 7 migrated, 1 skipped", output)
+        self.assertEqual(Test.objects.count(), 7)
+        self.assertEqual(Choice.objects.filter(is_correct=True, text="B").count(), 7)
+        output = self.migrate(chunk_size=2)
+        self.assertIn("Found 1 lessons with quiz data to migrate", output)
+        self.assertEqual((Test.objects.count(), Question.objects.count()), (7, 7))
+
+    def test_workers_migrate_disjoint_ranges(self):
+        InlineExecutor.submitted = []
+        with mock.patch.object(migrate_quiz_to_test, 'ProcessPoolExecutor', InlineExecutor):
+            output = self.migrate(workers=3, chunk_size=2)
+        ids = [lesson.id for lesson in self.lessons]
+        self.assertEqual(InlineExecutor.submitted, [(ids[0], ids[2]), (ids[3], ids[5]), (ids[6], ids[6])])
+        self.assertIn("Migration complete: 7 migrated, 0 skipped", output)
+        self.assertFalse(migrate_quiz_to_test.pending_lessons().exists())
+
+    def test_resume_from_checkpoint(self):
+        ids = [lesson.id for lesson in self.lessons]
+        # An interrupted run over two ranges got through the first two lessons of the first
+        migrate_chunk(self.lessons[:2])
+        with open(self.checkpoint, 'w') as f:
+            json.dump({f"{ids[0]}-{ids[3]}": ids[1], f"{ids[4]}-{ids[6]}": ids[4] - 1}, f)
+        added = self.lesson('added later')
+
+        with mock.patch.object(migrate_quiz_to_test, 'migrate_chunk', wraps=migrate_chunk) as chunk:
+            output = self.migrate(checkpoint=self.checkpoint, chunk_size=10)
+        resumed = [[lesson.id for lesson in call.args[0]] for call in chunk.call_args_list]
+        self.assertEqual(resumed, [ids[2:4], ids[4:], [added.id]])
+        self.assertIn("Migration complete: 6 migrated, 0 skipped", output)
+        self.assertIn("with 3 range(s)", output)
+        self.assertFalse(migrate_quiz_to_test.pending_lessons().exists())
+        self.assertEqual(Test.objects.count(), 8)
+        self.assertFalse(os.path.exists(self.checkpoint))
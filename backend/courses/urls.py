@@ -1,12 +1,14 @@
 # urls.py
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CourseViewSet, LessonViewSet, CourseListCreateView, CourseDetailView,
     LessonCreateView, LessonsByCourseView, TestViewSet, TestDetailView,
     TestByLessonView, CreateTestForLessonView, QuestionViewSet, StartTestView,
-    SubmitTestView, TestSubmissionResultView, ReviewOpenAnswerView
+    SubmitTestView, TestSubmissionResultView, ReviewOpenAnswerView, CourseFunnelView
 )
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet)
@@ -21,6 +23,7 @@ urlpatterns = [
     path('courses/<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
     path('courses/<int:course_id>/lessons/', LessonCreateView.as_view(), name='lesson-create'),
     path('courses/<int:course_id>/lessons/list/', LessonsByCourseView.as_view(), name='lessons-by-course'),
+    path('courses/<int:course_id>/funnel/', CourseFunnelView.as_view(), name='course-funnel'),
     
     # Test related URLs
     path('tests/<int:pk>/', TestDetailView.as_view(), name='test-detail'),
@@ -34,4 +37,21 @@ urlpatterns = [
     
     # Review open-ended answers
     path('answers/<int:pk>/review/', ReviewOpenAnswerView.as_view(), name='review-open-answer'),
-]
\ No newline at end of file
+]
+if settings.ASYNC_READ_VIEWS:
+    # Async reads take precedence over the sync routes above; writes to the
+    # same URLs are handed to the router's viewset
+    urlpatterns = [
+        path('courses/', async_views.CourseListView.as_view(
+            fallback_view=CourseViewSet.as_view({'get': 'list', 'post': 'create'}),
+        ), name='course-list'),
+        path('courses/<int:pk>/', async_views.CourseDetailView.as_view(
+            fallback_view=CourseViewSet.as_view({
+                'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+            }),
+        ), name='course-detail'),
+        path('courses/<int:course_id>/lessons/list/', async_views.LessonsByCourseView.as_view(), name='lessons-by-course'),
+        path('lessons/<int:lesson_id>/test/', async_views.TestByLessonView.as_view(), name='test-by-lesson'),
+        path('test-submissions/<int:pk>/result/', async_views.TestSubmissionResultView.as_view(),
+             name='test-submission-result'),
+    ] + urlpatterns
@@ -4,46 +4,145 @@ from .models import Course, Lesson, Test, Question, Choice, TestSubmission, Answ
 from .serializers import (
     CourseSerializer, LessonSerializer, TestSerializer, QuestionSerializer,
     ChoiceSerializer, TestSubmissionSerializer, AnswerSerializer,
-    TestWithQuestionsSerializer, SubmitAnswerSerializer
+    TestWithQuestionsSerializer, SubmitAnswerSerializer, with_lesson_navigation
 )
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework import generics, status
-from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.core.exceptions import ImproperlyConfigured
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Prefetch, Q, Sum
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from courses_platform import metrics
+from courses_platform.caching import catalog_cache, test_cache
+from courses_platform.instrumentation import SerializerTimingMixin
+from courses_platform.parsers import ORJSONParser
+from . import fast_serializers, funnel
+import time
 
-class CourseViewSet(ModelViewSet):
-    queryset = Course.objects.all()
+class RefetchOnUpdateMixin:
+    """Re-read the updated object through get_queryset() so the response keeps its prefetches"""
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
+
+def read_cache_key(action, kwargs):
+    return ':'.join([action, *(f"{name}={value}" for name, value in sorted(kwargs.items()))])
+
+class CachedReadMixin:
+    """
+    Serve list() and retrieve() from ``read_cache``, keyed by action and URL kwargs.
+    The payloads must be the same for every user; courses/signals.py invalidates them.
+    """
+    read_cache = None
+    
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return Response(self.read_cache.get_or_build(
+            read_cache_key('list', kwargs), lambda: build(request, *args, **kwargs).data
+        ))
+    
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return Response(self.read_cache.get_or_build(
+            read_cache_key('detail', kwargs), lambda: build(request, *args, **kwargs).data
+        ))
+
+def object_permission_classes(permission_classes):
+    """Names of the permission classes (including composed operands) that implement has_object_permission()"""
+    for permission in permission_classes:
+        operands = [getattr(permission, name) for name in ('op1_class', 'op2_class') if hasattr(permission, name)]
+        if operands:
+            yield from object_permission_classes(operands)
+        elif permission.has_object_permission is not BasePermission.has_object_permission:
+            yield permission.__name__
+
+class FastReadMixin:
+    """
+    Serve list() and retrieve() with ``fast_serializer``, a function from
+    fast_serializers.py that builds the serializer's output from values() rows.
+    Writes and the API schema keep using ``serializer_class``. Only for views
+    without object-level permissions, since retrieve() never loads an instance;
+    ``permission_classes`` is checked when the view class is defined and in as_view().
+    """
+    fast_serializer = None
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.check_permission_classes(cls.permission_classes)
+    
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        cls.check_permission_classes(initkwargs.get('permission_classes', cls.permission_classes))
+        return super().as_view(*args, **initkwargs)
+    
+    @classmethod
+    def check_permission_classes(cls, permission_classes):
+        # No instance is loaded, so there is nothing to run has_object_permission() on
+        checked = list(object_permission_classes(permission_classes))
+        if checked:
+            raise ImproperlyConfigured(
+                f"{cls.__name__} has object-level permissions ({', '.join(checked)}), "
+                "which FastReadMixin.retrieve() would skip"
+            )
+    
+    def list(self, request, *args, **kwargs):
+        return Response(self.fast_serializer(self.filter_queryset(self.get_queryset())))
+    
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return Response(fast_serializers.first_or_404(self.fast_serializer(queryset), queryset))
+
+def courses_with_lessons():
+    return Course.objects.prefetch_related(
+        Prefetch('lessons', queryset=with_lesson_navigation(Lesson.objects.order_by('id')))
+    )
+
+class CourseViewSet(SerializerTimingMixin, RefetchOnUpdateMixin, CachedReadMixin, FastReadMixin, ModelViewSet):
+    queryset = courses_with_lessons()
+    read_cache = catalog_cache
     serializer_class = CourseSerializer
+    fast_serializer = staticmethod(fast_serializers.courses)
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
 
-class LessonViewSet(ModelViewSet):
-    queryset = Lesson.objects.all()
+class LessonViewSet(SerializerTimingMixin, RefetchOnUpdateMixin, FastReadMixin, ModelViewSet):
+    queryset = with_lesson_navigation(Lesson.objects.all())
     serializer_class = LessonSerializer
+    fast_serializer = staticmethod(fast_serializers.lessons)
     permission_classes = [IsAuthenticated]
 
-class CourseListCreateView(generics.ListCreateAPIView):
-    queryset = Course.objects.all()
+class CourseListCreateView(SerializerTimingMixin, CachedReadMixin, FastReadMixin, generics.ListCreateAPIView):
+    queryset = courses_with_lessons()
+    read_cache = catalog_cache
     serializer_class = CourseSerializer
+    fast_serializer = staticmethod(fast_serializers.courses)
+    throttle_scope = 'catalog'
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Course.objects.all()
+class CourseDetailView(SerializerTimingMixin, RefetchOnUpdateMixin, CachedReadMixin, FastReadMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = courses_with_lessons()
+    read_cache = catalog_cache
     serializer_class = CourseSerializer
+    fast_serializer = staticmethod(fast_serializers.courses)
 
-class LessonsByCourseView(generics.ListAPIView):
+class LessonsByCourseView(SerializerTimingMixin, FastReadMixin, generics.ListAPIView):
     serializer_class = LessonSerializer
+    fast_serializer = staticmethod(fast_serializers.lessons)
 
     def get_queryset(self):
         course_id = self.kwargs['course_id']
-        return Lesson.objects.filter(course_id=course_id)
+        return with_lesson_navigation(Lesson.objects.filter(course_id=course_id))
 
-class LessonCreateView(generics.CreateAPIView):
+class LessonCreateView(SerializerTimingMixin, generics.CreateAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
-    parser_classes = [JSONParser]
+    parser_classes = [ORJSONParser]
 
     def perform_create(self, serializer):
         course_id = self.kwargs.get('course_id')
@@ -51,9 +150,11 @@ class LessonCreateView(generics.CreateAPIView):
         serializer.save(course=course)
 
 # Test related views
-class TestViewSet(ModelViewSet):
-    queryset = Test.objects.all()
+class TestViewSet(SerializerTimingMixin, RefetchOnUpdateMixin, CachedReadMixin, FastReadMixin, ModelViewSet):
+    queryset = Test.objects.prefetch_related('questions__choices')
+    read_cache = test_cache
     serializer_class = TestSerializer
+    fast_serializer = staticmethod(fast_serializers.tests)
     permission_classes = [IsAuthenticated]
     
     def get_serializer_class(self):
@@ -61,9 +162,11 @@ class TestViewSet(ModelViewSet):
             return TestWithQuestionsSerializer
         return TestSerializer
 
-class TestDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Test.objects.all()
+class TestDetailView(SerializerTimingMixin, RefetchOnUpdateMixin, CachedReadMixin, FastReadMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Test.objects.prefetch_related('questions__choices')
+    read_cache = test_cache
     serializer_class = TestSerializer
+    fast_serializer = staticmethod(fast_serializers.tests)
     permission_classes = [IsAuthenticated]
     
     def get_serializer_class(self):
@@ -71,15 +174,15 @@ class TestDetailView(generics.RetrieveUpdateDestroyAPIView):
             return TestWithQuestionsSerializer
         return TestSerializer
 
-class TestByLessonView(generics.RetrieveAPIView):
+class TestByLessonView(SerializerTimingMixin, CachedReadMixin, FastReadMixin, generics.RetrieveAPIView):
+    queryset = Test.objects.prefetch_related('questions__choices')
     serializer_class = TestSerializer
     permission_classes = [IsAuthenticated]
-    
-    def get_object(self):
-        lesson_id = self.kwargs['lesson_id']
-        return get_object_or_404(Test, lesson_id=lesson_id)
+    read_cache = test_cache
+    fast_serializer = staticmethod(fast_serializers.tests)
+    lookup_field = 'lesson_id'
 
-class CreateTestForLessonView(generics.CreateAPIView):
+class CreateTestForLessonView(SerializerTimingMixin, generics.CreateAPIView):
     serializer_class = TestWithQuestionsSerializer
     permission_classes = [IsAuthenticated]
     
@@ -88,63 +191,78 @@ class CreateTestForLessonView(generics.CreateAPIView):
         lesson = get_object_or_404(Lesson, id=lesson_id)
         serializer.save(lesson=lesson)
 
-class QuestionViewSet(ModelViewSet):
-    queryset = Question.objects.all()
+class QuestionViewSet(SerializerTimingMixin, RefetchOnUpdateMixin, FastReadMixin, ModelViewSet):
+    queryset = Question.objects.prefetch_related('choices')
     serializer_class = QuestionSerializer
+    fast_serializer = staticmethod(fast_serializers.questions)
     permission_classes = [IsAuthenticated]
 
-class StartTestView(generics.CreateAPIView):
+class StartTestView(SerializerTimingMixin, generics.CreateAPIView):
     serializer_class = TestSubmissionSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'start_test'
     
     def perform_create(self, serializer):
         test_id = self.kwargs.get('test_id')
         test = get_object_or_404(Test, id=test_id)
-        serializer.save(test=test, user=self.request.user)
+        submission = serializer.save(test=test, user=self.request.user)
+        funnel.record_start(submission)
 
 class SubmitTestView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'submit_test'
     
     @transaction.atomic
     def post(self, request, submission_id):
-        submission = get_object_or_404(TestSubmission, id=submission_id, user=request.user)
+        submission = get_object_or_404(
+            TestSubmission.objects.select_related('test__lesson'), id=submission_id, user=request.user
+        )
         
         if submission.is_completed:
             return Response({"detail": "Test has already been submitted"}, status=status.HTTP_400_BAD_REQUEST)
         
+        grading_started = time.perf_counter()
         answers_data = request.data.get('answers', [])
         total_points = 0
         earned_points = 0
         
+        # Load the test's questions and choices once; answers are inserted in bulk below
+        questions = {question.id: question for question in submission.test.questions.prefetch_related('choices')}
+        answers = []
+        answer_choices = []
+        
         for answer_data in answers_data:
-            serializer = SubmitAnswerSerializer(data=answer_data)
+            serializer = SubmitAnswerSerializer(data=answer_data, context={'questions': questions})
             serializer.is_valid(raise_exception=True)
             
             question_id = serializer.validated_data['question_id']
-            question = get_object_or_404(Question, id=question_id, test=submission.test)
+            question = questions.get(question_id)
+            if question is None:
+                raise Http404("No Question matches the given query.")
             total_points += question.points
             
             # Create the answer object
-            answer = Answer.objects.create(
+            answer = Answer(
                 submission=submission,
                 question=question,
                 text_answer=serializer.validated_data.get('text_answer', '')
             )
+            answers.append(answer)
             
             # For MCQ, process the selected choices
             if question.question_type == 'MCQ':
-                selected_choice_ids = serializer.validated_data.get('selected_choice_ids', [])
-                selected_choices = Choice.objects.filter(id__in=selected_choice_ids, question=question)
-                answer.selected_choices.set(selected_choices)
+                selected_choice_ids = set(serializer.validated_data.get('selected_choice_ids', []))
+                all_choices = question.choices.all()
+                selected_choices = [choice for choice in all_choices if choice.id in selected_choice_ids]
+                answer_choices.append((answer, selected_choices))
                 
                 # Check if the answer is correct
-                all_choices = question.choices.all()
-                correct_choices = all_choices.filter(is_correct=True)
-                selected_correct = selected_choices.filter(is_correct=True)
+                correct_choices = [choice for choice in all_choices if choice.is_correct]
+                selected_correct = [choice for choice in selected_choices if choice.is_correct]
                 
                 # Answer is correct if all correct choices are selected and no incorrect ones
-                is_correct = (selected_choices.count() == selected_correct.count() and 
-                             selected_correct.count() == correct_choices.count())
+                is_correct = (len(selected_choices) == len(selected_correct) and 
+                             len(selected_correct) == len(correct_choices))
                 
                 answer.is_correct = is_correct
                 
@@ -181,8 +299,15 @@ class SubmitTestView(APIView):
                     answer.feedback = f"Your answer matched {matched_terms} out of {total_terms} key concepts."
                 else:
                     answer.is_correct = None  # To be reviewed manually
-            
-            answer.save()
+        
+        Answer.objects.bulk_create(answers)
+        AnswerChoice = Answer.selected_choices.through
+        AnswerChoice.objects.bulk_create(
+            AnswerChoice(answer_id=answer.id, choice_id=choice.id)
+            for answer, choices in answer_choices for choice in choices
+        )
+        
+        metrics.GRADING_DURATION.observe(time.perf_counter() - grading_started)
         
         # Calculate score as a percentage
         if total_points > 0:
@@ -195,6 +320,7 @@ class SubmitTestView(APIView):
         submission.end_time = timezone.now()
         submission.is_completed = True
         submission.save()
+        funnel.record_result(submission)
         
         return Response({
             "id": submission.id,
@@ -204,7 +330,7 @@ class SubmitTestView(APIView):
             "completed": True
         })
 
-class TestSubmissionResultView(generics.RetrieveAPIView):
+class TestSubmissionResultView(SerializerTimingMixin, generics.RetrieveAPIView):
     serializer_class = TestSubmissionSerializer
     permission_classes = [IsAuthenticated]
     
@@ -213,15 +339,15 @@ class TestSubmissionResultView(generics.RetrieveAPIView):
         if getattr(self, 'swagger_fake_view', False):
             # Return empty queryset for schema generation
             return TestSubmission.objects.none()
-        return TestSubmission.objects.filter(user=self.request.user)
+        return TestSubmission.objects.filter(user=self.request.user).prefetch_related('answers__selected_choices')
 
-class ReviewOpenAnswerView(generics.UpdateAPIView):
+class ReviewOpenAnswerView(SerializerTimingMixin, generics.UpdateAPIView):
     serializer_class = AnswerSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         # Only allow updating answers where the question type is OPEN
-        return Answer.objects.filter(question__question_type='OPEN')
+        return Answer.objects.filter(question__question_type='OPEN').select_related('submission__test__lesson')
     
     def update(self, request, *args, **kwargs):
         answer = self.get_object()
@@ -240,13 +366,24 @@ class ReviewOpenAnswerView(generics.UpdateAPIView):
         
         # Update the overall score of the submission
         submission = answer.submission
-        answers = submission.answers.all()
-        
-        total_points = sum(answer.question.points for answer in answers)
-        earned_points = sum(answer.question.points for answer in answers if answer.is_correct)
+        points = submission.answers.aggregate(
+            total=Sum('question__points'),
+            earned=Sum('question__points', filter=Q(is_correct=True)),
+        )
+        total_points = points['total'] or 0
+        earned_points = points['earned'] or 0
         
         if total_points > 0:
             submission.score = (earned_points / total_points) * 100
         submission.save()
+        funnel.record_result(submission)
         
-        return Response(self.get_serializer(answer).data)
\ No newline at end of file
+        return Response(self.get_serializer(answer).data)
+
+class CourseFunnelView(APIView):
+    """Enrollment and completion funnel of a course, read from the materialized rollups"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, course_id):
+        get_object_or_404(Course, id=course_id)
+        return Response(funnel.get_course_funnel(course_id))
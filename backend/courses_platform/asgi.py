@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'courses_platform.settings')
+# Async reads, and no persistent connections: each async request runs its
+# queries on a thread of its own, whose connection would otherwise linger
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,175 @@
+# caching.py
+"""
+Two-tier cache for expensive payloads that many requests share: the course
+catalog, test payloads and user profiles.
+
+Lookups go to a small per-process LRU first, then to the shared Django cache
+(see CACHES). Keys are versioned per namespace, so ``invalidate()`` drops a
+whole namespace at once; other processes notice within ``local_ttl`` seconds.
+
+Shared entries remember when they expire and how long they took to build.
+Each lookup refreshes an entry early with a probability that rises as expiry
+nears and with the build time (XFetch), so hot keys are usually rebuilt
+before they expire. Rebuilds are single-flight: the worker that takes the
+rebuild lock in the shared cache builds the value, while the others keep
+serving the previous value, or wait up to ``lock_timeout`` seconds if there
+is none.
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+
+class LocalLRU:
+    """A tiny thread-safe LRU whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    def __init__(self, namespace, ttl, local_size=256, local_ttl=5, beta=1.0, lock_timeout=5):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LocalLRU(local_size, local_ttl)
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.version_key = f"tiered:{namespace}:version"
+
+    def version(self):
+        version = self.local.get(self.version_key)
+        if version is None:
+            version = cache.get(self.version_key)
+            if version is None:
+                cache.add(self.version_key, uuid.uuid4().hex[:8], None)
+                version = cache.get(self.version_key)
+            self.local.set(self.version_key, version)
+        return version
+
+    def key(self, key, version=None):
+        return f"tiered:{self.namespace}:{version or self.version()}:{key}"
+
+    def get_or_build(self, key, build):
+        """Return the cached value of ``key``, calling ``build()`` to (re)build it"""
+        full_key = self.key(key)
+        item = self.local.get(full_key)
+        metrics.cache_lookup(f"{self.namespace}_local", item is not None)
+        if item is not None:
+            return item[0]
+
+        entry = cache.get(full_key)
+        if entry is not None:
+            value, delta, expires = entry
+            # 1 - random() is in (0, 1], so the early refresh margin is never negative
+            fresh = time.time() - delta * self.beta * math.log(1 - random.random()) < expires
+            metrics.cache_lookup(self.namespace, fresh)
+            if fresh or not self.acquire(full_key):
+                # Fresh enough, or another worker is already rebuilding it
+                self.local.set(full_key, (value,))
+                return value
+        else:
+            metrics.cache_lookup(self.namespace, False)
+            if not self.acquire(full_key):
+                entry = self.wait(full_key)
+                if entry is not None:
+                    self.local.set(full_key, (entry[0],))
+                    return entry[0]
+                # The rebuild did not finish in time; build without the lock
+                return self.build(full_key, build)
+        try:
+            return self.build(full_key, build)
+        finally:
+            cache.delete(f"{full_key}:lock")
+
+    async def aget_or_build(self, key, build):
+        """get_or_build() for async views; only goes to a thread when the local tier misses"""
+        version = self.local.get(self.version_key)
+        item = self.local.get(self.key(key, version)) if version is not None else None
+        if item is not None:
+            metrics.cache_lookup(f"{self.namespace}_local", True)
+            return item[0]
+        return await sync_to_async(self.get_or_build)(key, build)
+
+    def acquire(self, full_key):
+        return cache.add(f"{full_key}:lock", 1, self.lock_timeout)
+
+    def wait(self, full_key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(full_key)
+            if entry is not None:
+                return entry
+        return None
+
+    def build(self, full_key, build):
+        started = time.time()
+        value = build()
+        now = time.time()
+        # Kept past its expiry so it can be served while one worker rebuilds it
+        cache.set(full_key, (value, now - started, now + self.ttl), self.ttl * 2)
+        self.local.set(full_key, (value,))
+        metrics.CACHE_REBUILDS.labels(self.namespace).inc()
+        return value
+
+    def delete(self, *keys):
+        """Drop single keys (from other processes' LRU within ``local_ttl``)"""
+        full_keys = [self.key(key) for key in keys]
+        cache.delete_many(full_keys)
+        for full_key in full_keys:
+            self.local.delete(full_key)
+
+    def invalidate(self):
+        """Drop every key of the namespace"""
+        cache.set(self.version_key, uuid.uuid4().hex[:8], None)
+        self.local.clear()
+
+
+CACHE_TTLS = getattr(settings, 'TIERED_CACHE_TTLS', {})
+
+catalog_cache = TieredCache('catalog', CACHE_TTLS.get('catalog', 300))
+test_cache = TieredCache('tests', CACHE_TTLS.get('tests', 300))
+profile_cache = TieredCache('profiles', CACHE_TTLS.get('profiles', 60), local_size=1024)
+
+
+def clear_local():
+    """Empty this process' tier of every tiered cache, e.g. after clearing the shared cache in tests"""
+    for tiered in (catalog_cache, test_cache, profile_cache):
+        tiered.local.clear()
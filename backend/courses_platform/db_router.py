@@ -0,0 +1,105 @@
+# db_router.py
+"""
+Routes reads of REPLICA_READ_MODELS to the read replicas in REPLICA_DATABASES
+and everything else to the primary.
+
+Replicas lag behind the primary, so reads are pinned to the primary
+- inside transactions on the primary,
+- for the rest of a request once it has written, and
+- for REPLICA_PIN_SECONDS after a user's request wrote, so the next pages
+  they load (e.g. a result right after submitting a test) are not stale.
+
+Pins are kept in the Django cache, which must be shared between processes
+for them to follow a user across workers.
+"""
+import contextvars
+import random
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+current = contextvars.ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    __slots__ = ('request', 'wrote', 'pinned')
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        # Looked up once the request is authenticated
+        self.pinned = None
+
+
+def _pin_key(user_id):
+    return f"db-pin:{user_id}"
+
+
+def pin_user(user_id):
+    """Read from the primary for the user's requests in the next REPLICA_PIN_SECONDS"""
+    cache.set(_pin_key(user_id), 1, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+
+
+def _request_user_id(request):
+    # DRF sets request.user on the underlying request when it authenticates
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+def is_pinned(state):
+    if state.wrote:
+        return True
+    if state.pinned is None:
+        user_id = _request_user_id(state.request)
+        if user_id is None:
+            return False
+        state.pinned = cache.get(_pin_key(user_id)) is not None
+    return state.pinned
+
+
+def finish(state):
+    """Pin the request's user if the request wrote to the primary"""
+    if state.wrote:
+        user_id = _request_user_id(state.request)
+        if user_id is not None:
+            pin_user(user_id)
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = list(getattr(settings, 'REPLICA_DATABASES', []))
+        self.models = {label.lower() for label in getattr(settings, 'REPLICA_READ_MODELS', [])}
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or model._meta.label_lower not in self.models:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state = current.get()
+        if state is not None and is_pinned(state):
+            return DEFAULT_DB_ALIAS
+        # Related objects come from the database their instance was read from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        state = current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        pool = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas:
+            return False
+        return None
@@ -0,0 +1,71 @@
+# instrumentation.py
+"""
+Per-request measurements: query count, DB time and serializer time.
+
+Queries are counted with a connection execute wrapper (works with DEBUG off).
+Serializer time is the time spent producing ``.data`` of the serializers a
+view gets from get_serializer(), on views using SerializerTimingMixin; it
+includes any queries the serializer triggers, which is where N+1s show up.
+"""
+import contextvars
+import functools
+import time
+
+current = contextvars.ContextVar('request_instrumentation', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+def query_wrapper(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created receiver keeping query_wrapper on a connection for its lifetime"""
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+@functools.cache
+def timed_serializer_class(serializer_class):
+    """Subclass of serializer_class adding the time spent in ``.data`` to the current request"""
+    class TimedSerializer(serializer_class):
+        @property
+        def data(self):
+            stats = current.get()
+            started = time.perf_counter()
+            try:
+                return super().data
+            finally:
+                if stats is not None:
+                    stats.serializer_time += time.perf_counter() - started
+
+    TimedSerializer.__name__ = serializer_class.__name__
+    TimedSerializer.__qualname__ = serializer_class.__qualname__
+    return TimedSerializer
+
+
+class SerializerTimingMixin:
+    """Record the serializer time of the serializers returned by get_serializer()"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        # Schema generation inspects serializer classes, so it keeps the originals
+        if current.get() is not None and not getattr(self, 'swagger_fake_view', False):
+            serializer.__class__ = timed_serializer_class(type(serializer))
+        return serializer
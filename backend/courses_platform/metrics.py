@@ -0,0 +1,71 @@
+# metrics.py
+"""
+Prometheus metrics served in text format at /metrics.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR to an empty directory (see
+gunicorn.conf.py): every worker then writes its samples to memory-mapped
+files there and a scrape aggregates all workers. Without it the metrics
+of the current process are served.
+
+Scrapes must send "Authorization: Bearer <METRICS_TOKEN>"; without a token
+configured the endpoint is only open when DEBUG is on.
+"""
+import hmac
+import os
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client import REGISTRY
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by view and status',
+    ['view', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being processed', multiprocess_mode='livesum',
+)
+DB_TIME = Histogram(
+    'db_request_time_seconds', 'Total database time per request by view', ['view'], buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'Number of queries per request by view', ['view'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_CONNECTIONS = Counter('db_connections_opened_total', 'Database connections opened', ['alias'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result'])
+CACHE_REBUILDS = Counter('cache_rebuilds_total', 'Tiered cache values built by namespace', ['cache'])
+GRADING_DURATION = Histogram(
+    'grading_duration_seconds', 'Time spent grading a test submission', buckets=LATENCY_BUCKETS,
+)
+
+
+def cache_lookup(cache_name, hit):
+    CACHE_REQUESTS.labels(cache_name, 'hit' if hit else 'miss').inc()
+
+
+def _connection_created(sender, connection, **kwargs):
+    DB_CONNECTIONS.labels(connection.alias).inc()
+
+
+connection_created.connect(_connection_created)
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
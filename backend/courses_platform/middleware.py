@@ -0,0 +1,404 @@
+# middleware.py
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextlib import ExitStack
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import APIException
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+from whitenoise.responders import IsDirectoryError, MissingFileError
+from whitenoise.string_utils import ensure_leading_trailing_slash
+from . import db_router, instrumentation, metrics, profiling, slowlog
+from .storage import HASHED_NAME_RE
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI. A single
+    sync-only middleware would make Django run every async view on a thread,
+    so subclasses implement ``__acall__`` and hand off to it from ``__call__``
+    when ``async_mode`` is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class WhiteNoiseMiddleware(HybridMiddleware, BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware with an async code path that also serves
+    MEDIA_ROOT. Content-hashed static files and media (see storage.py) are
+    cached for a year as immutable.
+    """
+    FOREVER = 365 * 24 * 60 * 60
+
+    def __init__(self, get_response):
+        # Used by immutable_file_test() while WhiteNoise indexes STATIC_ROOT
+        self.media_prefix = ensure_leading_trailing_slash(urlparse(settings.MEDIA_URL).path)
+        self.media_root = os.path.join(settings.MEDIA_ROOT, '')
+        BaseWhiteNoiseMiddleware.__init__(self, get_response)
+        HybridMiddleware.__init__(self, get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        static_file = self.find_static_file(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.find_static_file(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+    def find_static_file(self, url):
+        if url.startswith(self.media_prefix):
+            return self.find_media_file(url)
+        if self.autorefresh:
+            return self.find_file(url)
+        return self.files.get(url)
+
+    def find_media_file(self, url):
+        # Uploads are added while running, so they are looked up on every request
+        if not self.url_is_canonical(url):
+            return None
+        try:
+            return self.find_file_at_path(os.path.join(self.media_root, url[len(self.media_prefix):]), url)
+        except (MissingFileError, IsDirectoryError):
+            return None
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(self.media_prefix):
+            return bool(HASHED_NAME_RE.search(url))
+        return super().immutable_file_test(path, url)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Feeds request latency, in-flight requests and per-view DB stats to the metrics registry"""
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, elapsed):
+        # Unresolved paths share one label so scanners cannot blow up cardinality
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(elapsed)
+        stats = getattr(request, 'instrumentation', None)
+        if stats:
+            metrics.DB_TIME.labels(view).observe(stats['db_time'])
+            metrics.DB_QUERIES.labels(view).observe(stats['queries'])
+
+
+class AdmissionControlMiddleware(HybridMiddleware):
+    """
+    Caps the number of requests in flight in this process per route class
+    ('read', 'write' and 'grade' for CPU-heavy routes such as grading and
+    password hashing). Requests that cannot get a slot within
+    ADMISSION_QUEUE_TIMEOUT seconds are shed with 503 and Retry-After
+    before they reach the database.
+
+    The slots are per worker process: they bound the threads of a gthread
+    worker or the tasks of an ASGI event loop. A sync gunicorn worker serves
+    one request at a time, so it never queues here; gunicorn.conf.py runs
+    gthread workers for that reason. Cluster-wide limits are left to the
+    throttles in courses_platform/throttling.py.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.limits = getattr(settings, 'ADMISSION_LIMITS', {})
+        self.heavy_routes = set(getattr(settings, 'ADMISSION_HEAVY_ROUTES', ()))
+        self.timeout = getattr(settings, 'ADMISSION_QUEUE_TIMEOUT', 0.05)
+        # Under ASGI all requests of the process share one event loop
+        semaphore = asyncio.BoundedSemaphore if self.async_mode else threading.BoundedSemaphore
+        self.slots = {
+            route_class: semaphore(limit)
+            for route_class, limit in self.limits.items() if limit
+        }
+
+    def route_class(self, request):
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            url_name = None
+        if url_name in self.heavy_routes:
+            return 'grade'
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def busy(self):
+        response = JsonResponse(
+            {"detail": "Server is busy, please retry shortly."},
+            status=503,
+        )
+        response['Retry-After'] = '1'
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        slots = self.slots.get(self.route_class(request))
+        if slots is None:
+            return self.get_response(request)
+
+        if not slots.acquire(timeout=self.timeout):
+            return self.busy()
+        try:
+            return self.get_response(request)
+        finally:
+            slots.release()
+
+    async def __acall__(self, request):
+        slots = self.slots.get(self.route_class(request))
+        if slots is None:
+            return await self.get_response(request)
+
+        try:
+            await asyncio.wait_for(slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            return self.busy()
+        try:
+            return await self.get_response(request)
+        finally:
+            slots.release()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryInstrumentationMiddleware(HybridMiddleware):
+    """
+    Records, per resolved view, the number of queries, DB time, serializer
+    time (see instrumentation.SerializerTimingMixin) and response size of
+    every request. The numbers are kept on ``request.instrumentation`` and
+    sent as a Server-Timing header when QUERY_INSTRUMENTATION_HEADERS is on
+    (DEBUG by default).
+
+    Views declare a budget with a ``query_budget`` attribute, or by URL name
+    in QUERY_BUDGETS. Exceeding it logs a warning, or raises
+    QueryBudgetExceeded when QUERY_BUDGET_STRICT is on (as under the test runner).
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if self.async_mode:
+            # The async ORM runs queries on worker threads with their own connections
+            connection_created.connect(instrumentation.install_query_wrapper)
+
+    def get_budget(self, request):
+        match = request.resolver_match
+        if match is None:
+            return None
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        if match.url_name in budgets:
+            return budgets[match.url_name]
+        view_class = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None)
+        return getattr(view_class, 'query_budget', None)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = instrumentation.RequestStats()
+        token = instrumentation.current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(instrumentation.query_wrapper))
+                response = self.get_response(request)
+        finally:
+            instrumentation.current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = instrumentation.RequestStats()
+        token = instrumentation.current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, total):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        size = len(response.content) if not response.streaming else None
+        request.instrumentation = {
+            'view': view_name,
+            'queries': stats.queries,
+            'db_time': stats.db_time,
+            'serializer_time': stats.serializer_time,
+            'total_time': total,
+            'response_bytes': size,
+        }
+        logger.debug("%s %s: %d queries, db %.1fms, serializer %.1fms, %s bytes", request.method, view_name,
+                     stats.queries, stats.db_time * 1000, stats.serializer_time * 1000, size)
+
+        if getattr(settings, 'QUERY_INSTRUMENTATION_HEADERS', settings.DEBUG):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'serialize;dur={stats.serializer_time * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ])
+
+        budget = self.get_budget(request)
+        if budget is not None and stats.queries > budget:
+            message = f"{view_name} ran {stats.queries} queries, over its budget of {budget}"
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class SlowQueryLogMiddleware(HybridMiddleware):
+    """Logs queries slower than SLOW_QUERY_THRESHOLD_MS with their view and plan (see slowlog.py)"""
+
+    def __init__(self, get_response):
+        threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+        if threshold is None:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        self.wrapper = slowlog.slow_query_wrapper(threshold / 1000)
+        if self.async_mode:
+            connection_created.connect(self.install_wrapper)
+
+    def install_wrapper(self, sender, connection, **kwargs):
+        if self.wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.wrapper)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = slowlog.current_request.set(request)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(self.wrapper))
+                return self.get_response(request)
+        finally:
+            slowlog.current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = slowlog.current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            slowlog.current_request.reset(token)
+
+
+class ReplicaPinMiddleware(HybridMiddleware):
+    """Tracks the request's writes for the replica router and pins users who wrote (see db_router.py)"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REPLICA_DATABASES', None):
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = db_router.RoutingState(request)
+        token = db_router.current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.current.reset(token)
+        db_router.finish(state)
+        return response
+
+    async def __acall__(self, request):
+        state = db_router.RoutingState(request)
+        token = db_router.current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.current.reset(token)
+        db_router.finish(state)
+        return response
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Profiles requests from staff users that carry PROFILING_HEADER, and a
+    PROFILING_SAMPLE_RATE fraction of all requests (see profiling.py).
+    Requests that are not profiled only pay for a header lookup. Under ASGI
+    nothing is profiled: cProfile would record every request on the event loop.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.header = getattr(settings, 'PROFILING_HEADER', 'X-Profile')
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+
+    def is_staff(self, request):
+        if request.user.is_authenticated:
+            return request.user.is_staff
+        # API clients authenticate with a JWT, which DRF only checks inside the view
+        from users.authentication import CachedJWTAuthentication
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        return result is not None and result[0].is_staff
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.get_response(request)
+        if self.header in request.headers:
+            sampled = self.is_staff(request)
+        else:
+            sampled = bool(self.sample_rate) and random.random() < self.sample_rate
+        if not sampled:
+            return self.get_response(request)
+
+        with profiling.RequestProfiler() as profiler:
+            response = self.get_response(request)
+        try:
+            record = profiler.save(request, response)
+        except Exception:
+            logger.exception("Could not save the profile of %s %s", request.method, request.path)
+        else:
+            response['X-Profile-Id'] = str(record.pk)
+        return response
@@ -0,0 +1,124 @@
+# profiling.py
+"""
+On-demand profiling of live requests.
+
+A request is profiled when a staff user sends the PROFILING_HEADER header,
+or at random with probability PROFILING_SAMPLE_RATE. It then runs under
+cProfile while a sampler thread records the request thread's stack every
+PROFILING_INTERVAL seconds. Both outputs are written to PROFILING_ROOT:
+``<id>.pstats`` (load with ``pstats.Stats``/snakeviz) and
+``<id>.collapsed`` (one "frame;frame;frame count" line per stack, the input
+of flamegraph.pl and speedscope). Profiles are listed in the admin under
+"Request profiles"; only the newest PROFILING_KEEP are kept.
+"""
+import cProfile
+import marshal
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from django.conf import settings
+
+
+def profiles_root():
+    root = getattr(settings, 'PROFILING_ROOT', os.path.join(settings.BASE_DIR, 'profiles'))
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+class RequestProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_INTERVAL', 0.005))
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.sampler.stop()
+        self.duration = time.perf_counter() - self.started
+
+    def save(self, request, response):
+        """Write the pstats and collapsed stacks files and record the profile"""
+        from courses.models import RequestProfile
+
+        root = profiles_root()
+        name = uuid.uuid4().hex
+        self.profile.create_stats()
+        with open(os.path.join(root, name + '.pstats'), 'wb') as f:
+            marshal.dump(self.profile.stats, f)
+        with open(os.path.join(root, name + '.collapsed'), 'w') as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        user = getattr(request, 'user', None)
+        match = request.resolver_match
+        record = RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            view_name=match.view_name if match else '',
+            user=user if user is not None and user.is_authenticated else None,
+            status_code=response.status_code,
+            duration=self.duration,
+            samples=sum(self.sampler.stacks.values()),
+            stats_file=name + '.pstats',
+            collapsed_file=name + '.collapsed',
+        )
+        prune(getattr(settings, 'PROFILING_KEEP', 200))
+        return record
+
+
+def delete_files(profiles):
+    root = profiles_root()
+    for profile in profiles:
+        for name in (profile.stats_file, profile.collapsed_file):
+            try:
+                os.remove(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+
+
+def prune(keep):
+    """Delete all but the newest ``keep`` profiles"""
+    from courses.models import RequestProfile
+
+    old = list(RequestProfile.objects.order_by('-created_at', '-id')[keep:])
+    if old:
+        delete_files(old)
+        RequestProfile.objects.filter(pk__in=[profile.pk for profile in old]).delete()
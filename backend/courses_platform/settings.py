@@ -53,7 +53,6 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
-    'drf_yasg',
     'users',
     'courses',
 ]
@@ -61,13 +60,19 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'courses_platform.middleware.WhiteNoiseMiddleware',
+    'courses_platform.middleware.MetricsMiddleware',
+    'courses_platform.middleware.AdmissionControlMiddleware',
+    'courses_platform.middleware.QueryInstrumentationMiddleware',
+    'courses_platform.middleware.SlowQueryLogMiddleware',
+    'courses_platform.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'courses_platform.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'courses_platform.urls'
@@ -90,18 +95,146 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'courses_platform.wsgi.application'
 
+# Shared cache for throttles, authenticated users and the tiered caches. Set
+# CACHE_URL to a Redis (redis://, needs the redis package) or Memcached
+# (memcached://host:port, needs pymemcache) server in production, so workers
+# share it. Without it each process gets its own in-memory cache, which is
+# only meant for development.
+CACHE_URL = os.getenv('CACHE_URL')
+if CACHE_URL and CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL[len('memcached://'):],
+        }
+    }
+elif CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Tests clear the cache, so they get their own
+TEST_RUNNER = 'courses_platform.test_runner.TestRunner'
+
+# Seconds until catalog, test payload and profile entries are rebuilt; a
+# per-process LRU sits in front of the shared cache (see courses_platform/caching.py)
+TIERED_CACHE_TTLS = {
+    'catalog': 300,
+    'tests': 300,
+    'profiles': 60,
+}
+
+# Authenticated users are cached for a short time (see users/authentication.py)
+AUTH_USER_CACHE_TTL = 60
+AUTH_USER_LOCAL_TTL = 5
+AUTH_USER_LOCAL_SIZE = 1024
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson-backed JSON with DRF's output (see courses_platform/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'courses_platform.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'courses_platform.parsers.ORJSONParser',
     ],
+    # Sliding windows per user ('<scope>') and per IP ('<scope>_ip'), see courses_platform/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': [
+        'courses_platform.throttling.UserSlidingWindowThrottle',
+        'courses_platform.throttling.IPSlidingWindowThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'default': '300/min',
+        'default_ip': '1200/min',
+        'catalog': '60/min',
+        'catalog_ip': '600/min',
+        'start_test': '20/min',
+        'submit_test': '10/min',
+        'submit_test_ip': '300/min',
+        'register_ip': '20/min',
+        'login_ip': '60/min',
+    },
+}
+
+# Benchmarks drive many users from one address; set DISABLE_THROTTLING=1 on the server under test
+if os.getenv('DISABLE_THROTTLING'):
+    REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = []
+
+# Per-process cap on in-flight requests by route class, shared by the threads of
+# a gthread worker or the event loop of an ASGI worker (see courses_platform/middleware.py)
+ADMISSION_LIMITS = {
+    'read': int(os.getenv('ADMISSION_READ_LIMIT', 64)),
+    'write': int(os.getenv('ADMISSION_WRITE_LIMIT', 16)),
+    'grade': int(os.getenv('ADMISSION_GRADE_LIMIT', 8)),
+}
+ADMISSION_HEAVY_ROUTES = ['submit-test', 'review-open-answer', 'register', 'login', 'bulk-register']
+ADMISSION_QUEUE_TIMEOUT = 0.05
+
+# Query counts, DB and serializer time per view (see QueryInstrumentationMiddleware).
+# Budgets are declared with `query_budget` on views or here by URL name.
+QUERY_INSTRUMENTATION_HEADERS = DEBUG or bool(os.getenv('QUERY_INSTRUMENTATION_HEADERS'))
+QUERY_BUDGETS = {}
+# Budget overruns only log a warning unless this is set; the test runner
+# (courses_platform/test_runner.py) always makes them fail
+QUERY_BUDGET_STRICT = bool(os.getenv('QUERY_BUDGET_STRICT'))
+
+# When set, queries slower than this during a request are logged as JSON lines
+# to SLOW_QUERY_LOG with their plan; summarize with `manage.py slow_queries`.
+# Off by default, and when set to an empty value.
+SLOW_QUERY_THRESHOLD_MS = float(os.environ['SLOW_QUERY_THRESHOLD_MS']) if os.getenv('SLOW_QUERY_THRESHOLD_MS') else None
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', BASE_DIR / 'slow_queries.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.FileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'formatter': 'message',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'courses_platform.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
+# Prometheus metrics at /metrics (see courses_platform/metrics.py). Scrapes
+# must send "Authorization: Bearer <METRICS_TOKEN>"; unset, only DEBUG allows them
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Request profiling (see courses_platform/profiling.py): staff requests with
+# the PROFILING_HEADER header, and this fraction of all requests, are profiled
+PROFILING_HEADER = 'X-Profile'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = 0.005
+PROFILING_ROOT = os.getenv('PROFILING_ROOT', BASE_DIR / 'profiles')
+PROFILING_KEEP = 200
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000", 
@@ -120,11 +253,50 @@ CORS_ALLOWED_ORIGINS = [
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
-        conn_max_age=600,
+        # asgi.py turns persistent connections off: async requests each get their own DB thread
+        conn_max_age=int(os.getenv('CONN_MAX_AGE', 600)),
         conn_health_checks=True,
     )
 }
 
+# Read replicas as comma separated database URLs. Locally, a copy of the SQLite
+# file (or a second Postgres database) acts as a replica that never catches up.
+REPLICA_DATABASES = []
+for index, url in enumerate(u.strip() for u in os.getenv('REPLICA_DATABASE_URLS', '').split(',') if u.strip()):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(
+        url,
+        conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+        conn_health_checks=True,
+    )
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+
+# Reads of these models go to the replicas, see courses_platform/db_router.py
+DATABASE_ROUTERS = ['courses_platform.db_router.ReplicaRouter']
+REPLICA_READ_MODELS = [
+    # Catalog and test fetches
+    'courses.Course', 'courses.Lesson', 'courses.Test', 'courses.Question', 'courses.Choice',
+    # Results and analytics
+    'courses.TestSubmission', 'courses.Answer', 'courses.LessonProgress',
+    'courses.CourseFunnel', 'courses.LessonFunnel',
+]
+# How long a user's reads stay on the primary after they wrote
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+# Serve the read-heavy course endpoints with the async views in courses/async_views.py.
+# Set by asgi.py; under WSGI each async view would need its own event loop.
+ASYNC_READ_VIEWS = bool(os.getenv('ASYNC_READ_VIEWS'))
+
+
+# The OpenAPI schema is built by `manage.py build_openapi_schema` into
+# STATIC_ROOT and served as a static file. drf_yasg is only loaded for the
+# interactive docs at /api/docs/, enabled with API_DOCS.
+API_DOCS = bool(os.getenv('API_DOCS'))
+if API_DOCS:
+    INSTALLED_APPS.append('drf_yasg')
+OPENAPI_SCHEMA_FILE = 'openapi.json'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -144,6 +316,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing runs on a bounded thread pool (see users/hashing.py).
+# Set PASSWORD_HASHER to another hasher's dotted path, or change
+# PASSWORD_HASH_ITERATIONS, and stored passwords are rehashed on next login.
+
+AUTHENTICATION_BACKENDS = [
+    'users.backends.OffloadedHashingBackend',
+]
+
+PASSWORD_HASHERS = list(dict.fromkeys([
+    os.getenv('PASSWORD_HASHER', 'users.hashers.PBKDF2PasswordHasher'),
+    'users.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]))
+
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 0)) or None
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 0)) or None
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 64))
+# Processes started by each web worker for bulk roster registration (users/roster.py)
+ROSTER_HASH_WORKERS = int(os.getenv('ROSTER_HASH_WORKERS', 2))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -163,11 +358,26 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "static"
 
+# collectstatic writes content-hashed copies of static files with gzip and
+# brotli variants; uploads are saved under content-hashed names as well (see
+# courses_platform/storage.py). WhiteNoise serves both with immutable headers.
+STORAGES = {
+    'default': {'BACKEND': 'courses_platform.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+# Files added to STATIC_ROOT after collectstatic, like openapi.json, keep their names
+WHITENOISE_MANIFEST_STRICT = False
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-WHITENOISE_MEDIA_PREFIX = 'media/'
+# Profile pictures are streamed to disk and capped at this size; thumbnails
+# of these sizes are generated in the background (see users/thumbnails.py)
+PROFILE_PICTURE_MAX_SIZE = 5 * 1024 * 1024
+PROFILE_THUMBNAIL_SIZES = (64, 128, 256)
+
+# Cache lifetime of static files and uploads without a content hash
 WHITENOISE_MAX_AGE = 3600
 
 # Default primary key field type
@@ -0,0 +1,102 @@
+# slowlog.py
+"""
+Slow-query log.
+
+Queries that take longer than SLOW_QUERY_THRESHOLD_MS during a request are
+written as JSON lines to the 'courses_platform.slow_queries' logger (sent to
+SLOW_QUERY_LOG in settings) together with the view, a normalized SQL
+fingerprint and, for SELECTs, the query plan. Plans are captured on a
+background thread with its own connection, once per fingerprint per process,
+so the request does not wait for them. ``manage.py slow_queries`` summarizes
+the log.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('courses_platform.slow_queries')
+
+current_request = contextvars.ContextVar('slow_query_request', default=None)
+
+_explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+_explained = set()
+_explained_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """SQL with literals and parameters replaced, so similar queries group together"""
+    sql = _STRING.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint_id(fingerprint):
+    return hashlib.md5(fingerprint.encode()).hexdigest()[:12]
+
+
+def explain(alias, sql, params):
+    """Return the query plan of a SELECT as a list of lines"""
+    connection = connections[alias]
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    finally:
+        # This thread's connection would otherwise stay open until the process exits
+        connection.close()
+
+
+def _write(entry, alias, sql, params, is_select):
+    with _explained_lock:
+        first = entry['fingerprint_id'] not in _explained
+        _explained.add(entry['fingerprint_id'])
+    if is_select and first:
+        try:
+            entry['plan'] = explain(alias, sql, params)
+        except Exception as e:
+            entry['plan_error'] = str(e)
+    logger.warning(json.dumps(entry))
+
+
+def slow_query_wrapper(threshold):
+    """Execute wrapper logging queries slower than ``threshold`` seconds"""
+
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            request = current_request.get()
+            if duration >= threshold and request is not None:
+                match = request.resolver_match
+                normalized = fingerprint(sql)
+                entry = {
+                    'time': timezone.now().isoformat(),
+                    'view': match.view_name if match else None,
+                    'method': request.method,
+                    'path': request.path,
+                    'duration_ms': round(duration * 1000, 2),
+                    'fingerprint_id': fingerprint_id(normalized),
+                    'fingerprint': normalized,
+                    'sql': sql[:2000],
+                }
+                is_select = not many and sql.lstrip()[:6].upper() == 'SELECT'
+                _explainer.submit(_write, entry, context['connection'].alias, sql, params, is_select)
+
+    return wrapper
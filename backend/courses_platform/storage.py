@@ -0,0 +1,64 @@
+# storage.py
+"""
+Content-addressed storage for uploads.
+
+Uploaded files are saved under names carrying a hash of their content, in
+the same format ManifestStaticFilesStorage uses for static files, e.g.
+profile_pictures/photo.3f2a9c1e07b4.jpg. A name then always refers to the
+same bytes, so WhiteNoiseMiddleware serves media with immutable cache
+headers, and uploading the same file again reuses the stored copy.
+Compressible files get gzip and brotli variants when they are saved.
+"""
+import hashlib
+import os
+import re
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from whitenoise.compress import Compressor
+
+# name.<12 hex digits>.ext
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+def hashed_name(name, digest):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest[:12]}{ext}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return hashed_name(name, digest.hexdigest())
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self.save_hashed(self.content_name(name, content), content, max_length=max_length)
+
+    def save_hashed(self, name, content, max_length=None):
+        """
+        Save under ``name``, which the caller has already derived from the
+        content (e.g. thumbnails named after their source picture). An
+        existing file of that name is kept.
+        """
+        if self.exists(name):
+            return name
+        name = super().save(name, content, max_length=max_length)
+        self.compress(name)
+        return name
+
+    def compress(self, name):
+        compressor = Compressor(quiet=True)
+        if compressor.should_compress(name):
+            compressor.compress(self.path(name))
+
+    def delete(self, name):
+        super().delete(name)
+        for suffix in ('.gz', '.br'):
+            if self.exists(name + suffix):
+                super().delete(name + suffix)
@@ -0,0 +1,23 @@
+# test_runner.py
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests against a private in-memory cache, since they clear it,
+    and fails any request that goes over its query budget
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.settings_override = override_settings(CACHES=TEST_CACHES, QUERY_BUDGET_STRICT=True)
+        self.settings_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.settings_override.disable()
+        super().teardown_test_environment(**kwargs)
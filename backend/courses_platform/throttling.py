@@ -0,0 +1,101 @@
+# throttling.py
+"""
+Sliding-window throttles with counters in the shared Django cache.
+
+A client may make N requests per period ('N/period', same format as DRF
+rates), all at once or spread out. The count over the last period is
+estimated from the counters of the current and the previous fixed window,
+weighting the previous one by how much of it still overlaps. Counters only
+change through the cache's atomic ``add``/``incr``/``decr``, so concurrent
+requests in any worker never spend the same slot as long as CACHE_URL points
+at a shared backend (Redis or Memcached).
+
+Each view picks a budget with ``throttle_scope``; the per-user budget is the
+scope's rate and the per-IP budget is the ``<scope>_ip`` rate, falling back to
+the 'default' budgets.
+"""
+import time
+from django.core.cache import cache as default_cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+def parse_rate(rate):
+    """'N/period' -> (N, period in seconds)"""
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    cache = default_cache
+    timer = time.time
+    rate_suffix = ''
+
+    def get_ident_key(self, request):
+        """Identify the client, or return None to skip this throttle"""
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def get_rate(self, view):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        scope = getattr(view, 'throttle_scope', None) or 'default'
+        rate = rates.get(scope + self.rate_suffix, rates.get('default' + self.rate_suffix))
+        return scope, rate
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request)
+        scope, rate = self.get_rate(view)
+        if ident is None or rate is None:
+            return True
+
+        self.capacity, self.duration = parse_rate(rate)
+        now = self.timer()
+        window, elapsed = divmod(now, self.duration)
+        key = f"throttle:{scope}{self.rate_suffix}:{ident}"
+        current_key = f"{key}:{int(window)}"
+
+        # The counter must outlive the next window, which weighs it as previous
+        self.cache.add(current_key, 0, 2 * self.duration)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted or expired since add(): this request starts the counter again
+            self.cache.add(current_key, 1, 2 * self.duration)
+            current = 1
+        self.previous = self.cache.get(f"{key}:{int(window) - 1}", 0)
+        self.overlap = 1 - elapsed / self.duration
+        if self.previous * self.overlap + current <= self.capacity:
+            return True
+
+        # Rejected requests don't count against the budget
+        try:
+            self.current = self.cache.decr(current_key)
+        except ValueError:
+            self.current = 0
+        self.elapsed = elapsed
+        return False
+
+    def wait(self):
+        """Seconds until the previous window has slid far enough to free a slot"""
+        free = self.capacity - self.current - 1
+        if self.previous and free >= 0:
+            # previous * (1 - t / duration) + current + 1 <= capacity
+            return max(0, (1 - free / self.previous) * self.duration - self.elapsed)
+        # The current window alone is full: wait for it to become the previous one
+        return self.duration - self.elapsed
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle):
+    """Budget per authenticated user"""
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return None
+
+
+class IPSlidingWindowThrottle(SlidingWindowThrottle):
+    """Budget per client address, for anonymous and authenticated requests alike"""
+    rate_suffix = '_ip'
+
+    def get_ident_key(self, request):
+        return f"ip:{self.get_ident(request)}"
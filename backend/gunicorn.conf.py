@@ -0,0 +1,23 @@
+# gunicorn.conf.py
+# Picked up automatically by gunicorn when started from this directory.
+import os
+import shutil
+
+# Threaded workers: a request waiting on the password hashing pool (see
+# users/hashing.py) or on the database leaves the worker's other threads free
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Workers share metrics through memory-mapped files in this directory
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/courses_platform_metrics')
+
+
+def on_starting(server):
+    # Samples of a previous run must not be aggregated into this one
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
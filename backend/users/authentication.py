@@ -0,0 +1,92 @@
+# authentication.py
+"""
+JWT authentication that resolves the token's user from a short-TTL cache.
+
+Users are looked up in a small per-process LRU first, then in the shared
+Django cache, and only then loaded from the database with just the columns
+needed for permission checks. Other columns of request.user stay deferred
+and each costs a query when read, so views that need the full profile load
+it explicitly.
+
+Saving or deleting a user, and User.objects...update(), invalidate the
+shared entry and this process' LRU; other processes drop their LRU entry
+within AUTH_USER_LOCAL_TTL seconds. Writes bypassing the ORM (raw SQL) are
+only seen after AUTH_USER_CACHE_TTL. The shared entry is only shared
+between processes when CACHE_URL points at a shared cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from courses_platform import metrics
+from courses_platform.caching import LocalLRU
+from .models import User
+
+AUTH_FIELDS = ['id', 'username', 'is_active', 'is_staff', 'is_superuser']
+
+_local = LocalLRU(
+    maxsize=getattr(settings, 'AUTH_USER_LOCAL_SIZE', 1024),
+    ttl=getattr(settings, 'AUTH_USER_LOCAL_TTL', 5),
+)
+
+
+def _fields():
+    # The password hash is only needed (and only cached) when revocation is checked
+    wanted = AUTH_FIELDS + ['password'] if api_settings.CHECK_REVOKE_TOKEN else AUTH_FIELDS
+    # Model.from_db expects values in the order of the model's concrete fields
+    return [f.attname for f in User._meta.concrete_fields if f.attname in wanted]
+
+
+def _cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Drop a user from the shared cache and this process' LRU"""
+    cache.delete(_cache_key(user_id))
+    _local.delete(user_id)
+
+
+def get_auth_user(user_id):
+    """Return the user with only the permission-relevant fields loaded, or None"""
+    fields = _fields()
+    values = _local.get(user_id)
+    metrics.cache_lookup('auth_user_local', values is not None)
+    if values is None:
+        values = cache.get(_cache_key(user_id))
+        metrics.cache_lookup('auth_user', values is not None)
+        if values is None:
+            values = User.objects.filter(pk=user_id).values_list(*fields).first()
+            if values is None:
+                return None
+            cache.set(_cache_key(user_id), values, getattr(settings, 'AUTH_USER_CACHE_TTL', 60))
+        _local.set(user_id, values)
+    return User.from_db(DEFAULT_DB_ALIAS, fields, values)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # USER_ID_FIELD is the primary key in this project
+        user = get_auth_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from . import hashing
+
+UserModel = get_user_model()
+
+class OffloadedHashingBackend(ModelBackend):
+    """ModelBackend that verifies passwords on the bounded hashing pool"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self._authenticate(username, password, **kwargs)
+        except hashing.HashingBusy:
+            # Lets the API login view answer 503; elsewhere, e.g. the admin,
+            # the login just fails. PermissionDenied stops the other backends.
+            if request is not None:
+                request.hashing_busy = True
+            raise PermissionDenied
+
+    def _authenticate(self, username, password, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            hashing.make_password(password)
+            return None
+        if hashing.check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
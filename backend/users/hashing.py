@@ -0,0 +1,68 @@
+# hashing.py
+"""
+Password hashing on a dedicated, bounded thread pool.
+
+PBKDF2 releases the GIL, so running it on a small pool caps how many CPU
+cores registration and login bursts can take, while request threads serving
+course reads keep running. The request thread still waits for its hash, so
+this only helps with threaded workers (gunicorn.conf.py uses gthread).
+
+When too many hashes are already queued HashingBusy is raised instead of
+piling up; the API views turn it into 503 with Retry-After.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+class HashingBusy(Exception):
+    """Too many hashes are queued on the pool"""
+
+
+def _workers():
+    return getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or max((os.cpu_count() or 2) // 2, 1)
+
+
+def get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = _workers()
+                max_pending = getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', workers * 16)
+                _slots = threading.BoundedSemaphore(max_pending)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+    return _executor
+
+
+def run(func, *args):
+    """Run a hashing function on the pool and wait for its result"""
+    executor = get_executor()
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def make_password(raw_password):
+    return run(hashers.make_password, raw_password)
+
+
+def check_password(user, raw_password):
+    """
+    Like ``user.check_password`` but hashes on the pool. Passwords stored with a
+    hasher or work factor other than the preferred one are transparently rehashed.
+    """
+    is_correct, must_update = run(hashers.verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = make_password(raw_password)
+        user.save(update_fields=['password'])
+    return is_correct
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from users.models import User
+from users.thumbnails import generate_thumbnails
+
+class Command(BaseCommand):
+    help = 'Generates missing profile picture thumbnails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate thumbnails of every user with a picture')
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(profile_picture='').exclude(profile_picture=None)
+        if not options['all']:
+            users = users.filter(profile_thumbnails={})
+        
+        generated_count = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            if generate_thumbnails(user_id):
+                generated_count += 1
+        
+        self.stdout.write(f"Generated thumbnails for {generated_count} users")
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from users.roster import parse_roster, import_roster
+
+class Command(BaseCommand):
+    help = 'Registers users from a CSV (username,email,password,full_name) or JSON roster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='Path to a .csv or .json roster')
+        parser.add_argument('--workers', type=int, help='Processes used for password hashing (default and maximum: ROSTER_HASH_WORKERS)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['roster'], 'rb') as fp:
+                rows = parse_roster(fp.read(), options['roster'])
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f"Could not read roster: {e}")
+        
+        users, errors = import_roster(rows, workers=options['workers'])
+        
+        for error in errors:
+            messages = "; ".join(f"{field}: {' '.join(msgs)}" for field, msgs in error['errors'].items())
+            self.stdout.write(f"Row {error['row']} ({error['username'] or '-'}) skipped - {messages}")
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Import complete: {len(users)} created, {len(errors)} skipped in {elapsed:.2f}s")
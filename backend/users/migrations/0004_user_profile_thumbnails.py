@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_bio_user_date_of_birth_user_full_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_thumbnails',
+            field=models.JSONField(blank=True, default=dict, help_text='Thumbnail storage names by size'),
+        ),
+    ]
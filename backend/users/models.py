@@ -1,16 +1,43 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.dispatch import Signal
+
+# Sent with the ids of the users changed by QuerySet.update(), which sends no
+# post_save; users/signals.py drops their cached copies
+users_updated = Signal()
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Usernames as they were, so cached lookups by the old name are dropped too
+        users = list(self.values_list('pk', 'username'))
+        updated = super().update(**kwargs)
+        if users:
+            users_updated.send(sender=self.model, users=users)
+        return updated
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     full_name = models.CharField(max_length=255, blank=True)
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    profile_thumbnails = models.JSONField(default=dict, blank=True, help_text="Thumbnail storage names by size")
     date_of_birth = models.DateField(blank=True, null=True)
     phone_number = models.CharField(max_length=20, blank=True)
     website = models.URLField(blank=True)
     location = models.CharField(max_length=100, blank=True)
     
+    objects = UserManager()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Lets users/profiles.py drop the cached profile of the old username on renames
+        user._loaded_username = user.__dict__.get('username')
+        return user
+    
     def __str__(self):
         return self.username or self.email
     
\ No newline at end of file
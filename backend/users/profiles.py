@@ -0,0 +1,40 @@
+# profiles.py
+"""
+Profile lookups through the tiered profile cache (see courses_platform/caching.py).
+
+Only the fields shown on profiles are cached, never the password hash or
+permissions. Lookups return a User holding just those fields.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+from courses_platform.caching import profile_cache
+from .models import User
+
+PROFILE_FIELDS = (
+    'id', 'username', 'email', 'full_name', 'bio', 'profile_picture', 'profile_thumbnails',
+    'date_of_birth', 'phone_number', 'website', 'location',
+)
+
+
+def _profile_values(lookup):
+    values = User.objects.filter(**lookup).values_list(*PROFILE_FIELDS).first()
+    if values is None:
+        raise Http404("No User matches the given query.")
+    return values
+
+
+def get_profile(**lookup):
+    """The user matching a single ``pk`` or ``username`` lookup, or 404"""
+    (field, value), = lookup.items()
+    values = profile_cache.get_or_build(f"{field}:{value}", lambda: _profile_values(lookup))
+    return User.from_db(DEFAULT_DB_ALIAS, PROFILE_FIELDS, values)
+
+
+def invalidate_profile(user):
+    keys = [f"pk:{user.pk}", f"username:{user.username}"]
+    # After a rename the old username must stop resolving too
+    loaded_username = getattr(user, '_loaded_username', None)
+    if loaded_username and loaded_username != user.username:
+        keys.append(f"username:{loaded_username}")
+    profile_cache.delete(*keys)
+    user._loaded_username = user.username
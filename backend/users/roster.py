@@ -0,0 +1,190 @@
+# roster.py
+"""
+Bulk registration of a class roster.
+
+Rows are validated together (two queries for username/email conflicts, and
+AUTH_PASSWORD_VALIDATORS), passwords are hashed across a process pool shared
+by all imports and users are inserted with bulk_create. Problems are
+reported per row instead of failing the roster.
+"""
+import csv
+import io
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from .models import User
+
+ROSTER_FIELDS = ('username', 'email', 'password', 'full_name')
+# Smaller rosters are hashed in the request thread; starting the pool costs more
+POOL_MIN_PASSWORDS = 8
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _clean(value):
+    # Numbers are accepted as text, like DRF's CharField; other types are
+    # kept so _validate() can reject the row
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    return value.strip() if isinstance(value, str) else value
+
+
+def parse_roster(data, filename=''):
+    """Parse a roster given as text/bytes in CSV or JSON, or as an already decoded list"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if isinstance(data, str):
+        stripped = data.lstrip()
+        if filename.endswith('.json') or stripped.startswith(('[', '{')):
+            data = json.loads(data)
+        else:
+            data = list(csv.DictReader(io.StringIO(data)))
+    if isinstance(data, dict):
+        data = data.get('users', [])
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError("Roster must be a list of users")
+    return [{field: _clean(row.get(field)) for field in ROSTER_FIELDS} for row in data]
+
+
+def _validate(rows):
+    """Return {row index: errors} for rows that cannot be imported"""
+    errors = {}
+    username_validator = UnicodeUsernameValidator()
+
+    def add(index, field, message):
+        errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    for index, row in enumerate(rows):
+        for field in ROSTER_FIELDS:
+            if not isinstance(row[field], str):
+                add(index, field, "Not a valid string.")
+        if index in errors:
+            continue
+        for field in ('username', 'email', 'password'):
+            if not row[field]:
+                add(index, field, "This field is required.")
+        if row['username']:
+            try:
+                username_validator(row['username'])
+            except ValidationError as e:
+                add(index, 'username', e.messages[0])
+            if len(row['username']) > 150:
+                add(index, 'username', "Ensure this field has no more than 150 characters.")
+        if row['email']:
+            try:
+                validate_email(row['email'])
+            except ValidationError as e:
+                add(index, 'email', e.messages[0])
+        if len(row['full_name']) > 255:
+            add(index, 'full_name', "Ensure this field has no more than 255 characters.")
+        if row['password']:
+            user = User(username=row['username'], email=row['email'], full_name=row['full_name'])
+            try:
+                validate_password(row['password'], user)
+            except ValidationError as e:
+                for message in e.messages:
+                    add(index, 'password', message)
+
+    # Conflicts inside the roster and with existing users
+    for field in ('username', 'email'):
+        values = [row[field] if isinstance(row[field], str) else '' for row in rows]
+        taken = set(User.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+        seen = set()
+        for index, value in enumerate(values):
+            if not value:
+                continue
+            if value in taken:
+                add(index, field, f"A user with that {field} already exists.")
+            elif value in seen:
+                add(index, field, f"Duplicate {field} in roster.")
+            seen.add(value)
+    return errors
+
+
+def get_pool():
+    """
+    The process pool shared by roster imports, started on first use with
+    settings.ROSTER_HASH_WORKERS processes.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned workers do not inherit the request threads or database connections.
+                # They load Django before hashing; the initializer can't live in this module
+                # because importing it in a fresh process needs the app registry.
+                context = multiprocessing.get_context('spawn')
+                _pool = ProcessPoolExecutor(max_workers=settings.ROSTER_HASH_WORKERS, mp_context=context,
+                                            initializer=django.setup)
+    return _pool
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash passwords across the process pool, using at most ROSTER_HASH_WORKERS processes"""
+    workers = min(workers or settings.ROSTER_HASH_WORKERS, settings.ROSTER_HASH_WORKERS, len(passwords))
+    if workers <= 1 or len(passwords) < POOL_MIN_PASSWORDS:
+        return [make_password(password) for password in passwords]
+    return list(get_pool().map(make_password, passwords, chunksize=max(len(passwords) // (workers * 4), 1)))
+
+
+def import_roster(rows, workers=None):
+    """
+    Register every valid roster row. Returns the created users and a list of
+    {"row", "username", "errors"} entries for the rows that were rejected.
+    """
+    for row in rows:
+        if isinstance(row['username'], str):
+            row['username'] = User.normalize_username(row['username'])
+        if isinstance(row['email'], str):
+            row['email'] = User.objects.normalize_email(row['email'])
+    errors = _validate(rows)
+    valid = [(index, row) for index, row in enumerate(rows) if index not in errors]
+    passwords = hash_passwords([row['password'] for _, row in valid], workers)
+
+    users = [
+        User(
+            username=row['username'],
+            email=row['email'],
+            full_name=row['full_name'],
+            password=password,
+        )
+        for (_, row), password in zip(valid, passwords)
+    ]
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=500)
+    except IntegrityError:
+        # Someone registered a conflicting account meanwhile; re-check and retry once
+        conflicts = _validate([row for _, row in valid])
+        for position in conflicts:
+            errors[valid[position][0]] = conflicts[position]
+        users = [user for position, user in enumerate(users) if position not in conflicts]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=500)
+        except IntegrityError:
+            # Still conflicting; reject the remaining rows rather than fail the request
+            for position, (index, _) in enumerate(valid):
+                if position not in conflicts:
+                    errors[index] = {'non_field_errors': [
+                        "Could not be registered because of a concurrent registration, please retry."
+                    ]}
+            users = []
+
+    report = [
+        {"row": index + 1, "username": rows[index]['username'], "errors": errors[index]}
+        for index in sorted(errors)
+    ]
+    return users, report
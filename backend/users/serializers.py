@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.core.files.storage import default_storage
 from .models import User
+from . import hashing
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -13,12 +15,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ('username', 'email', 'password', 'full_name')
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
+        # Same as User.objects.create_user, but hashing runs on the bounded pool
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
             full_name=validated_data.get('full_name', '')
         )
+        user.password = hashing.make_password(validated_data['password'])
+        user.save()
         return user
 
 
@@ -30,6 +34,8 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class ProfileSerializer(serializers.ModelSerializer):
+    profile_thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = (
@@ -39,6 +45,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             'full_name', 
             'bio', 
             'profile_picture', 
+            'profile_thumbnails',
             'date_of_birth', 
             'phone_number', 
             'website', 
@@ -46,6 +53,15 @@ class ProfileSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id', 'username', 'email')
 
+    def get_profile_thumbnails(self, obj):
+        """URLs of the pre-generated thumbnails by size; empty until they are ready"""
+        request = self.context.get('request')
+        urls = {}
+        for size, name in (obj.profile_thumbnails or {}).items():
+            url = default_storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request else url
+        return urls
+
 
 class ProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import User, users_updated
+from .authentication import invalidate_user
+from .profiles import invalidate_profile
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    # Profile updates, password changes and deactivation all save the user
+    invalidate_user(instance.pk)
+    invalidate_profile(instance)
+
+@receiver(users_updated, sender=User)
+def invalidate_updated_auth_users(sender, users, **kwargs):
+    # Bulk updates, e.g. deactivating users from the shell or an admin action
+    for user_id, username in users:
+        invalidate_user(user_id)
+        invalidate_profile(User(pk=user_id, username=username))
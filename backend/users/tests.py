@@ -1,3 +1,350 @@
-from django.test import TestCase
+import io
+import tempfile
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image, ImageOps
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from courses_platform import caching
+from courses.models import Course, Lesson, Test, TestSubmission
+from . import authentication, hashing, roster, thumbnails
+from .models import User
+from .serializers import ProfileSerializer
 
-# Create your tests here.
+SIZES = (1, 10, 100)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryCountTests(TestCase):
+    """Every users endpoint runs the same number of queries for 1, 10 and 100 users and submissions"""
+
+    def setUp(self):
+        # Throttle counters live in the cache
+        cache.clear()
+        caching.clear_local()
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        self.client = APIClient()
+        self.counts = {}
+
+    def seed(self, size):
+        """``size`` more users; the last one has ``size`` test submissions"""
+        offset = User.objects.count()
+        users = User.objects.bulk_create(
+            User(username=f"user{offset + i}", email=f"user{offset + i}@example.com", password='!')
+            for i in range(size)
+        )
+        user = users[-1]
+        user.set_password('password')
+        user.save()
+
+        course = Course.objects.create(name=f"Course {size}", description="Query count course")
+        lesson = Lesson.objects.create(course=course, title="Lesson", video_url="https://example.com/video")
+        test = Test.objects.create(lesson=lesson, title="Test")
+        TestSubmission.objects.bulk_create(TestSubmission(test=test, user=user) for _ in range(size))
+        return user
+
+    def measure(self, name, method, url, data=None, user=None, format='json'):
+        self.client.force_authenticate(user)
+        # Measure the uncached path
+        cache.clear()
+        caching.clear_local()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format=format)
+        self.assertLess(response.status_code, 400, f"{name}: {response.content[:500]}")
+        self.counts.setdefault(name, []).append(len(queries))
+        return response
+
+    def exercise(self, user, size):
+        username = f"new{size}"
+        self.measure('register', 'post', reverse('register'), {
+            'username': username, 'email': f"{username}@example.com", 'password': 'password', 'full_name': "New",
+        })
+        self.measure('bulk-register', 'post', reverse('bulk-register'), {'users': [
+            {'username': f"bulk{size}", 'email': f"bulk{size}@example.com", 'password': 'Roster-pass-123'},
+        ]}, user=self.admin)
+        login = self.measure('login', 'post', reverse('login'), {'username': user.username, 'password': 'password'})
+        self.measure('token_refresh', 'post', reverse('token_refresh'), {'refresh': login.data['refresh']})
+        self.measure('current-user-profile', 'get', reverse('current-user-profile'), user=user)
+        self.measure('user-profile', 'get', reverse('user-profile', args=[user.username]), user=user)
+        self.measure('update-profile', 'patch', reverse('update-profile'), {'bio': "Updated"}, user=user)
+
+    def test_query_counts_do_not_grow_with_data(self):
+        for size in SIZES:
+            self.exercise(self.seed(size), size)
+
+        for name, counts in self.counts.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(len(set(counts)), 1, f"{name} queries by size: {counts}")
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.clear_local()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_profile_updates_are_visible(self):
+        self.client.get(reverse('current-user-profile'))
+        self.client.get(reverse('user-profile', args=[self.user.username]))
+        self.client.patch(reverse('update-profile'), {'bio': "Updated"}, format='json')
+
+        self.assertEqual(self.client.get(reverse('current-user-profile')).json()['bio'], "Updated")
+        self.assertEqual(self.client.get(reverse('user-profile', args=[self.user.username])).json()['bio'], "Updated")
+
+    def test_renamed_username_stops_resolving(self):
+        url = reverse('user-profile', args=['student'])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'renamed'
+        user.save()
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('user-profile', args=['renamed'])).json()['id'], self.user.pk)
+
+    def test_queryset_updates_are_visible_by_username(self):
+        url = reverse('user-profile', args=['student'])
+        self.assertEqual(self.client.get(url).json()['bio'], "")
+        User.objects.filter(pk=self.user.pk).update(bio="Updated")
+        self.assertEqual(self.client.get(url).json()['bio'], "Updated")
+
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('user-profile', args=['renamed'])).json()['bio'], "Updated")
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(reverse('current-user-profile'))
+        cached = cache.get(caching.profile_cache.key(f"pk:{self.user.pk}"))
+        self.assertIsNotNone(cached)
+        self.assertNotIn(self.user.password, repr(cached))
+
+
+class BulkRegisterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, *users):
+        return self.client.post(reverse('bulk-register'), {'users': list(users)}, format='json')
+
+    def test_rows_are_validated_one_by_one(self):
+        response = self.post(
+            {'username': 5, 'email': "five@example.com", 'password': "Roster-pass-123"},
+            {'username': {'name': "x"}, 'email': "x@example.com", 'password': "Roster-pass-123"},
+            {'username': "weak", 'email': "weak@example.com", 'password': "password"},
+            {'username': "admin", 'email': "other@example.com", 'password': "Roster-pass-123"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([user['username'] for user in response.json()['users']], ['5'])
+        errors = {error['row']: error['errors'] for error in response.json()['errors']}
+        self.assertEqual(errors[2], {'username': ["Not a valid string."]})
+        self.assertIn("This password is too common.", errors[3]['password'])
+        self.assertEqual(list(errors[4]), ['username'])
+
+    def test_conflicting_retry_is_reported(self):
+        with mock.patch.object(User.objects, 'bulk_create', side_effect=IntegrityError):
+            response = self.post({'username': "late", 'email': "late@example.com", 'password': "Roster-pass-123"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.json()['errors'][0]['errors'])
+        self.assertFalse(User.objects.filter(username="late").exists())
+
+    @override_settings(ROSTER_HASH_WORKERS=4)
+    def test_pool_is_shared(self):
+        self.assertIs(roster.get_pool(), roster.get_pool())
+        with mock.patch.object(roster, 'get_pool') as get_pool:
+            roster.hash_passwords(["Roster-pass-123"] * (roster.POOL_MIN_PASSWORDS - 1), workers=4)
+            get_pool.assert_not_called()
+            roster.hash_passwords(["Roster-pass-123"] * roster.POOL_MIN_PASSWORDS, workers=4)
+            get_pool.assert_called_once()
+
+    @override_settings(ROSTER_HASH_WORKERS=1)
+    def test_workers_are_capped_by_setting(self):
+        with mock.patch.object(roster, 'get_pool') as get_pool:
+            hashed = roster.hash_passwords(["Roster-pass-123"] * roster.POOL_MIN_PASSWORDS, workers=4)
+        get_pool.assert_not_called()
+        self.assertEqual(len(hashed), roster.POOL_MIN_PASSWORDS)
+
+
+class HashingBusyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('student', 'student@example.com', 'password', is_staff=True)
+        busy = mock.patch.object(hashing, 'run', side_effect=hashing.HashingBusy)
+        busy.start()
+        self.addCleanup(busy.stop)
+
+    def test_api_answers_503(self):
+        response = APIClient().post(reverse('login'), {'username': 'student', 'password': 'password'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        response = APIClient().post(reverse('register'), {
+            'username': 'new', 'email': 'new@example.com', 'password': 'Register-pass-123',
+        }, format='json')
+        self.assertEqual(response.status_code, 503)
+
+    def test_admin_login_fails_without_error(self):
+        response = self.client.post(reverse('admin:login'), {'username': 'student', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+
+class PasswordRehashTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        return APIClient().post(reverse('login'), {'username': 'student', 'password': 'password'}, format='json')
+
+    def test_changed_iterations_are_rehashed_on_login(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+            password = User.objects.get(pk=user.pk).password
+            self.assertTrue(password.startswith('pbkdf2_sha256$2000$'))
+            # An up-to-date hash is left alone
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(User.objects.get(pk=user.pk).password, password)
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_other_hashers_are_upgraded_on_login(self):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.assertTrue(user.password.startswith('md5$'))
+        with override_settings(PASSWORD_HASHERS=[
+                'users.hashers.PBKDF2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher']):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(User.objects.get(pk=user.pk).password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_wrong_password_is_not_rehashed(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            user = User.objects.create_user('student', 'student@example.com', 'password')
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = APIClient().post(reverse('login'), {'username': 'student', 'password': 'wrong'}, format='json')
+        self.assertNotEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(pk=user.pk).password, user.password)
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.url = reverse('current-user-profile')
+
+    def get_user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [q['sql'] for q in queries if 'is_superuser' in q['sql']]
+
+    def test_user_is_cached(self):
+        self.assertEqual(len(self.get_user_queries()[1]), 1)
+        authentication._local.clear()
+        response, queries = self.get_user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        user = authentication.get_auth_user(self.user.pk)
+        self.assertEqual(user.get_deferred_fields() & {'email', 'bio'}, {'email', 'bio'})
+
+    def test_save_invalidates(self):
+        self.get_user_queries()
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(authentication.get_auth_user(self.user.pk).is_staff)
+
+    def test_bulk_deactivation_invalidates(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+def picture(name='picture.png', size=(300, 200), color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        caching.clear_local()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, file):
+        with mock.patch('users.thumbnails.schedule') as schedule:
+            response = self.client.patch(reverse('update-profile'), {'profile_picture': file}, format='multipart')
+        return response, schedule
+
+    def test_upload_schedules_thumbnails(self):
+        response, schedule = self.upload(picture())
+        self.assertEqual(response.status_code, 200)
+        schedule.assert_called_once_with(self.user.pk)
+        self.assertRegex(User.objects.get(pk=self.user.pk).profile_picture.name,
+                         r'^profile_pictures/picture\.[0-9a-f]{12}\.png$')
+
+    @override_settings(PROFILE_PICTURE_MAX_SIZE=1024)
+    def test_oversized_upload_is_rejected(self):
+        response, schedule = self.upload(SimpleUploadedFile('big.png', b'\x89PNG' + b'\0' * 4096))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("exceeds 1024 bytes", response.json()['detail'])
+        schedule.assert_not_called()
+        self.assertFalse(User.objects.get(pk=self.user.pk).profile_picture)
+
+    def test_command_generates_hashed_thumbnails(self):
+        self.upload(picture())
+        out = io.StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn("Generated thumbnails for 1 users", out.getvalue())
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(set(user.profile_thumbnails), {'64', '128', '256'})
+        for size, name in user.profile_thumbnails.items():
+            self.assertRegex(name, rf'^profile_pictures/thumbs/{size}\.[0-9a-f]{{12}}\.jpg$')
+            with default_storage.open(name) as f:
+                self.assertEqual(Image.open(f).size, (int(size), int(size)))
+        # Users that have their thumbnails are skipped
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn("Generated thumbnails for 0 users", out.getvalue())
+
+    def test_profile_returns_thumbnail_urls(self):
+        self.upload(picture())
+        thumbnails.generate_thumbnails(self.user.pk)
+        user = User.objects.get(pk=self.user.pk)
+        data = ProfileSerializer(user).data
+        self.assertEqual(data['profile_thumbnails'], {
+            size: default_storage.url(name) for size, name in user.profile_thumbnails.items()
+        })
+        response = self.client.get(reverse('current-user-profile'))
+        self.assertEqual(response.json()['profile_thumbnails']['64'],
+                         'http://testserver' + default_storage.url(user.profile_thumbnails['64']))
+
+    def test_replaced_picture_keeps_its_thumbnails_empty(self):
+        self.upload(picture())
+        fit = ImageOps.fit
+
+        def replace_then_fit(*args, **kwargs):
+            User.objects.filter(pk=self.user.pk).update(profile_picture='profile_pictures/other.png')
+            return fit(*args, **kwargs)
+
+        with mock.patch('users.thumbnails.ImageOps.fit', side_effect=replace_then_fit):
+            thumbnails.generate_thumbnails(self.user.pk)
+        self.assertEqual(User.objects.get(pk=self.user.pk).profile_thumbnails, {})
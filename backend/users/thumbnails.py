@@ -0,0 +1,76 @@
+# thumbnails.py
+"""
+Fixed-size profile picture thumbnails.
+
+Thumbnails are generated off-request on a single background worker once the
+upload is committed, stored under names with the hash of the picture (so
+they can be cached forever, see courses_platform/storage.py) and recorded in User.profile_thumbnails as {size: storage name}.
+The generate_thumbnails command runs the same code for backfills.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from courses_platform.storage import hashed_name
+from PIL import Image, ImageOps
+from .models import User
+from .profiles import invalidate_profile
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnails')
+
+
+def thumbnail_name(digest, size):
+    return hashed_name(f"profile_pictures/thumbs/{size}.jpg", digest)
+
+
+def generate_thumbnails(user_id):
+    """Render every configured thumbnail size of a user's profile picture"""
+    user = User.objects.only('id', 'username', 'profile_picture').filter(pk=user_id).first()
+    if user is None or not user.profile_picture:
+        return {}
+
+    with user.profile_picture.open('rb') as fp:
+        data = fp.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    image = None
+    thumbnails = {}
+    for size in settings.PROFILE_THUMBNAIL_SIZES:
+        name = thumbnail_name(digest, size)
+        if not default_storage.exists(name):
+            if image is None:
+                image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert('RGB')
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+            default_storage.save_hashed(name, ContentFile(buffer.getvalue()))
+        thumbnails[str(size)] = name
+
+    # Skip the write if the picture was replaced while we were rendering
+    updated = User.objects.filter(pk=user_id, profile_picture=user.profile_picture.name).update(
+        profile_thumbnails=thumbnails
+    )
+    if updated:
+        invalidate_profile(user)
+    return thumbnails
+
+
+def _run(user_id):
+    close_old_connections()
+    try:
+        generate_thumbnails(user_id)
+    except Exception:
+        logger.exception("Could not generate thumbnails for user %s", user_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(user_id):
+    """Generate thumbnails on the background worker after the current transaction commits"""
+    transaction.on_commit(lambda: _executor.submit(_run, user_id))
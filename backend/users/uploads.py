@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file straight to a temporary file on disk and
+    aborts the upload once it grows beyond ``max_size`` bytes.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.PROFILE_PICTURE_MAX_SIZE
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Reject obviously oversized bodies before reading them
+        if content_length and content_length > self.max_size + 64 * 1024:
+            raise MultiPartParserError(f"Upload exceeds {self.max_size} bytes")
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            raise MultiPartParserError(f"Upload exceeds {self.max_size} bytes")
+        return super().receive_data_chunk(raw_data, start)
@@ -1,12 +1,13 @@
 from django.urls import path
 from .views import (
-    RegisterView, LoginView, 
+    RegisterView, BulkRegisterView, LoginView, 
     ProfileDetailView, CurrentUserProfileView, UpdateProfileView
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
+    path('bulk-register/', BulkRegisterView.as_view(), name='bulk-register'),
     path('login/', LoginView.as_view(), name='login'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
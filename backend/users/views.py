@@ -1,52 +1,112 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed
 from .serializers import RegisterSerializer, ProfileSerializer, ProfileUpdateSerializer, UserSerializer
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.parsers import MultiPartParser
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.generics import RetrieveAPIView, UpdateAPIView
 from django.shortcuts import get_object_or_404
+from courses_platform.instrumentation import SerializerTimingMixin
+from courses_platform.parsers import ORJSONParser
 from .models import User
+from .roster import parse_roster, import_roster
+from .uploads import LimitedTemporaryFileUploadHandler
+from . import hashing, thumbnails
+from .profiles import get_profile
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins in progress, please retry shortly."
+    default_code = 'hashing_busy'
+    # Makes DRF's exception handler send a Retry-After header
+    wait = 1
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'register'
     
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except hashing.HashingBusy:
+                raise HashingUnavailable()
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class BulkRegisterView(APIView):
+    """Staff-only registration of a whole roster given as JSON or as an uploaded CSV/JSON file"""
+    permission_classes = [IsAdminUser]
+    parser_classes = [ORJSONParser, MultiPartParser]
+    
+    def post(self, request):
+        try:
+            roster = request.FILES.get('roster')
+            if roster:
+                rows = parse_roster(roster.read(), roster.name)
+            else:
+                rows = parse_roster(request.data)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({"detail": f"Invalid roster: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        users, errors = import_roster(rows)
+        
+        return Response({
+            "created": len(users),
+            "users": UserSerializer(users, many=True).data,
+            "errors": errors,
+        }, status=status.HTTP_201_CREATED if users or not errors else status.HTTP_400_BAD_REQUEST)
+
 class LoginView(TokenObtainPairView):
     permission_classes = [AllowAny]
+    throttle_scope = 'login'
+
+    def post(self, request, *args, **kwargs):
+        try:
+            return super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            # Set by OffloadedHashingBackend when the hashing pool was full
+            if getattr(request, 'hashing_busy', False):
+                raise HashingUnavailable()
+            raise
 
-class ProfileDetailView(RetrieveAPIView):
+class ProfileDetailView(SerializerTimingMixin, RetrieveAPIView):
     """View for retrieving a user's profile"""
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
         if 'username' in self.kwargs:
-            return get_object_or_404(User, username=self.kwargs['username'])
-        return self.request.user
+            return get_profile(username=self.kwargs['username'])
+        return get_profile(pk=self.request.user.pk)
 
-class CurrentUserProfileView(RetrieveAPIView):
+class CurrentUserProfileView(SerializerTimingMixin, RetrieveAPIView):
     """View for retrieving the current user's profile"""
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        # request.user only carries the fields needed for permission checks
+        return get_profile(pk=self.request.user.pk)
 
-class UpdateProfileView(UpdateAPIView):
-    """View for updating the current user's profile"""
+class UpdateProfileView(SerializerTimingMixin, UpdateAPIView):
+    """View for updating the current user's profile, including multipart profile picture uploads"""
     serializer_class = ProfileUpdateSerializer
     permission_classes = [IsAuthenticated]
+    parser_classes = [ORJSONParser, MultiPartParser]
+    
+    def initial(self, request, *args, **kwargs):
+        # Stream uploads to disk and stop them at PROFILE_PICTURE_MAX_SIZE
+        request._request.upload_handlers = [LimitedTemporaryFileUploadHandler(request._request)]
+        super().initial(request, *args, **kwargs)
     
     def get_object(self):
-        return self.request.user
+        # request.user only carries the fields needed for permission checks
+        return get_object_or_404(User, pk=self.request.user.pk)
     
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -56,4 +116,13 @@ class UpdateProfileView(UpdateAPIView):
         self.perform_update(serializer)
         
         # Return the full profile after update
-        return Response(ProfileSerializer(instance).data)
+        return Response(ProfileSerializer(instance, context=self.get_serializer_context()).data)
+    
+    def perform_update(self, serializer):
+        if 'profile_picture' not in serializer.validated_data:
+            serializer.save()
+            return
+        # Old thumbnails no longer match; new ones are rendered in the background
+        user = serializer.save(profile_thumbnails={})
+        if user.profile_picture:
+            thumbnails.schedule(user.pk)